@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the market clearing pipeline on synthetic order books.
+
+Times the stages of CallMarket - get_market_price, fill_orders, compute_player_position
+and final_updates - separately, on books of different sizes and price distributions.
+In 'memory' mode the groups, players and orders are plain (transient) model objects; in
+'db' mode they are written to an in-memory SQLite database and loaded back, so the
+timings include the queries and the write-back.
+
+Run from the project root:
+    python bin/bench_clearing.py --sizes 10 1000 100000 --out bench.json
+    python bin/bench_clearing.py --compare bench.json
+
+The JSON output of one run can be passed to --compare on a later run; stages that got
+slower by more than --threshold are reported and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np
+from otree import database
+from otree.database import VarsDict
+from otree.models import Session
+from sqlalchemy import create_engine
+from sqlalchemy.orm import configure_mappers, sessionmaker
+
+import common.SessionConfigFunctions as scf
+from rounds import order_book
+from rounds.call_market import CallMarket
+from rounds.models import Group, Order, OrderType, Player, cu
+from rounds.prefetch import MarketPrefetch
+
+BID = OrderType.BID.value
+OFFER = OrderType.OFFER.value
+FV = 14.0
+
+CONFIG = dict(name='bench', interest_rate=0.05, div_amount='0.40 1.00', div_dist='.5 .5',
+              margin_ratio=.5, margin_premium=0.1, margin_target_ratio=.6, initial_price=FV,
+              clearing_engine=scf.CLEARING_ENGINE_VECTOR)
+
+STAGES = ['get_market_price', 'fill_orders', 'compute_player_position', 'final_updates']
+DISTRIBUTIONS = ['uniform', 'normal', 'crossed', 'coarse']
+ORDERS_PER_PLAYER = 4
+
+
+def generate_book(rng, n_orders, dist):
+    """
+    @return: prices, quantities and order types of a synthetic book
+    """
+    types = rng.choice([BID, OFFER], n_orders)
+    is_bid = types == BID
+    if dist == 'uniform':
+        prices = rng.uniform(FV * .5, FV * 1.5, n_orders)
+    elif dist == 'normal':
+        # Bids a little below the offers, overlapping in the middle
+        prices = rng.normal(np.where(is_bid, FV - .5, FV + .5), 1.5)
+    elif dist == 'crossed':
+        # Most bids above most offers - large volume, most orders fill
+        prices = rng.normal(np.where(is_bid, FV + 2, FV - 2), 1)
+    elif dist == 'coarse':
+        # Whole-point prices - few levels and many ties
+        prices = np.round(rng.uniform(FV - 5, FV + 5, n_orders))
+    else:
+        raise ValueError(f"Unknown distribution: {dist}")
+
+    prices = np.maximum(np.round(prices, 2), .01)
+    quants = rng.integers(1, 10, n_orders)
+    return prices, quants, types
+
+
+def new_session(code):
+    session = Session(code=code, config=dict(CONFIG))
+    session._vars = VarsDict()
+    return session
+
+
+def build_memory(rng, n_orders, dist):
+    session = new_session(f"mem_{dist}_{n_orders}")
+    group = Group(id=1, round_number=1, id_in_subsession=1, session=session)
+    n_players = max(2, n_orders // ORDERS_PER_PLAYER)
+    players = [Player(id=i + 1, id_in_group=i + 1, round_number=1, shares=10, cash=cu(100))
+                for i in range(n_players)]
+
+    prices, quants, types = generate_book(rng, n_orders, dist)
+    owners = rng.integers(0, n_players, n_orders)
+    orders = [Order(id=i + 1, player_id=int(owners[i]) + 1, group_id=group.id, order_type=int(types[i]),
+                    price=cu(prices[i]), quantity=int(quants[i]), quantity_final=0)
+              for i in range(n_orders)]
+
+    prefetch = MarketPrefetch(scf.get_params(session), players, orders)
+    return lambda: CallMarket(group, prefetch=prefetch), group
+
+
+def build_db(rng, n_orders, dist):
+    configure_mappers()
+    engine = create_engine('sqlite://')
+    database.AnyModel.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    database.db._db = db
+
+    session = new_session(f"db_{dist}_{n_orders}")
+    group = Group(session=session, round_number=1, id_in_subsession=1)
+    n_players = max(2, n_orders // ORDERS_PER_PLAYER)
+    players = [Player(session=session, group=group, id_in_group=i + 1, round_number=1, shares=10, cash=cu(100))
+               for i in range(n_players)]
+    db.add_all([session, group, *players])
+    db.flush()
+
+    prices, quants, types = generate_book(rng, n_orders, dist)
+    owners = rng.integers(0, n_players, n_orders)
+    db.bulk_insert_mappings(Order, [dict(player_id=players[owners[i]].id, group_id=group.id,
+                                         order_type=int(types[i]), price=float(prices[i]),
+                                         quantity=int(quants[i]), quantity_final=0, is_buy_in=False)
+                                    for i in range(n_orders)])
+    db.commit()
+
+    gid = group.id
+
+    def make_market():
+        db.rollback()
+        db.expunge_all()
+        return CallMarket(db.query(Group).get(gid))
+
+    return make_market, group
+
+
+def time_stages(make_market):
+    """
+    Run the pipeline once on a fresh CallMarket and time each stage.
+    @return: dict of stage -> seconds
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    cm = make_market()
+    timings['setup'] = time.perf_counter() - start
+
+    # Clearing reads the book the live order messages keep up to date, so build it beforehand.
+    order_book.discard_book(cm.group)
+    order_book.get_book(cm.group, orders=cm.bids + cm.offers)
+
+    start = time.perf_counter()
+    market_price, market_volume = cm.get_market_price()
+    timings['get_market_price'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cm.fill_orders(market_price)
+    timings['fill_orders'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for p_data in cm.players:
+        cm.compute_player_position(p_data, market_price)
+    timings['compute_player_position'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cm.final_updates(market_price, market_volume)
+    timings['final_updates'] = time.perf_counter() - start
+
+    order_book.discard_book(cm.group)
+    return timings
+
+
+def summarize(samples):
+    return dict(min=min(samples), median=statistics.median(samples), mean=statistics.mean(samples))
+
+
+def run(sizes, distributions, modes, repeat, seed):
+    results = []
+    for mode in modes:
+        for dist in distributions:
+            for n_orders in sizes:
+                rng = np.random.default_rng(seed)
+                builder = build_db if mode == 'db' else build_memory
+                make_market, _ = builder(rng, n_orders, dist)
+
+                runs = [time_stages(make_market) for _ in range(repeat)]
+                stages = {s: summarize([r[s] for r in runs]) for s in ['setup'] + STAGES}
+                results.append(dict(mode=mode, dist=dist, n_orders=n_orders, stages=stages))
+                print(f"{mode:6} {dist:8} {n_orders:>7} " +
+                      " ".join(f"{s}={stages[s]['median'] * 1000:.2f}ms" for s in ['setup'] + STAGES),
+                      file=sys.stderr)
+    return results
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=ROOT)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def result_key(r):
+    return r['mode'], r['dist'], r['n_orders']
+
+
+def compare(baseline, current, threshold):
+    """
+    @return: list of (key, stage, baseline median, current median) for stages slower than the threshold
+    """
+    base = {result_key(r): r for r in baseline['results']}
+    regressions = []
+    for r in current['results']:
+        b = base.get(result_key(r))
+        if b is None:
+            continue
+        for stage, summary in r['stages'].items():
+            old = b['stages'].get(stage, {}).get('median')
+            new = summary['median']
+            if old and new > old * (1 + threshold):
+                regressions.append((result_key(r), stage, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument('--dist', nargs='+', default=DISTRIBUTIONS, choices=DISTRIBUTIONS)
+    parser.add_argument('--mode', nargs='+', default=['memory', 'db'], choices=['memory', 'db'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=20240101)
+    parser.add_argument('--out', help="write the JSON results to this file instead of stdout")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=.25,
+                        help="relative slow-down of a stage's median that counts as a regression")
+    args = parser.parse_args(argv)
+
+    report = dict(
+        meta=dict(commit=git_commit(),
+                  timestamp=datetime.now().isoformat(timespec='seconds'),
+                  python=platform.python_version(),
+                  numpy=np.__version__,
+                  repeat=args.repeat,
+                  seed=args.seed),
+        results=run(args.sizes, args.dist, args.mode, args.repeat, args.seed),
+    )
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        for key, stage, old, new in regressions:
+            print(f"REGRESSION {key} {stage}: {old * 1000:.2f}ms -> {new * 1000:.2f}ms", file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
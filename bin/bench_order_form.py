@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the per-message cost of validating a live order submission.
+
+Compares the integer-cent parser and checks (rounds.order_form / rounds.is_order_valid)
+with the Currency based parsing they replaced, on the order form as the market page
+(strings) and the order grid (floats) send it.
+
+Run from the project root:
+    python bin/bench_order_form.py --number 20000
+"""
+import argparse
+import decimal
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import rounds
+from rounds.models import Order, OrderType, Player, cu
+from rounds.order_book import PlayerOrders
+from rounds.order_form import parse_order_form
+
+BID = OrderType.BID.value
+OFFER = OrderType.OFFER.value
+
+MESSAGES = {
+    'form': dict(type='BUY', price='13.75', quantity='3'),
+    'grid': dict(type='SELL', price=15.399999999999999, quantity=2),
+}
+
+
+def legacy_order_form(data):
+    """
+    The order form checks as they were done with Currency.
+    """
+    error_code = 0
+    price = None
+    try:
+        price = cu(data['price'])
+    except (ValueError, decimal.InvalidOperation):
+        error_code |= 2
+    quant = int(data['quantity'])
+    if price and price >= 10000:
+        error_code |= 256
+    if quant and quant >= 100:
+        error_code |= 512
+    o_type = None
+    if data['type'] in ['SELL', 'BUY']:
+        o_type = OrderType(-1 if data['type'] == 'BUY' else 1)
+    else:
+        error_code |= 16
+    return error_code, o_type, price, quant
+
+
+def legacy_order_valid(player, data, orders_by_type):
+    error_code, o_type, price, quant = legacy_order_form(data)
+    offers = orders_by_type[OrderType.OFFER]
+    bids = orders_by_type[OrderType.BID]
+    min_ask = min([o.price for o in offers], default=999999999)
+    max_bid = max([o.price for o in bids], default=-999)
+    if o_type == OrderType.BID and price >= min_ask:
+        return 32
+    if o_type == OrderType.OFFER and price <= max_bid:
+        return 64
+    if o_type == OrderType.OFFER and sum([o.quantity for o in offers]) + quant > player.shares:
+        return 4096
+    if o_type == OrderType.BID and sum([o.quantity * o.price for o in bids]) + quant * price > player.cash:
+        return 8192
+    return error_code
+
+
+def player_orders():
+    orders = PlayerOrders(1)
+    for oid, (o_type, price, quant) in enumerate([(BID, 12, 1), (BID, 12.5, 2), (BID, 13, 1),
+                                                  (OFFER, 14, 1), (OFFER, 14.5, 2), (OFFER, 16, 1)]):
+        orders.add(Order(id=oid + 1, order_type=o_type, price=cu(price), quantity=quant))
+    return orders
+
+
+def run(number):
+    player = Player(shares=10, cash=cu(1000))
+    orders = player_orders()
+    by_type = {OrderType.BID: orders[OrderType.BID], OrderType.OFFER: orders[OrderType.OFFER]}
+
+    results = []
+    for name, data in MESSAGES.items():
+        cases = [
+            ('legacy form', lambda: legacy_order_form(data)),
+            ('cents form', lambda: parse_order_form(data)),
+            ('legacy validate', lambda: legacy_order_valid(player, data, by_type)),
+            ('cents validate', lambda: rounds.is_order_valid(player, data, orders)),
+        ]
+        for case, fn in cases:
+            seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+            results.append((name, case, seconds))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=20000, help="messages per timing run")
+    args = parser.parse_args(argv)
+
+    for name, case, seconds in run(args.number):
+        print(f"{name:5} {case:16} {seconds * 1e6:8.2f} us/message")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
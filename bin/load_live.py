@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Load test of the market page live method with many simulated traders.
+
+oTree runs every live message of a server process in one event loop, one message at a
+time, so the traders are simulated in-process: their messages are interleaved in random
+order and passed to market_page_live_method the way otree.live does - the player is
+loaded fresh for each message and the database session is committed afterwards.
+
+Each trader sends a mix of order form submits, order grid bursts (batches), cancels of
+its own open orders and order list refreshes.  Time is simulated: every message
+advances a clock shared with the live rate limiter by the mean gap between messages at
+--rate messages per trader per second, so throttling behaves as it would with real
+traders.
+
+Reports the p50/p95/p99 latency of each kind of message, the throughput and the number
+of SQL statements per message.
+
+Run from the project root:
+    python bin/load_live.py --traders 25 100 500 --messages 20
+    python bin/load_live.py --traders 100 --journal --out load.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np
+from otree import database
+from otree.database import VarsDict
+from otree.models import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import configure_mappers, sessionmaker
+
+import rounds
+from rounds import live_limits, order_book, order_journal
+from rounds.live_limits import LiveThrottle
+from rounds.models import Group, Player, cu
+from rounds.order_journal import OrderJournal
+
+FV = 14.0
+CONFIG = dict(name='load', interest_rate=0.05, div_amount='0.40 1.00', div_dist='.5 .5',
+              margin_ratio=.5, margin_premium=0.1, margin_target_ratio=.6, initial_price=FV)
+
+# Kinds of message and how often a trader sends each
+MIX = {
+    'submit': .45,
+    'grid': .10,
+    'delete': .20,
+    'refresh': .25,
+}
+GRID_OPS = 3
+
+
+class SimClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Trader:
+    def __init__(self, pid, id_in_group):
+        self.pid = pid
+        self.id_in_group = id_in_group
+        self.open_orders = []
+        self.epoch = None
+        self.version = None
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self.on_execute)
+
+    def on_execute(self, *args):
+        self.count += 1
+
+
+def build_market(db_url, n_traders, group_size, journal):
+    configure_mappers()
+    engine = create_engine(db_url)
+    database.AnyModel.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    database.db._db = db
+
+    session = Session(code=f"load_{n_traders}", config=dict(CONFIG, order_journal=journal))
+    session._vars = VarsDict()
+    db.add(session)
+
+    players = []
+    for g in range(0, n_traders, group_size):
+        group = Group(session=session, round_number=1, id_in_subsession=g // group_size + 1)
+        db.add(group)
+        players += [Player(session=session, group=group, id_in_group=i + 1, round_number=1,
+                           shares=20, cash=cu(1000))
+                    for i in range(min(group_size, n_traders - g))]
+    db.add_all(players)
+    db.commit()
+
+    traders = [Trader(p.id, p.id_in_group) for p in players]
+    return engine, db, traders
+
+
+def random_order(rng, o_type):
+    # Bids below the fundamental value and offers above it, so few orders cross
+    offset = rng.uniform(.05, 3)
+    price = FV - offset if o_type == 'BUY' else FV + offset
+    return {'type': o_type, 'price': f"{price:.2f}", 'quantity': str(int(rng.integers(1, 4))), 'ts': 0}
+
+
+def make_message(rng, trader, kind, seq):
+    if kind == 'delete' and trader.open_orders:
+        oid = trader.open_orders.pop(int(rng.integers(len(trader.open_orders))))
+        return {'func': 'delete_order', 'oid': oid}
+
+    if kind == 'refresh' or kind == 'delete':
+        return {'func': 'get_orders_for_player', 'epoch': trader.epoch, 'version': trader.version}
+
+    if kind == 'grid':
+        ops = [{'op': 'submit-order', 'data': random_order(rng, str(rng.choice(['BUY', 'SELL'])))}
+               for _ in range(GRID_OPS)]
+        return {'func': 'batch', 'seq': seq, 'ops': ops}
+
+    return {'func': 'submit-order', 'data': random_order(rng, str(rng.choice(['BUY', 'SELL'])))}
+
+
+def record_reply(trader, reply, stats):
+    """
+    Keep track of the trader's open orders and order list version from the reply.
+    """
+    if reply.get('func') == 'order_confirmed':
+        trader.open_orders.append(reply['order_id'])
+    elif reply.get('func') == 'batch_result':
+        trader.open_orders += [r['order_id'] for r in reply['results'] if r['func'] == 'order_confirmed']
+        stats['rejected'] += sum(1 for r in reply['results'] if r['func'] != 'order_confirmed')
+    elif reply.get('func') == 'order_rejected':
+        stats['rejected'] += 1
+
+    if 'epoch' in reply:
+        trader.epoch = reply['epoch']
+        trader.version = reply['version']
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return dict(n=len(samples), p50=p50, p95=p95, p99=p99, mean=statistics.mean(samples), max=max(samples))
+
+
+def run_load(n_traders, messages, rate, group_size, journal, db_url, seed):
+    rng = np.random.default_rng(seed)
+    engine, db, traders = build_market(db_url, n_traders, group_size, journal)
+    queries = QueryCounter(engine)
+
+    clock = SimClock()
+    live_limits.throttle = LiveThrottle(clock=clock)
+    order_journal.journal = OrderJournal()
+    order_book._BOOKS.clear()
+    order_book._PLAYER_ORDERS.clear()
+
+    # Every trader sends `messages` messages, interleaved at random
+    schedule = np.repeat(np.arange(n_traders), messages)
+    rng.shuffle(schedule)
+    kinds = rng.choice(list(MIX), len(schedule), p=list(MIX.values()))
+    gap = 1 / (rate * n_traders)
+
+    latencies = defaultdict(list)
+    query_counts = defaultdict(list)
+    stats = defaultdict(int)
+
+    start = time.perf_counter()
+    for seq, (idx, kind) in enumerate(zip(schedule, kinds)):
+        trader = traders[idx]
+        clock.now += gap
+        d = make_message(rng, trader, kind, seq)
+        if d['func'] == 'get_orders_for_player':
+            kind = 'refresh'  # A cancel with nothing to cancel
+
+        queries_before = queries.count
+        t0 = time.perf_counter()
+
+        # What otree.live does for each message: a fresh player, then commit
+        db.expunge_all()
+        player = db.query(Player).get(trader.pid)
+        ret = rounds.market_page_live_method(player, d)
+        db.commit()
+
+        latencies[kind].append(time.perf_counter() - t0)
+        query_counts[kind].append(queries.count - queries_before)
+        record_reply(trader, ret[trader.id_in_group], stats)
+
+    order_journal.flush()
+    db.commit()
+    elapsed = time.perf_counter() - start
+
+    all_latencies = [s for samples in latencies.values() for s in samples]
+    all_queries = [q for counts in query_counts.values() for q in counts]
+    result = dict(
+        traders=n_traders,
+        messages=len(schedule),
+        throughput=len(schedule) / elapsed,
+        rejected=stats['rejected'],
+        latency=dict(all=percentiles(all_latencies), **{k: percentiles(v) for k, v in latencies.items()}),
+        queries=dict(all=statistics.mean(all_queries), **{k: statistics.mean(v) for k, v in query_counts.items()}),
+    )
+
+    db.close()
+    engine.dispose()
+    order_book._BOOKS.clear()
+    order_book._PLAYER_ORDERS.clear()
+    live_limits.throttle = LiveThrottle()
+    return result
+
+
+def print_result(r):
+    print(f"{r['traders']} traders, {r['messages']} messages, {r['throughput']:.0f} msg/s, "
+          f"{r['rejected']} rejected", file=sys.stderr)
+    for kind, lat in r['latency'].items():
+        print(f"  {kind:8} n={lat['n']:<7} p50={lat['p50'] * 1000:7.2f}ms p95={lat['p95'] * 1000:7.2f}ms "
+              f"p99={lat['p99'] * 1000:7.2f}ms queries/msg={r['queries'][kind]:.1f}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--traders', type=int, nargs='+', default=[25, 100, 500])
+    parser.add_argument('--messages', type=int, default=20, help="messages sent by each trader")
+    parser.add_argument('--rate', type=float, default=2.0, help="messages per trader per second")
+    parser.add_argument('--group-size', type=int, default=None,
+                        help="traders per group (market); all traders in one group by default")
+    parser.add_argument('--journal', action='store_true', help="turn on the order journal")
+    parser.add_argument('--db', default='sqlite://', help="SQLAlchemy database url")
+    parser.add_argument('--seed', type=int, default=20240101)
+    parser.add_argument('--out', help="write the JSON results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for n in args.traders:
+        r = run_load(n, args.messages, args.rate, args.group_size or n, args.journal, args.db, args.seed)
+        print_result(r)
+        results.append(r)
+
+    if args.out:
+        report = dict(meta=dict(timestamp=datetime.now().isoformat(timespec='seconds'),
+                                python=platform.python_version(),
+                                journal=args.journal,
+                                rate=args.rate,
+                                seed=args.seed),
+                      results=results)
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+class MarketParams:
+    """
+    Immutable snapshot of a session config whose values are parsed into the type their
+    getter returns.  Each value is parsed the first time it is read and kept, so a bad
+    value only fails the getters that read it.  Instances are built by
+    SessionConfigFunctions.compile_params and cached per session by
+    SessionConfigFunctions.get_params.
+    """
+
+    __slots__ = (
+        'config',
+        'parsers',
+        'init_price',
+        'session_name',
+        'margin_ratio',
+        'margin_target_ratio',
+        'margin_premium',
+        'div_dist',
+        'div_probabilities',
+        'div_amount',
+        'div_amounts',
+        'interest_rate',
+        'fundamental_value',
+        'random_hist',
+        'bonus_cap',
+        'auto_trans_delay',
+        'float_ratio_cap',
+        'forecast_thold',
+        'forecast_reward',
+        'forecast_range',
+        'forecast_periods',
+        'quiz_reward',
+        'market_time',
+        'fixate_time',
+        'risk_elic_time',
+        'forecast_time',
+        'summary_time',
+        'practice_time',
+        'practice_end_time',
+        'final_results_time',
+        'endow_stock',
+        'endow_stocks',
+        'endow_worth',
+        'show_next',
+        'conversion_rate',
+        'is_prolific',
+        'is_mturk',
+        'is_pilot',
+        'exp_time_pilot',
+        'exp_time_live',
+        'default_url',
+        'clearing_engine',
+        'batch_clearing',
+        'dividend_seed',
+        'order_journal',
+        'depth_feed_ms',
+        'margin_calls',
+    )
+
+    def __init__(self, config, parsers):
+        """
+        @param config: private copy of the session config the values are parsed from
+        @param parsers: field name -> function of this MarketParams that parses the value
+        """
+        object.__setattr__(self, 'config', config)
+        object.__setattr__(self, 'parsers', parsers)
+
+    def __getattr__(self, name):
+        # Only called for a slot that has not been set yet
+        if name in ('config', 'parsers'):
+            raise AttributeError(name)
+        parser = self.parsers.get(name)
+        if parser is None:
+            raise AttributeError(f"MarketParams has no field {name}")
+        value = parser(self)
+        object.__setattr__(self, name, value)
+        return value
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"MarketParams is immutable; cannot set {key}")
+
+    def matches(self, config):
+        """
+        Is this snapshot still current for the given session config?
+        """
+        return self.config == config
+
+    def __repr__(self):
+        return f"MarketParams({self.session_name})"
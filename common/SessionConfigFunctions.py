@@ -5,6 +5,8 @@ from otree.models import Session
 import numpy as np
 from  copy import deepcopy
 
+from common.MarketParams import MarketParams
+
 SK_INTEREST_RATE = 'interest_rate'
 SK_DIV_AMOUNT = 'div_amount'
 SK_DIV_DIST = 'div_dist'
@@ -41,9 +43,18 @@ SK_EXP_TIME_PILOT = 'expected_time_pilot'
 SK_EXP_TIME_LIVE = 'expected_time_live'
 SK_START_TIME = 'start_time'
 SK_DEFAULT_URL = 'default_url'
+SK_CLEARING_ENGINE = 'clearing_engine'
+SK_BATCH_CLEARING = 'batch_clearing'
+SK_DIVIDEND_SEED = 'dividend_seed'
+SK_ORDER_JOURNAL = 'order_journal'
+SK_DEPTH_FEED_MS = 'depth_feed_ms'
+SK_MARGIN_CALLS = 'margin_calls'
 
 WHOLE_NUMBER_PERCENT = "{:.0%}"
 
+CLEARING_ENGINE_LEGACY = 'legacy'
+CLEARING_ENGINE_VECTOR = 'vector'
+
 
 def ensure_config(obj):
     if type(obj) == dict:
@@ -90,14 +101,129 @@ def get_item_as_bool(config, key, default=False):
         return default
 
 
+def parse_floats(raw_value, sep=None):
+    if raw_value is None:
+        return None
+    return [float(x) for x in raw_value.split(sep)]
+
+
+def parse_ints(raw_value, sep=None):
+    if raw_value is None:
+        return None
+    return tuple(int(x) for x in raw_value.split(sep))
+
+
+def read_only_array(values):
+    if values is None:
+        return None
+    arr = np.array(values)
+    arr.flags.writeable = False
+    return arr
+
+
+def parse_fundamental_value(params):
+    div_probabilities = params.div_probabilities
+    div_amounts = params.div_amounts
+    if div_probabilities is None or div_amounts is None:
+        return None
+    interest_rate = params.interest_rate
+    return 0 if interest_rate == 0 else cu(div_probabilities.dot(div_amounts) / interest_rate)
+
+
+# MarketParams field -> function of the MarketParams that parses the field from its config
+FIELD_PARSERS = dict(
+    init_price=lambda p: get_item_as_float(p.config, SK_INITIAL_PRICE, return_none=True),
+    session_name=lambda p: p.config.get(SK_SESSION_NAME),
+    margin_ratio=lambda p: get_item_as_float(p.config, SK_MARGIN_RATIO),
+    margin_target_ratio=lambda p: get_item_as_float(p.config, SK_MARGIN_TARGET_RATIO),
+    margin_premium=lambda p: get_item_as_float(p.config, SK_MARGIN_PREMIUM),
+    div_dist=lambda p: p.config.get(SK_DIV_DIST),
+    div_probabilities=lambda p: read_only_array(parse_floats(p.config.get(SK_DIV_DIST))),
+    div_amount=lambda p: p.config.get(SK_DIV_AMOUNT),
+    div_amounts=lambda p: read_only_array(parse_floats(p.config.get(SK_DIV_AMOUNT))),
+    interest_rate=lambda p: get_item_as_float(p.config, SK_INTEREST_RATE),
+    fundamental_value=parse_fundamental_value,
+    random_hist=lambda p: get_item_as_bool(p.config, SK_RANDOMIZE_HISTORY),
+    bonus_cap=lambda p: get_item_as_currency(p.config, SK_BONUS_CAP, default=9999999999),
+    auto_trans_delay=lambda p: get_item_as_int(p.config, SK_AUTO_TRANS_DELAY),
+    float_ratio_cap=lambda p: get_item_as_float(p.config, SK_FLOAT_RATIO_CAP, return_none=True),
+    forecast_thold=lambda p: get_item_as_int(p.config, SK_FORECAST_THOLD),
+    forecast_reward=lambda p: get_item_as_float(p.config, SK_FORECAST_REWARD),
+    forecast_range=lambda p: get_item_as_int(p.config, SK_FORECAST_RANGE),
+    forecast_periods=lambda p: parse_ints(p.config.get(SK_FORECAST_PERIODS), sep=','),
+    quiz_reward=lambda p: get_item_as_float(p.config, SK_QUIZ_REWARD),
+    market_time=lambda p: get_item_as_int(p.config, SK_MARKET_TIME, return_none=True),
+    fixate_time=lambda p: get_item_as_int(p.config, SK_FIXATE_TIME, return_none=True),
+    risk_elic_time=lambda p: get_item_as_int(p.config, SK_RISK_ELIC_TIME, return_none=True),
+    forecast_time=lambda p: get_item_as_int(p.config, SK_FORECAST_TIME, return_none=True),
+    summary_time=lambda p: get_item_as_int(p.config, SK_SUMMARY_TIME, return_none=True),
+    practice_time=lambda p: get_item_as_int(p.config, SK_PRACTICE_TIME, return_none=True),
+    practice_end_time=lambda p: get_item_as_int(p.config, SK_PRACTICE_END_TIME, return_none=True),
+    final_results_time=lambda p: get_item_as_int(p.config, SK_FINAL_RESULTS_TIME, return_none=True),
+    endow_stock=lambda p: p.config.get(SK_ENDOW_STOCK),
+    endow_stocks=lambda p: parse_ints(p.config.get(SK_ENDOW_STOCK)),
+    endow_worth=lambda p: get_item_as_int(p.config, SK_ENDOW_WORTH),
+    show_next=lambda p: get_item_as_bool(p.config, SK_SHOW_NEXT),
+    conversion_rate=lambda p: get_item_as_float(p.config, SK_CONVERSION_RATE),
+    is_prolific=lambda p: get_item_as_bool(p.config, SK_IS_PROLIFIC),
+    is_mturk=lambda p: get_item_as_bool(p.config, SK_IS_MTURK),
+    is_pilot=lambda p: get_item_as_bool(p.config, SK_IS_PILOT),
+    exp_time_pilot=lambda p: get_item_as_int(p.config, SK_EXP_TIME_PILOT),
+    exp_time_live=lambda p: get_item_as_int(p.config, SK_EXP_TIME_LIVE),
+    default_url=lambda p: p.config.get(SK_DEFAULT_URL),
+    clearing_engine=lambda p: p.config.get(SK_CLEARING_ENGINE) or CLEARING_ENGINE_LEGACY,
+    batch_clearing=lambda p: get_item_as_bool(p.config, SK_BATCH_CLEARING),
+    dividend_seed=lambda p: get_item_as_int(p.config, SK_DIVIDEND_SEED, return_none=True),
+    order_journal=lambda p: get_item_as_bool(p.config, SK_ORDER_JOURNAL),
+    depth_feed_ms=lambda p: get_item_as_int(p.config, SK_DEPTH_FEED_MS),
+    margin_calls=lambda p: get_item_as_bool(p.config, SK_MARGIN_CALLS),
+)
+
+
+def compile_params(config):
+    """
+    Snapshot a session config as a MarketParams.  The values are parsed when first read.
+    @param config: session config dict.  It is copied; later changes to it are not seen.
+    @return: MarketParams
+    """
+    return MarketParams(deepcopy(config), FIELD_PARSERS)
+
+
+# Compiled parameters by session code (or by id for plain config dicts)
+_PARAMS = {}
+_MAX_CACHED_PARAMS = 256
+
+
+def get_params(obj):
+    """
+    Get the compiled parameters for a session.  They are compiled once and reused until
+    the session config no longer matches the snapshot they were compiled from.
+    @param obj: a session, a model with a session, a session config dict or a MarketParams
+    @return: MarketParams
+    """
+    if type(obj) == MarketParams:
+        return obj
+    elif type(obj) == dict:
+        key, config = ('dict', id(obj)), obj
+    else:
+        session = obj if type(obj) == Session else obj.session
+        key, config = session.code, session.config
+
+    params = _PARAMS.get(key)
+    if params is None or not params.matches(config):
+        if len(_PARAMS) >= _MAX_CACHED_PARAMS:
+            _PARAMS.clear()
+        params = compile_params(config)
+        _PARAMS[key] = params
+    return params
+
+
 def get_init_price(obj):
-    config = ensure_config(obj)
-    return get_item_as_float(config, SK_INITIAL_PRICE, return_none=True)
+    return get_params(obj).init_price
 
 
 def get_session_name(obj):
-    config = ensure_config(obj)
-    return config.get(SK_SESSION_NAME)
+    return get_params(obj).session_name
 
 
 def as_wnp(x):
@@ -105,79 +231,69 @@ def as_wnp(x):
 
 
 def get_margin_ratio(obj, wnp=False):
-    config = ensure_config(obj)
+    params = get_params(obj)
     if wnp:
-        return as_wnp(config.get(SK_MARGIN_RATIO))
+        return as_wnp(params.config.get(SK_MARGIN_RATIO))
     else:
-        return get_item_as_float(config, SK_MARGIN_RATIO)
+        return params.margin_ratio
 
 
 def get_margin_target_ratio(obj, wnp=False):
-    config = ensure_config(obj)
+    params = get_params(obj)
     if wnp:
-        return as_wnp(config.get(SK_MARGIN_TARGET_RATIO))
+        return as_wnp(params.config.get(SK_MARGIN_TARGET_RATIO))
     else:
-        return get_item_as_float(config, SK_MARGIN_TARGET_RATIO)
+        return params.margin_target_ratio
 
 
 def get_margin_premium(obj, wnp=False):
-    config = ensure_config(obj)
+    params = get_params(obj)
     if wnp:
-        return as_wnp(config.get(SK_MARGIN_PREMIUM))
+        return as_wnp(params.config.get(SK_MARGIN_PREMIUM))
     else:
-        return get_item_as_float(config, SK_MARGIN_PREMIUM)
+        return params.margin_premium
 
 
 def get_dividend_dist(obj):
-    config = ensure_config(obj)
-    return config.get(SK_DIV_DIST)
+    return get_params(obj).div_dist
 
 
 def get_dividend_probabilities(obj):
-    return np.array([float(x) for x in get_dividend_dist(obj).split()])
+    """
+    @return: read-only numpy array
+    """
+    return get_params(obj).div_probabilities
 
 
 def get_dividend_amount(obj):
-    config = ensure_config(obj)
-    return config.get(SK_DIV_AMOUNT)
+    return get_params(obj).div_amount
 
 
 def get_dividend_amounts(obj):
-    return np.array([float(x) for x in get_dividend_amount(obj).split()])
+    """
+    @return: read-only numpy array
+    """
+    return get_params(obj).div_amounts
 
 
 def get_interest_rate(obj):
-    config = ensure_config(obj)
-    return get_item_as_float(config, SK_INTEREST_RATE)
+    return get_params(obj).interest_rate
 
 
 def get_fundamental_value(obj):
-    config = ensure_config(obj)
-
-    dist = get_dividend_probabilities(config)
-    div_amounts = get_dividend_amounts(config)
-    exp = dist.dot(div_amounts)
-    r = get_interest_rate(config)
-
-    if r == 0:
-        return 0
-
-    return cu(exp / r)
+    return get_params(obj).fundamental_value
 
 
 def is_random_hist(obj):
-    config = ensure_config(obj)
-    return get_item_as_bool(config, SK_RANDOMIZE_HISTORY)
+    return get_params(obj).random_hist
 
 
 def get_bonus_cap(obj):
-    config = ensure_config(obj)
-    return get_item_as_currency(config, SK_BONUS_CAP, default=9999999999)
+    return get_params(obj).bonus_cap
 
 
 def get_auto_trans_delay(obj):
-    config = ensure_config(obj)
-    return get_item_as_int(config, SK_AUTO_TRANS_DELAY)
+    return get_params(obj).auto_trans_delay
 
 
 def get_float_ratio_cap(obj):
@@ -186,139 +302,114 @@ def get_float_ratio_cap(obj):
     @param obj:
     @return: the short cap ratio if set, otherwise None.
     """
-    config = ensure_config(obj)
-    return get_item_as_float(config, SK_FLOAT_RATIO_CAP, return_none=True)
+    return get_params(obj).float_ratio_cap
 
 
 def get_forecast_thold(obj):
-    config = ensure_config(obj)
-    return get_item_as_int(config, SK_FORECAST_THOLD)
+    return get_params(obj).forecast_thold
 
 
 def get_forecast_reward(obj):
-    config = ensure_config(obj)
-    return get_item_as_float(config, SK_FORECAST_REWARD)
+    return get_params(obj).forecast_reward
 
 
 def get_forecast_range(obj):
-    config = ensure_config(obj)
-    return get_item_as_int(config, SK_FORECAST_RANGE)
+    return get_params(obj).forecast_range
 
 def get_forecast_periods(obj):
-    config = ensure_config(obj)
-    p = config.get(SK_FORECAST_PERIODS)
-    return [int(x) for x in p.split(',')]
+    return list(get_params(obj).forecast_periods)
 
 
 def get_quiz_reward(obj):
-    config = ensure_config(obj)
-    return get_item_as_float(config, SK_QUIZ_REWARD)
+    return get_params(obj).quiz_reward
 
 
 def get_market_time(obj):
-    config = ensure_config(obj)
-    return get_item_as_int(config, SK_MARKET_TIME, return_none=True)
+    return get_params(obj).market_time
 
 
 def get_fixate_time(obj):
-    config = ensure_config(obj)
-    return get_item_as_int(config, SK_FIXATE_TIME, return_none=True)
+    return get_params(obj).fixate_time
 
 
 def get_risk_elic_time(obj):
-    config = ensure_config(obj)
-    return get_item_as_int(config, SK_RISK_ELIC_TIME, return_none=True)
+    return get_params(obj).risk_elic_time
 
 
 def get_forecast_time(obj):
-    config = ensure_config(obj)
-    return get_item_as_int(config, SK_FORECAST_TIME, return_none=True)
+    return get_params(obj).forecast_time
 
 
 def get_summary_time(obj):
-    config = ensure_config(obj)
-    return get_item_as_int(config, SK_SUMMARY_TIME, return_none=True)
+    return get_params(obj).summary_time
 
 
 def get_practice_time(obj):
-    config = ensure_config(obj)
-    return get_item_as_int(config, SK_PRACTICE_TIME, return_none=True)
+    return get_params(obj).practice_time
 
 
 def get_practice_end_time(obj):
-    config = ensure_config(obj)
-    return get_item_as_int(config, SK_PRACTICE_END_TIME, return_none=True)
+    return get_params(obj).practice_end_time
 
 def get_final_results_time(obj):
-    print(obj)
-    config = ensure_config(obj)
-    print(config)
-    return get_item_as_int(config, SK_FINAL_RESULTS_TIME, return_none=True)
+    return get_params(obj).final_results_time
 
 
 def get_endow_stock(obj):
-    config = ensure_config(obj)
-    return config.get(SK_ENDOW_STOCK)
+    return get_params(obj).endow_stock
 
 
 def get_endow_stocks(obj):
-    return [int(x) for x in get_endow_stock(obj).split()]
+    return list(get_params(obj).endow_stocks)
 
 
 def get_endow_worth(obj):
-    config = ensure_config(obj)
-    return get_item_as_int(config, SK_ENDOW_WORTH)
+    return get_params(obj).endow_worth
 
 
 def show_next_button(obj):
-    config = ensure_config(obj)
-    return get_item_as_bool(config, SK_SHOW_NEXT)
+    return get_params(obj).show_next
 
 
 def get_conversion_rate(obj):
-    config = ensure_config(obj)
-    return get_item_as_float(config, SK_CONVERSION_RATE)
+    return get_params(obj).conversion_rate
 
 
 def is_prolific(obj):
-    config = ensure_config(obj)
-    return get_item_as_bool(config, SK_IS_PROLIFIC)
+    return get_params(obj).is_prolific
 
 
 def is_mturk(obj):
-    config = ensure_config(obj)
-    return get_item_as_bool(config, SK_IS_MTURK)
+    return get_params(obj).is_mturk
 
 
 def is_online(obj):
-    return is_prolific(obj) or is_mturk(obj)
+    params = get_params(obj)
+    return params.is_prolific or params.is_mturk
 
 
 def is_pilot(obj):
-    config = ensure_config(obj)
-    return get_item_as_bool(config, SK_IS_PILOT)
+    return get_params(obj).is_pilot
 
 
 def get_exp_time_pilot(obj):
-    config = ensure_config(obj)
-    return get_item_as_int(config, SK_EXP_TIME_PILOT)
+    return get_params(obj).exp_time_pilot
 
 
 def get_exp_time_live(obj):
-    config = ensure_config(obj)
-    return get_item_as_int(config, SK_EXP_TIME_LIVE)
+    return get_params(obj).exp_time_live
 
 
 def get_expected_time(obj):
-    if is_pilot(obj):
-        return get_exp_time_pilot(obj)
+    params = get_params(obj)
+    if params.is_pilot:
+        return params.exp_time_pilot
     else:
-        return get_exp_time_live(obj)
+        return params.exp_time_live
 
 
 def get_start_time(obj):
-    config = ensure_config(obj)
-    raw_st = config.get(SK_START_TIME)
+    raw_st = get_params(obj).config.get(SK_START_TIME)
     # allow this to raise an exception
     # this should fail fast
     dt = datetime.strptime(raw_st, '%Y%m%d%H%M')
@@ -326,5 +417,36 @@ def get_start_time(obj):
 
 
 def get_default_url(obj):
-    config = ensure_config(obj)
-    return config.get(SK_DEFAULT_URL)
+    return get_params(obj).default_url
+
+
+def get_clearing_engine(obj):
+    return get_params(obj).clearing_engine
+
+
+def is_batch_clearing(obj):
+    return get_params(obj).batch_clearing
+
+
+def get_dividend_seed(obj):
+    return get_params(obj).dividend_seed
+
+
+def is_order_journal(obj):
+    return get_params(obj).order_journal
+
+
+def get_depth_feed_ms(obj):
+    """
+    @return: the least time between broadcasts of the group's order book depth, in ms;
+        0 if the depth is not shown
+    """
+    return get_params(obj).depth_feed_ms
+
+
+def is_margin_calls(obj):
+    """
+    Whether clearing adds buy-in and sell-off orders for the players due one.  Only the
+    vector engine does.
+    """
+    return get_params(obj).margin_calls
@@ -1,8 +1,11 @@
-import decimal
 from collections import defaultdict
 from math import floor
 from rounds.call_market import CallMarket
-from . import tool_tip
+from rounds.batch_market import BatchCallMarket
+from rounds.clearing import from_cents
+from rounds.dividends import init_dividend_schedule
+from rounds.prefetch import get_previous_round_players, load_participants
+from . import bootstrap, depth_feed, group_cache, market_history, order_book, order_form, order_journal, live_limits, live_latency
 from .models import Player, Group, Order, OrderErrorCode, OrderType, cu, Page, WaitPage, BaseSubsession, BaseConstants, Subsession
 from .sample_hist import SAMPLE_HIST
 import common.SessionConfigFunctions as scf
@@ -60,6 +63,12 @@ def creating_session(subsession: Subsession):
     for p in subsession.get_players():
         p.participant.quiz_grade = 0
 
+    # Draw the dividends for the whole session up front
+    if subsession.round_number == 1:
+        if scf.is_margin_calls(subsession) and scf.get_clearing_engine(subsession) != scf.CLEARING_ENGINE_VECTOR:
+            raise ValueError("margin_calls needs clearing_engine='vector'")
+        init_dividend_schedule(subsession, Constants.num_rounds)
+
 
 # assign treatments
 def assign_endowments(subsession):
@@ -279,37 +288,19 @@ def get_js_vars(player: Player, include_current=False, show_notes=False, show_ca
     
     # Price History
     group: Group = player.group
-    if include_current:
-        # TODO: Try doing this with player.round_number
-        groups = list(filter(lambda g: g.field_maybe_none('price') is not None, group.in_all_rounds()))
-    else:
-        groups = group.in_previous_rounds()
-
     init_price = scf.get_init_price(player)
-    
 
     if scf.is_random_hist(player):
         end_idx = player.round_number + (0 if include_current else -1)
-        prices = [init_price] + SAMPLE_HIST["price"][0:end_idx]
-        volumes = SAMPLE_HIST["volume"][0:end_idx]
-        
-    else:
-        prices = [init_price] + [g.price for g in groups]
-        volumes = [0] + [g.volume for g in groups]
-       
-    # show practice rounds?
-    npract = Constants.num_practice
-    if is_practice:
-        labels = list(range(0, npract + 1))
-        prices = prices[:npract+1]
-        volumes = volumes[:npract+1]
+        prices = SAMPLE_HIST["price"][0:end_idx]
+        # The sample volumes already start with the 0 of the initial price
+        volumes = SAMPLE_HIST["volume"][1:end_idx]
     else:
-        labels = list(range(0, Constants.num_rounds - npract + 1))
-        prices = [init_price] + prices[npract+1:]
-        volumes = [0] + volumes[npract+1:]
+        prices, volumes = market_history.get_history(group, include_current=include_current)
 
-    # Error Codes
-    error_codes = {e.value: e.to_dict() for e in OrderErrorCode}
+    # show practice rounds?
+    labels, prices, volumes = market_history.get_chart_data(prices, volumes, init_price, is_practice,
+                                                            Constants.num_practice, Constants.num_rounds)
 
     if scf.is_random_hist(player):
         market_price = prices[-1]
@@ -332,12 +323,10 @@ def get_js_vars(player: Player, include_current=False, show_notes=False, show_ca
         price_data=prices,
         volume_data=volumes,
         num_periods=Constants.num_rounds,
-        error_codes=error_codes,
         show_notes=show_notes,
         show_cancel=show_cancel,
         market_price=market_price,
         market_price_str=mp_str,
-        tt=tool_tip.get_tool_tip_data(player),
         show_next=show_next,
         is_practice = is_practice,
     )
@@ -353,10 +342,11 @@ def get_js_vars(player: Player, include_current=False, show_notes=False, show_ca
 def is_order_valid(player, data, orders_by_type):
     """
     Check order form information.  This is both a syntactic and semantic check.
+    All price arithmetic is done in integer cents.
     @param data: Data from the otree live page's packet
     @return: Error Code - 0 if valid
     @return: An OrderType object if valid, None otherwise
-    @return: The price as an integer if valid, None otherwise
+    @return: The price in cents if valid, None otherwise
     @return: The quantity as an integer if valid, None otherwise
     """
     error_code, o_type, price, quant = is_order_form_valid(data)
@@ -377,12 +367,11 @@ def is_order_valid(player, data, orders_by_type):
     if error_code > 0:
         return error_code, o_type, price, quant
 
-    offers = orders_by_type[OrderType.OFFER]
-    bids = orders_by_type[OrderType.BID]
+    player_orders = order_book.as_player_orders(orders_by_type)
 
     # If this is a bid, then its price must be less than the lowest ask
-    min_ask = min([o.price for o in offers], default=999999999)
-    max_bid = max([o.price for o in bids], default=-999)
+    min_ask = player_orders.min_ask_cents if player_orders.min_ask_cents is not None else 999999999
+    max_bid = player_orders.max_bid_cents if player_orders.max_bid_cents is not None else -999
 
     if o_type == OrderType.BID and price >= min_ask:
         return OrderErrorCode.BID_GREATER_THAN_ASK.combine(error_code), o_type, price, quant
@@ -391,10 +380,10 @@ def is_order_valid(player, data, orders_by_type):
         return OrderErrorCode.ASK_LESS_THAN_BID.combine(error_code), o_type, price, quant
 
     # disallow margin trading and shorting
-    if o_type == OrderType.OFFER and is_shorting(player, offers, quant):
+    if o_type == OrderType.OFFER and is_shorting(player, player_orders, quant):
         return OrderErrorCode.SHORTING.combine(error_code), o_type, price, quant
 
-    if o_type == OrderType.BID and is_margin(player, bids, quant, price):
+    if o_type == OrderType.BID and is_margin(player, player_orders, quant, price):
         return OrderErrorCode.MARGIN.combine(error_code), o_type, price, quant
 
     return error_code, o_type, price, quant
@@ -407,81 +396,41 @@ def is_order_form_valid(data):
     @param data: Data from the otree live page's packet
     @return: Error Code - 0 if valid
     @return: An OrderType object if valid, None otherwise
-    @return: The price as an integer if valid, None otherwise
+    @return: The price in cents if valid, None otherwise
     @return: The quantity as an integer if valid, None otherwise
     """
-    raw_type = data['type']
-    raw_price = data['price']
-    raw_quant = data['quantity']
-
-    error_code = 0
-    #more_price_quant_checks = True
-
-    # # Checks for raw length
-    # if len(raw_price) > 10:
-    #     error_code = OrderErrorCode.PRICE_LEN_RAW.combine(error_code)
-    #     more_price_quant_checks = False
-    #
-    # if len(raw_quant) > 5:
-    #     error_code = OrderErrorCode.QUANT_LEN_RAW.combine(error_code)
-    #     more_price_quant_checks = False
-
-    price = None
-    quant = None
-    # Numeric Tests  - Price and Quantity must be numeric
-    try:
-        price = cu(raw_price)
-    except (ValueError, decimal.InvalidOperation):
-        error_code = OrderErrorCode.PRICE_NOT_NUM.combine(error_code)
-
-    # if not raw_quant.lstrip('-').isnumeric():
-    #     error_code = OrderErrorCode.QUANT_NOT_NUM.combine(error_code)
-    # else:
-    quant = int(raw_quant)
-
-    # PRICE CEILING
-    if price and price >= 10000:
-        error_code = OrderErrorCode.PRICE_CEIL.combine(error_code)
-
-    # QUANT CEILING
-    if quant and quant >= 100:
-         error_code = OrderErrorCode.QUANT_CEIL.combine(error_code)
-
-
-    # Order type checks
-    o_type = None
-    if raw_type not in ['SELL', 'BUY']:
-        error_code = OrderErrorCode.BAD_TYPE.combine(error_code)
-    else:
-        t = -1 if raw_type == 'BUY' else 1
-        o_type = OrderType(int(t))
-    return error_code, o_type, price, quant
+    return order_form.parse_order_form(data)
 
 
-def is_shorting(player, offers,  quant):
-    outstanding_quant = sum([o.quantity for o in offers])
-    return outstanding_quant + quant > player.shares
+def is_shorting(player, player_orders, quant):
+    return player_orders.supply + quant > player.shares
 
 
-def is_margin(player, bids, quant, price):
-    outstanding_cost = sum([o.quantity * o.price for o in bids])
-    return outstanding_cost + quant*price > player.cash
+def is_margin(player, player_orders, quant, price):
+    """
+    @param price: price in cents
+    """
+    return player_orders.buy_cost_cents + quant*price > order_form.parse_price_cents(player.cash)
 
 
 def get_order_warnings(player, o_type, price, quant, orders_by_type):
+    """
+    @param price: price of the order in cents
+    """
     warnings = []
+    player_orders = order_book.as_player_orders(orders_by_type)
 
     # show a warning if the combined orders can cause a short
-    existing_supply = sum((o.quantity for o in orders_by_type[OrderType.OFFER]))
+    existing_supply = player_orders.supply
     test_supply = existing_supply + quant if o_type == OrderType.OFFER else existing_supply
     if test_supply > 0 and player.shares < test_supply:
         warnings.append("Note:  Depending on market conditions, your combined SELL orders might result in a short "
                         "STOCK position.")
 
-    existing_cost = sum((o.price * o.quantity for o in orders_by_type[OrderType.BID]))
+    existing_cost = player_orders.buy_cost_cents
     order_cost = price * quant
     test_cost = existing_cost + order_cost if o_type == OrderType.BID else existing_cost
-    if test_cost > 0 and player.cash < test_cost:
+    if test_cost > 0 and order_form.parse_price_cents(player.cash) < test_cost:
         warnings.append("Note:  Depending on market conditions, your combined BUY orders might require you to borrow "
                         "CASH.")
 
@@ -496,6 +445,16 @@ def get_orders_by_type(existing_orders):
 
 
 def create_order_from_live_submit(player, o_type: OrderType, price, quant, ts, o_cls=Order):
+    if o_cls is Order and scf.is_order_journal(player):
+        # Confirm right away; the order is written with the next flush of the journal.
+        o = order_journal.journal.submit(player, player.group,
+                                         order_type=o_type.value,
+                                         price=price,
+                                         quantity=quant,
+                                         timestamp=ts)
+        order_book.order_added(o)
+        return {'func': 'order_confirmed', 'order_id': o.id}
+
     # TODO:  Does this need to go in a transaction?
     o = o_cls.create(player=player,
                      group=player.group,
@@ -507,37 +466,92 @@ def create_order_from_live_submit(player, o_type: OrderType, price, quant, ts, o
 
     # Commit the order so that we can get an id.
     database.db.commit()
+    order_book.order_added(o)
 
     return {'func': 'order_confirmed', 'order_id': o.id}
 
 
 def get_orders_for_player_live(orders, show_notes):
-    orders_dicts = [o.to_dict() for o in orders]
+    orders_dicts = [order_to_live_dict(o, show_notes) for o in orders]
+    return dict(func='order_list', orders=orders_dicts)
+
 
-    for o in orders_dicts:
-        # Format price to two decimals
-        o['price'] = f"{o['price']:.2f}"
+def order_to_live_dict(order, show_notes):
+    """
+    The order as shown in the live order list.  Cached order snapshots keep the formatted
+    dict, so it is only built once per order.
+    """
+    cache = getattr(order, 'live_dicts', None)
+    if cache is not None and show_notes in cache:
+        return cache[show_notes]
 
-        o['note'] = '&nbsp;'
-        if show_notes:
-            quant_orig = o.get('original_quantity')
-            quant = o.get('quantity')
+    o = order.to_dict()
+    # Format price to two decimals
+    o['price'] = f"{o['price']:.2f}"
 
-            if o.get('is_buy_in'):
-                o['note'] = "<span class='auto-order'>Automatic</span>"
-            elif quant_orig != 0 and quant == 0:
-                o['note'] = "<span class='canceled-order'>Canceled</span>"
-            elif quant_orig is not None and quant_orig != quant:
-                o['note'] = f"Capped to {quant}"
+    o['note'] = '&nbsp;'
+    if show_notes:
+        quant_orig = o.get('original_quantity')
+        quant = o.get('quantity')
 
-    return dict(func='order_list', orders=orders_dicts)
+        if o.get('is_buy_in'):
+            o['note'] = "<span class='auto-order'>Automatic</span>"
+        elif quant_orig != 0 and quant == 0:
+            o['note'] = "<span class='canceled-order'>Canceled</span>"
+        elif quant_orig is not None and quant_orig != quant:
+            o['note'] = f"Capped to {quant}"
+
+    if cache is not None:
+        cache[show_notes] = o
+    return o
+
+
+def get_order_list_live(player_orders, d, show_notes):
+    """
+    The player's order list for a get_orders_for_player message.  When the page says which
+    version of the orders it holds, only the orders added and removed since are sent.
+    @param d: the message; may carry the 'epoch' and 'version' of the last list the page got
+    """
+    # The orders are formatted differently with notes; a list without them is not reused
+    epoch = player_orders.epoch + ('-notes' if show_notes else '')
+    changes = None
+    if d.get('epoch') == epoch:
+        changes = player_orders.changes_since(d.get('version'))
+
+    if changes is None:
+        ret = get_orders_for_player_live(list(player_orders), show_notes)
+    else:
+        added, removed = changes
+        ret = dict(func='order_delta',
+                   added=[order_to_live_dict(player_orders.orders[oid], show_notes) for oid in added],
+                   removed=removed)
+
+    ret.update(epoch=epoch, version=player_orders.version)
+    return ret
 
 
 # noinspection PyUnresolvedReferences
 def delete_order(player, oid, o_cls=Order):
+    """
+    @return: whether an open order of the player was deleted
+    """
+    # The page sends the id as a string
+    try:
+        oid = int(oid)
+    except (TypeError, ValueError):
+        return False
+
+    # An order still in the journal was never written
+    o = order_journal.journal.discard(oid, player_id=player.id)
+    if o is not None:
+        order_book.order_deleted(o)
+        return True
+
     obs = o_cls.filter(player=player, id=oid)
     for o in obs:
         o_cls.delete(o)
+        order_book.order_deleted(o)
+    return bool(obs)
 
 
 def result_page_live_method(player, d, o_cls=Order):
@@ -548,42 +562,162 @@ def forecast_page_live_method(player, d, o_cls=Order):
     return market_page_live_method(player, d, o_cls=o_cls, show_warnings=False)
 
 
+def market_grid_live_method(player, d, o_cls=Order):
+    """
+    The market page's live method: the order messages, plus the group's order book depth
+    when the session shows it.
+    """
+    interval = scf.get_depth_feed_ms(player)
+    if not interval:
+        return market_page_live_method(player, d, o_cls=o_cls)
+
+    feed = depth_feed.get_feed(player.group_id, interval)
+    if d['func'] == 'get_depth':
+        update = feed.poll(order_book.get_book(player.group))
+        response = {player.id_in_group: feed.full()}
+    else:
+        response = market_page_live_method(player, d, o_cls=o_cls)
+        update = feed.poll(order_book.get_book(player.group))
+
+    ret = response[player.id_in_group]
+    if update is None:
+        if d['func'] in ('submit-order', 'delete_order', 'batch') and feed.wait_ms() > 0:
+            # The order may be in the next update; the page asks for it when it is due
+            response = {player.id_in_group: dict(ret, depth_wait_ms=feed.wait_ms())}
+        return response
+
+    # Broadcast the update to the group
+    if feed.player_ids is None:
+        feed.player_ids = [p.id_in_group for p in player.group.get_players()]
+    broadcast = {pid: update for pid in feed.player_ids}
+    broadcast[player.id_in_group] = ret if ret['func'] == 'depth_full' else dict(ret, depth=update)
+    return broadcast
+
+
 def market_page_live_method(player, d, o_cls=Order, show_warnings=True, show_notes=False):
     func = d['func']
+    recorder = live_latency.recorder
+    received = recorder.now()
+
+    if func == 'batch':
+        ret = batch_live_method(player, d, o_cls=o_cls, show_warnings=show_warnings, received=received)
+        recorder.record(player.group_id, 'ack', received)
+        return {player.id_in_group: ret}
+
+    is_write = func in ('submit-order', 'delete_order')
+    write_allowed = not is_write or live_limits.throttle.allow_write(player.id)
 
     # Do delete first.  it might change the outcome of get_orders_for_player
-    if func == 'delete_order':
+    if func == 'delete_order' and write_allowed:
         delete_order(player, d['oid'], o_cls=o_cls)
 
-    orders_for_player = get_orders_for_player(player, o_cls=o_cls)
-    orders_by_type = get_orders_by_type(orders_for_player)
+    # The player's open orders with running totals; kept up to date by submit and delete.
+    orders_by_type = order_book.get_player_orders(player, o_cls=o_cls)
+
+    read_key = None
+    if func == 'get_orders_for_player':
+        read_key = (show_notes, show_warnings, d.get('epoch'), d.get('version'),
+                    orders_by_type.epoch, orders_by_type.version)
+        response = live_limits.throttle.recent_read(player.id, read_key)
+        if response is not None:
+            recorder.record(player.group_id, 'read', received)
+            return response
+
     ret = {}
     this_order_q = 0
     this_order_p = 0
     this_order_t = 'no_order'
 
-    if func == 'submit-order':
+    if not write_allowed:
+        ret.update({'func': 'order_rejected', 'error_code': OrderErrorCode.RATE_LIMITED.value})
+        if func == 'delete_order':
+            # The page already took the order off its list; send the list it should show
+            ret['order_list'] = get_order_list_live(orders_by_type, {}, show_notes)
+
+    elif func == 'submit-order':
         data = d['data']
+        ts = data.get('ts')
+        recorder.record_arrival(player.group_id, player.id, received, ts)
+        validating = recorder.now()
         error_code, t, p, q = is_order_valid(player, data, orders_by_type)
-        ts = data['ts']
+        recorder.record(player.group_id, 'validate', validating)
 
         if error_code == 0:
-            ret.update(create_order_from_live_submit(player, t, p, q, ts, o_cls=o_cls))
-            this_order_q = q
-            this_order_p = p
-            this_order_t = t
+            confirmation = create_order_from_live_submit(player, t, from_cents(p), q, ts, o_cls=o_cls)
+            ret.update(confirmation)
+            # Count the new order in the warnings unless it's already in the player's open orders
+            if confirmation['order_id'] not in orders_by_type:
+                this_order_q = q
+                this_order_p = p
+                this_order_t = t
         else:
             ret.update({'func': 'order_rejected', 'error_code': error_code})
 
     elif func == 'get_orders_for_player':
-        ret.update(get_orders_for_player_live(orders_for_player, show_notes))
+        ret.update(get_order_list_live(orders_by_type, d, show_notes))
 
     # generate warnings
     if show_warnings:
         warnings = get_order_warnings(player, this_order_t, this_order_p, this_order_q, orders_by_type)
         ret['warnings'] = warnings
 
-    return {player.id_in_group: ret}
+    response = {player.id_in_group: ret}
+    if read_key is not None:
+        live_limits.throttle.store_read(player.id, read_key, response)
+    recorder.record(player.group_id, 'ack' if is_write else 'read', received)
+    return response
+
+
+def batch_live_method(player, d, o_cls=Order, show_warnings=True, received=None):
+    """
+    Apply a list of submit and delete operations from one message.  The operations are
+    validated in order against the player's open orders, loaded once; each accepted
+    operation is visible to the ones after it.  The message counts as one write against
+    the player's rate limit, however many operations it carries.
+    @param d: {'func': 'batch', 'seq': <echoed back>, 'ops': [{'op': 'submit-order', 'data': ...},
+            {'op': 'delete_order', 'oid': ...}, ...]}
+    @param received: when the message was received, by the latency recorder's clock
+    @return: one result per operation, in order, and the warnings for the resulting orders
+    """
+    recorder = live_latency.recorder
+    received = recorder.now() if received is None else received
+    orders_by_type = order_book.get_player_orders(player, o_cls=o_cls)
+    results = []
+
+    ops = d.get('ops', [])
+    write_allowed = (not any(op.get('op') in ('submit-order', 'delete_order') for op in ops)
+                     or live_limits.throttle.allow_write(player.id))
+
+    for op in ops:
+        kind = op.get('op')
+        if kind in ('submit-order', 'delete_order') and not write_allowed:
+            results.append({'func': 'op_rejected', 'error_code': OrderErrorCode.RATE_LIMITED.value})
+
+        elif kind == 'submit-order':
+            data = op['data']
+            ts = data.get('ts')
+            recorder.record_arrival(player.group_id, player.id, received, ts)
+            validating = recorder.now()
+            error_code, t, p, q = is_order_valid(player, data, orders_by_type)
+            recorder.record(player.group_id, 'validate', validating)
+            if error_code == 0:
+                results.append(create_order_from_live_submit(player, t, from_cents(p), q, ts, o_cls=o_cls))
+            else:
+                results.append({'func': 'order_rejected', 'error_code': error_code})
+
+        elif kind == 'delete_order':
+            if delete_order(player, op['oid'], o_cls=o_cls):
+                results.append({'func': 'order_deleted', 'oid': op['oid']})
+            else:
+                results.append({'func': 'op_rejected', 'oid': op['oid']})
+
+        else:
+            results.append({'func': 'op_rejected'})
+
+    ret = {'func': 'batch_result', 'seq': d.get('seq'), 'results': results}
+    if show_warnings:
+        ret['warnings'] = get_order_warnings(player, 'no_order', 0, 0, orders_by_type)
+    return ret
 
 
 # END LIVE METHODS
@@ -612,9 +746,12 @@ def get_mp_to_show(player: Player, d: dict, include_current=False):
     
 
 
-def standard_vars_for_template(player: Player):
+def group_vars_for_template(player: Player):
+    """
+    The template variables that are the same for every player in the group this round.
+    """
     ret = scf.ensure_config(player)
-    
+
     # determine if these are practice sessions
     is_practice = player.group.is_practice
     ret['real_rn'] = player.round_number if is_practice else player.round_number - Constants.num_practice
@@ -622,16 +759,35 @@ def standard_vars_for_template(player: Player):
     ret['is_practice'] = is_practice
     ret['num_practice'] = Constants.num_practice
 
-    
     marg_req = ret.get(scf.SK_MARGIN_RATIO)
     ret['marg_req_pct'] = f"{marg_req :.0%}"
     ret['margin_buffer_pct'] = f"{1 + marg_req:.0%}"
+
+    price, _ = get_mp_to_show(player, ret)
+    ret['market_price'] = price
+    ret['interest_pct'] = f"{scf.get_interest_rate(player):.0%}"
+    ret['dividends'] = " or ".join(str(d) for d in scf.get_dividend_amounts(player))
+    ret['buy_back'] = scf.get_fundamental_value(player)
+    ret['short'] = player.group.short
+
+    # Error codes and tool tips, as a script that is the same on every page of the session
+    ret['bootstrap_js'] = bootstrap.get_bootstrap_path(player)
+    if ret['bootstrap_js'] is None:
+        ret['bootstrap_script'] = bootstrap.get_script(bootstrap.get_payload(player))
+    return ret
+
+
+def standard_vars_for_template(player: Player):
+    # The group's values, computed for the first player of the group to get here
+    shared = group_cache.get_group_value(player.group, 'vars_for_template',
+                                         lambda: group_vars_for_template(player))
+    ret = dict(shared)
+
     ret['for_results'] = False
     ret['cash'] = player.cash
     ret['shares'] = player.shares
 
-
-    price, _ = get_mp_to_show(player, ret)
+    price = ret['market_price']
     value_of_stock, equity, debt, limit, close = player.get_holding_details(price)
     ret['stock_val'] = value_of_stock
     ret['vos_neg_cls'] = 'neg-val' if value_of_stock < 0 else ''
@@ -643,11 +799,6 @@ def standard_vars_for_template(player: Player):
     ret['close_limit'] = close
     ret['is_short'] = player.is_short()
     ret['is_debt'] = player.is_debt()
-    ret['market_price'] = price
-    ret['interest_pct'] = f"{scf.get_interest_rate(player):.0%}"
-    ret['dividends'] = " or ".join(str(d) for d in scf.get_dividend_amounts(player))
-    ret['buy_back'] = scf.get_fundamental_value(player)
-    ret['short'] = player.group.short
 
     ret['messages'] = []  # The market page will populate this
     ret['attn_cls'] = ''
@@ -764,6 +915,7 @@ def vars_for_market_template(player: Player):
     ret['show_pop_up'] = player.round_number > (Constants.num_rounds - 5)
     ret['num_rounds_left'] = Constants.num_rounds - player.round_number + 1
     ret['action_include'] = 'insert_order_grid.html'
+    ret['show_depth'] = scf.get_depth_feed_ms(player) > 0
 
     return ret
 
@@ -873,8 +1025,10 @@ def vars_for_round_results_template(player: Player):
     ret['is_debt'] = player.is_debt()
     ret['market_price'] = price
 
-    short = abs(sum([p.shares_result for p in player.group.get_players() if p.shares_result < 0]))
-    ret['short'] = short
+    ret['short'] = player.group.field_maybe_none('short_result')
+    if ret['short'] is None:
+        # Cleared before the group kept its totals
+        ret['short'] = group_cache.get_group_value(player.group, 'short_result', lambda: get_short_result(player.group))
 
     filled_amount = abs(player.shares_transacted)
     orders = get_orders_for_player(player)
@@ -900,6 +1054,10 @@ def vars_for_round_results_template(player: Player):
     return ret
 
 
+def get_short_result(group: Group):
+    return abs(sum([p.shares_result for p in group.get_players() if p.shares_result < 0]))
+
+
 def vars_for_risk_template(player: Player):
     ret = standard_vars_for_template(player)
     return ret
@@ -954,54 +1112,130 @@ def pre_round_tasks(group: Group):
 
     assign_endowments(group)
 
-    # Determine auto transaction statuses
-    # And copy previous round results to the current player object
-    for p in group.get_players():
-        # Copy results from the previous player
-        # Don't copy previous results for the first real market round.
-        if p.round_number != Constants.num_practice + 1:
-            p.copy_results_from_previous_round()
+    # Copy previous round results to the current player objects and determine the auto
+    # transaction statuses.  The previous round's players are loaded with one query.
+    players = group.get_players()
+    prev_players = get_previous_round_players(players)
+    load_participants(players)
+
+    # The last round's results page may have rebuilt the caches of the cleared groups
+    for group_id in {p.group_id for p in prev_players.values()}:
+        order_book.discard_group(group_id)
+    # Don't copy previous results for the first real market round.
+    copy_results = group.round_number != Constants.num_practice + 1
+
+    total_shares = 0
+    short = 0
+    num_auto_trans = 0
+    num_traders = 0
+    for p in players:
+        prev_player = prev_players.get(p.participant_id)
+        if copy_results:
+            p.copy_results_from(prev_player)
 
         # update margin violations
-        p.determine_auto_trans_status()
+        p.determine_auto_trans_status_from(prev_player)
+
+        # update round number
+        # this step is necessary for the monitoring app to correctly pick up the
+        # current round number.
+        p.participant.current_round = group.round_number
+
+        active = p.is_active()
+        num_traders += active
+        if active:
+            total_shares += p.shares
+        if p.shares < 0:
+            short -= p.shares
+        if p.is_auto_buy() or p.is_auto_sell():
+            num_auto_trans += 1
 
     # Determine the float and set it on all group objects
     if group.round_number == 1:
         print(f"PRE_ROUND: {group}")
-        print(group.get_players())
-        group.determine_float()
+        print(players)
+        group.float = total_shares
     else:
         # copy float from previous round
         prev_g = group.in_round_or_none(group.round_number - 1)
         if prev_g:  # should be guaranteed a group object here, but just in case.
             group.float = prev_g.float
 
-    # Calculate total shorts
-    group.short = abs(sum(p.shares for p in group.get_players() if p.shares < 0))
-    
-    # update round number
-    # this step is necessary for the monitoring app to correctly pick up the
-    # current round number.
-    for p in group.get_players():
-        p.participant.current_round = group.round_number
+    group.short = short
+    group.num_auto_trans = num_auto_trans
+    group.num_traders = num_traders
+
+    group_cache.discard_group_values(group)
 
 
 #######################################
 # CALCULATE MARKET
 def calculate_market(group: Group):
+    # Orders confirmed from the journal must be in the database before the market clears
+    order_journal.flush()
     cm = CallMarket(group)
     cm.calculate_market()
+    # The group's book is not needed after the market clears
+    order_book.market_cleared([group])
+    save_live_latency(group)
+    market_history.record_round(group)
+    group_cache.discard_group_values(group)
+
+    players = group.get_players()
+    group.determine_result_aggregates(players)
 
     # TODO: Remove f0 forecast reward
-    for p in group.get_players():
+    for p in players:
         # Process current round forecasts
         p.determine_forecast_reward(group.price)
 
 
+def calculate_market_for_subsession(subsession: Subsession):
+    if scf.get_clearing_engine(subsession) != scf.CLEARING_ENGINE_VECTOR:
+        # Batch clearing uses the vector engine; the legacy engine clears group by group.
+        for group in subsession.get_groups():
+            calculate_market(group)
+        return
+
+    order_journal.flush()
+    cm = BatchCallMarket(subsession)
+    cm.calculate_market()
+    order_book.market_cleared(cm.groups)
+    for group in cm.groups:
+        save_live_latency(group)
+        market_history.record_round(group)
+        group_cache.discard_group_values(group)
+
+    players_by_group = defaultdict(list)
+    for p_data in cm.players:
+        players_by_group[p_data.player.group_id].append(p_data.player)
+    for group in cm.groups:
+        group.determine_result_aggregates(players_by_group[group.id])
+
+    # TODO: Remove f0 forecast reward
+    for p_data in cm.players:
+        p = p_data.player
+        p.determine_forecast_reward(p.group.price)
+
+
+def save_live_latency(group: Group):
+    """
+    Add the latency histograms recorded for the group's live messages to the group.
+    """
+    hists = live_latency.recorder.pop_group(group.id)
+    if not hists:
+        return
+    saved = group.field_maybe_none('live_latency')
+    saved = json.loads(saved) if saved else {}
+    group.live_latency = json.dumps(live_latency.merge_saved(saved, hists))
+
+
 def custom_export(players):
     yield ['session', 'participant', 'part_label', 'round_number', 'type', 'quantity', 'price',
            'quantity_final', 'original_quantity', 'automatic', 'timestamp', 'market_price', 'volume']
 
+    # Include the confirmed orders that are still in the journal
+    order_journal.flush()
     for p in players:
         session = p.session
         part = p.participant
@@ -1017,11 +1251,33 @@ def custom_export(players):
 
 
 def vars_for_admin_report(subsession: BaseSubsession):
+    # Include the confirmed orders that are still in the journal
+    order_journal.flush()
     group = subsession.get_groups()[0]
     players = group.get_players()
+    groups = subsession.get_groups()
+    aggregates = [dict(group=g.id_in_subsession,
+                       **{f: g.field_maybe_none(f) for f in ['num_traders', 'float', 'short', 'num_auto_trans', 'price',
+                                                            'volume', 'buy_volume', 'sell_volume', 'short_result',
+                                                            'num_bankrupt', 'num_margin_violations']})
+                  for g in groups]
+
+    latency = []
+    for g in groups:
+        saved = g.field_maybe_none('live_latency')
+        if saved:
+            for stage, summary in live_latency.summarize(json.loads(saved)).items():
+                row = dict(group=g.id_in_subsession, stage=stage, n=summary['n'], mean=round(summary['mean'], 2))
+                for q in ('p50', 'p95', 'p99'):
+                    p = summary[q]
+                    row[q] = f"<= {p}" if p is not None else f"> {live_latency.BUCKETS_MS[-1]}"
+                latency.append(row)
+
     return {"orders": Order.filter(group=group),
             "sess_vars": subsession.session.label,
-            "plys": players}
+            "plys": players,
+            "aggregates": aggregates,
+            "latency": latency}
 
 
 def determine_bonus(player: Player):
@@ -1237,7 +1493,7 @@ class MarketGridChoice(Page):
     # method bindings
     js_vars = get_js_vars_grid
     vars_for_template = vars_for_market_template
-    live_method = market_page_live_method
+    live_method = market_grid_live_method
 
 
     @staticmethod
@@ -1269,6 +1525,24 @@ class MarketWaitPage(WaitPage):
     after_all_players_arrive = calculate_market
     app_after_this_page = app_after_this_page_common
 
+    @staticmethod
+    def is_displayed(player: Player):
+        return not scf.is_batch_clearing(player)
+
+
+class MarketWaitPageBatch(WaitPage):
+    """
+    Clears the markets of all groups at once.  Used instead of MarketWaitPage when
+    batch_clearing is set in the session config.
+    """
+    wait_for_all_groups = True
+    after_all_players_arrive = calculate_market_for_subsession
+    app_after_this_page = app_after_this_page_common
+
+    @staticmethod
+    def is_displayed(player: Player):
+        return scf.is_batch_clearing(player)
+
 
 class RoundResultsPage(Page):
     template_name = 'rounds/MarketPageModular.html'
@@ -1512,6 +1786,7 @@ page_sequence = [WaitForAll,
                  ForecastPage,
                  #Fixate,
                  MarketWaitPage,
+                 MarketWaitPageBatch,
                  RoundResultsPage,
                  #Fixate,
                  #RiskWaitPage,
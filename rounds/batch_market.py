@@ -0,0 +1,134 @@
+import random
+
+import numpy as np
+
+from rounds.models import *
+from rounds.bulk_write import BulkWriter
+from rounds.call_market import ensure_player_data
+from rounds.dividends import get_scheduled_dividend
+from rounds.prefetch import MarketPrefetch
+from rounds.clearing import NO_TRADE, clear_groups, from_cents, to_cents
+from rounds.data_structs import OrderBatch
+from rounds.margin import add_forced_orders
+
+
+class BatchCallMarket:
+    """
+    Clears the markets of every group in a subsession in one pass.  The orders of all groups
+    are loaded with a single query and cleared together in one group-indexed OrderBatch.
+    This is the vector engine; calculate_market_for_subsession clears group by group when
+    the session asks for the legacy engine.
+    """
+
+    def __init__(self, subsession: Subsession):
+        self.subsession = subsession
+        self.groups = subsession.get_groups()
+        self.group_index = {g.id: i for i, g in enumerate(self.groups)}
+        self.prefetch = MarketPrefetch.for_subsession(subsession, get_orders_for_groups(self.groups))
+        self.params = self.prefetch.params
+        self.orders = self.prefetch.orders
+        self.players = ensure_player_data(self.prefetch.players.values())
+        self.player_index = {p_data.player.id: i for i, p_data in enumerate(self.players)}
+        self.batch = OrderBatch.from_orders(self.orders, self.player_index, self.group_index)
+        self.net_shares = None
+        self.interest_rate = scf.get_interest_rate(self.params)
+        self.dividends = self.get_dividends()
+        self.writer = BulkWriter()
+
+    def get_dividends(self):
+        session = self.subsession.session
+        dividends = [get_scheduled_dividend(session, g.round_number, g.id_in_subsession) for g in self.groups]
+        if None not in dividends:
+            return dividends
+
+        div_probabilities = scf.get_dividend_probabilities(self.params)
+        div_amounts = scf.get_dividend_amounts(self.params)
+        # No schedule for this session; one independent draw for each group's market
+        return random.choices(div_amounts, weights=div_probabilities, k=len(self.groups))
+
+    def calculate_market(self):
+        market_prices, market_volumes = self.get_market_prices()
+        self.fill_orders(market_prices)
+
+        # Compute new player positions
+        for p_data in self.players:
+            self.compute_player_position(p_data, market_prices)
+
+        if scf.is_margin_calls(self.params):
+            market_prices, market_volumes = self.clear_margin_orders(market_prices, market_volumes)
+
+        self.final_updates(market_prices, market_volumes)
+
+    def get_market_prices(self):
+        """
+        @return: list of market prices (Currency) and list of market volumes, indexed like self.groups
+        """
+        b = self.batch
+        price_cents, volumes = clear_groups(b.group_idx, b.price, b.quantity, b.order_type, len(self.groups))
+
+        market_prices = []
+        for group, p in zip(self.groups, price_cents):
+            # Nothing traded in this group.  Set price to last price
+            if p == NO_TRADE:
+                market_prices.append(cu(group.get_last_period_price()))
+            else:
+                market_prices.append(from_cents(p))
+
+        return market_prices, [int(v) for v in volumes]
+
+    def fill_orders(self, market_prices):
+        self.batch.fill(to_cents(market_prices))
+        self.net_shares = self.batch.net_shares(len(self.players))
+
+    def clear_margin_orders(self, market_prices, market_volumes):
+        """
+        Add the buy-in and sell-off orders of the players whose new positions violate the
+        margin, and clear the groups again with them.
+        @return: the market prices and volumes with the margin orders
+        """
+        group_idx = np.fromiter((self.group_index[d.player.group_id] for d in self.players), dtype=np.int64,
+                                count=len(self.players))
+        batch = add_forced_orders(self.batch, self.params, self.players, [float(p) for p in market_prices],
+                                  group_idx)
+        if batch is None:
+            return market_prices, market_volumes
+
+        self.batch = b = batch
+        price_cents, volumes = clear_groups(b.group_idx, b.price, b.quantity, b.order_type, len(self.groups))
+        # A group where nothing trades keeps its price
+        market_prices = [p if c == NO_TRADE else from_cents(c) for p, c in zip(market_prices, price_cents)]
+        market_volumes = [int(v) for v in volumes]
+
+        b.refill(to_cents(market_prices))
+        self.net_shares = b.net_shares(len(self.players))
+        for p_data in self.players:
+            self.compute_player_position(p_data, market_prices)
+        return market_prices, market_volumes
+
+    def compute_player_position(self, data_for_player, market_prices):
+        player = data_for_player.player
+        i = self.group_index[player.group_id]
+        shares_transacted = int(self.net_shares[self.player_index[player.id]])
+        data_for_player.set_new_position(shares_transacted, self.dividends[i], self.interest_rate, market_prices[i])
+
+    def final_updates(self, market_prices, market_volumes):
+        self.batch.write_back(self.writer)
+        for p_data in self.players:
+            p_data.update_player(self.writer)
+        self.writer.flush()
+
+        for group, price, volume, dividend in zip(self.groups, market_prices, market_volumes, self.dividends):
+            group.price = price
+            group.volume = volume
+            group.dividend = dividend
+
+
+def get_orders_for_groups(groups):
+    """
+    Load the orders of all the given groups with one query.
+    """
+    group_ids = [g.id for g in groups]
+    if not group_ids:
+        return []
+    return list(Order.objects_filter(Order.group_id.in_(group_ids)).order_by(Order.id))
+
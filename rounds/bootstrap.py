@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+
+from rounds import tool_tip
+from rounds.models import OrderErrorCode
+
+# The scripts are written under this app's static directory, which oTree serves from
+# wherever the server is started
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+BOOTSTRAP_DIR = 'rounds/bootstrap'
+
+# (session code, group float) -> static path of the script, or None if it could not be written
+_PATHS = {}
+
+
+def get_payload(player):
+    """
+    The data the market pages' scripts need that is the same on every page of a session.
+    """
+    return dict(
+        error_codes={e.value: e.to_dict() for e in OrderErrorCode},
+        tt=tool_tip.get_tool_tip_data(player),
+    )
+
+
+def get_bootstrap_path(player):
+    """
+    The script that sets window.BOOTSTRAP to the payload, for the {{ static }} tag.  It is
+    built once per session; the file is named after a hash of its content, so browsers can
+    keep it for as long as they like and a change gets a new name.
+    @return: path of the script relative to the static directory, or None if the static
+            directory cannot be written; the page then gets get_script() inline
+    """
+    # The float is the one group value in the tool tips
+    key = (player.session.code, player.group.field_maybe_none('float'))
+    if key not in _PATHS:
+        _PATHS[key] = write_script(get_script(get_payload(player)))
+    return _PATHS[key]
+
+
+def get_script(payload):
+    # '</' would end an inline <script> element
+    data = json.dumps(payload, sort_keys=True).replace('</', '<\\/')
+    return f"window.BOOTSTRAP = {data};\n"
+
+
+def write_script(script):
+    content = script.encode()
+    digest = hashlib.sha1(content).hexdigest()[:16]
+    path = f"{BOOTSTRAP_DIR}/{digest}.js"
+
+    file_name = os.path.join(STATIC_DIR, BOOTSTRAP_DIR, f"{digest}.js")
+    if os.path.isfile(file_name):
+        return path
+
+    # Write to a temporary file first so the script is never served half written
+    tmp_name = f"{file_name}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        with open(tmp_name, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_name, file_name)
+    except OSError:
+        # A read-only deploy
+        return None
+
+    return path
@@ -0,0 +1,64 @@
+from sqlalchemy import inspect
+from sqlalchemy.orm.attributes import set_committed_value
+
+from otree import database
+
+from rounds import order_journal
+from rounds.models import Order, Player
+
+
+class BulkWriter:
+    """
+    Collects the order and player rows changed by market clearing and writes them with
+    batched UPDATE and INSERT statements instead of one ORM flush per row.
+
+    Updated values are applied to the loaded objects right away as committed values, so
+    the rest of the round sees them without the ORM flushing each object again.  Objects
+    that are not persistent (new or detached) are simply assigned to.
+    """
+
+    def __init__(self):
+        self.updates = {Order: {}, Player: {}}  # model -> id -> row
+        self.order_inserts = []
+
+    def update_order(self, order, **values):
+        self.update(Order, order, values)
+
+    def update_player(self, player, **values):
+        self.update(Player, player, values)
+
+    def update(self, model, obj, values):
+        state = inspect(obj, raiseerr=False)
+        if state is None or not state.persistent:
+            for k, v in values.items():
+                setattr(obj, k, v)
+            return
+
+        for k, v in values.items():
+            set_committed_value(obj, k, v)
+        self.updates[model].setdefault(obj.id, {'id': obj.id}).update(values)
+
+    def insert_order(self, player, group, **values):
+        self.order_inserts.append(dict(values, player_id=player.id, group_id=group.id))
+
+    def flush(self, session=None):
+        """
+        Write all collected rows.  The statements run in the current transaction.
+        """
+        if session is None:
+            session = database.db._db
+
+        for model, rows in self.updates.items():
+            if rows:
+                session.bulk_update_mappings(model, list(rows.values()))
+                rows.clear()
+
+        if self.order_inserts:
+            # A bulk insert skips the mapper events, so ids are taken from the journal here
+            for row in self.order_inserts:
+                if 'id' not in row:
+                    oid = order_journal.journal.outside_id(session.connection())
+                    if oid is not None:
+                        row['id'] = oid
+            session.bulk_insert_mappings(Order, self.order_inserts)
+            self.order_inserts = []
@@ -1,32 +1,49 @@
 import random
-from collections import defaultdict
 
 from rounds.models import *
-from call_market_price2 import MarketPrice2, OrderFill2
-from rounds.data_structs import DataForPlayer
+from rounds import order_book
+from rounds.bulk_write import BulkWriter
+from rounds.clearing import NO_TRADE, VectorMarketPrice, VectorOrderFill, clear_groups, from_cents, to_cents
+from rounds.data_structs import DataForPlayer, OrderBatch
+from rounds.dividends import get_scheduled_dividend
+from rounds.margin import add_forced_orders
+from rounds.prefetch import MarketPrefetch
 
 
 class CallMarket:
 
-    def __init__(self, group: Group):
+    def __init__(self, group: Group, prefetch: MarketPrefetch = None):
         self.group = group
+        self.prefetch = prefetch if prefetch is not None else MarketPrefetch.for_group(group)
+        self.params = self.prefetch.params
         self.bids, self.offers = self.get_orders_for_group()
         self.dividend = self.get_dividend()
-        self.interest_rate = scf.get_interest_rate(group)
-        self.orders_by_player = get_orders_by_player(concat_or_null([self.bids, self.offers]))
-        self.players = ensure_player_data(group.get_players())
+        self.interest_rate = scf.get_interest_rate(self.params)
+        self.orders_by_player = self.prefetch.orders_by_player_id()
+        self.players = ensure_player_data(self.prefetch.players.values())
+        self.player_index = {p_data.player.id: i for i, p_data in enumerate(self.players)}
+        self.writer = BulkWriter()
+        # Columnar book and net shares per player; set when the vector engine fills the orders
+        self.batch = None
+        self.net_shares = None
 
 
     def get_orders_for_group(self):
-        group_orders = Order.filter(group=self.group)
+        group_orders = self.prefetch.orders
         bids = [o for o in group_orders if OrderType(o.order_type) == OrderType.BID]
         offers = [o for o in group_orders if OrderType(o.order_type) == OrderType.OFFER]
         return bids, offers
 
 
     def get_dividend(self):
-        div_probabilities = scf.get_dividend_probabilities(self.group)
-        div_amounts = scf.get_dividend_amounts(self.group)
+        dividend = get_scheduled_dividend(self.group.session, self.group.round_number,
+                                          self.group.id_in_subsession)
+        if dividend is not None:
+            return dividend
+
+        # No schedule for this session; draw now.
+        div_probabilities = scf.get_dividend_probabilities(self.params)
+        div_amounts = scf.get_dividend_amounts(self.params)
         # The realized dividend will be a random draw from the distribution described by the amounts and probs
         dividend = random.choices(div_amounts, weights=div_probabilities)[0]
         return dividend
@@ -42,6 +59,8 @@ class CallMarket:
             #this call will mutate the player data
             self.compute_player_position(player, market_price)
 
+        if self.batch is not None and scf.is_margin_calls(self.params):
+            market_price, market_volume = self.clear_margin_orders(market_price, market_volume)
 
         # Perform final updates
         # with the last completed iteration.
@@ -58,8 +77,14 @@ class CallMarket:
         b = concat_or_null([self.bids, algo_bids])
         o = concat_or_null([self.offers, algo_offers])
 
-        mp = MarketPrice2(b, o)
-        market_price, market_volume = mp.get_market_price()
+        price_engine, _ = get_clearing_engines(self.params)
+        if price_engine is VectorMarketPrice and not algo_orders:
+            # The live order messages keep an aggregated book of the group; clear from that.
+            book = order_book.get_book(self.group, orders=concat_or_null([b, o]) or [])
+            market_price, market_volume = book.get_market_price()
+        else:
+            mp = price_engine(b, o)
+            market_price, market_volume = mp.get_market_price()
         # This can happen is there are no orders made
         # Set price to last price
         if market_price is None:
@@ -70,19 +95,57 @@ class CallMarket:
 
 
     def fill_orders(self, market_price):
-        of = OrderFill2(concat_or_null([self.bids, self.offers]))
+        _, fill_engine = get_clearing_engines(self.params)
+        orders = concat_or_null([self.bids, self.offers])
+        if fill_engine is VectorOrderFill:
+            # Fill on the columnar book; the fills are copied to the orders in final_updates.
+            self.batch = OrderBatch.from_orders(orders or [], self.player_index)
+            self.batch.fill(to_cents([market_price]))
+            self.net_shares = self.batch.net_shares(len(self.players))
+            return
+
+        of = fill_engine(orders)
         of.fill_orders(market_price)
 
 
+    def clear_margin_orders(self, market_price, market_volume):
+        """
+        Add the buy-in and sell-off orders of the players whose new positions violate the
+        margin, and clear again with them.
+        @return: the market price and volume with the margin orders
+        """
+        batch = add_forced_orders(self.batch, self.params, self.players, float(market_price))
+        if batch is None:
+            return market_price, market_volume
+
+        self.batch = batch
+        price_cents, volumes = clear_groups(batch.group_idx, batch.price, batch.quantity, batch.order_type, 1)
+        if price_cents[0] != NO_TRADE:
+            market_price, market_volume = from_cents(price_cents[0]), int(volumes[0])
+
+        batch.refill(to_cents([market_price]))
+        self.net_shares = batch.net_shares(len(self.players))
+        for player in self.players:
+            self.compute_player_position(player, market_price)
+        return market_price, market_volume
+
     def compute_player_position(self, data_for_player, market_price):
-        orders = self.orders_by_player[data_for_player.player]
+        if self.net_shares is not None:
+            shares_transacted = int(self.net_shares[self.player_index[data_for_player.player.id]])
+            data_for_player.set_new_position(shares_transacted, self.dividend, self.interest_rate, market_price)
+            return
+
+        orders = self.orders_by_player[data_for_player.player.id]
         data_for_player.get_new_player_position(orders, self.dividend, self.interest_rate, market_price)
 
 
     def final_updates(self, market_price, market_volume):
         # Final Updates
+        if self.batch is not None:
+            self.batch.write_back(self.writer)
         for p_data in self.players:
-            p_data.update_player()
+            p_data.update_player(self.writer)
+        self.writer.flush()
 
         # Update the group
         self.group.price = market_price
@@ -102,6 +165,20 @@ class CallMarket:
 
 
 
+def get_clearing_engines(obj):
+    """
+    Select the market price and order fill implementations from the session config.
+    @param obj: an oTree model, a session config dict or MarketParams
+    @return: (market price class, order fill class)
+    """
+    if scf.get_clearing_engine(obj) == scf.CLEARING_ENGINE_VECTOR:
+        return VectorMarketPrice, VectorOrderFill
+
+    # The legacy engine is an external package, so only import it when it is asked for.
+    from call_market_price2 import MarketPrice2, OrderFill2
+    return MarketPrice2, OrderFill2
+
+
 def concat_or_null(list_of_list_of_orders):
     all_none = True
     for o_list in list_of_list_of_orders:
@@ -116,16 +193,6 @@ def concat_or_null(list_of_list_of_orders):
     return ret
 
 
-def get_orders_by_player(orders):
-    d = defaultdict(list)
-    if orders is None:
-        return d
-
-    for o in orders:
-        d[o.player].append(o)
-    return d
-
-
 def ensure_player_data(players):
     if players is None:
         return players
@@ -0,0 +1,279 @@
+import numpy as np
+
+from otree.api import Currency as cu
+
+from rounds.models import OrderType
+
+BID = OrderType.BID.value
+OFFER = OrderType.OFFER.value
+
+# Market price of a group in which nothing traded
+NO_TRADE = -1
+
+
+def to_cents(prices):
+    """
+    Convert an iterable of prices (Currency, float or int) into an integer array of cents.
+    Working in integer cents keeps the price comparisons exact.
+    @param prices: iterable of prices
+    @return: numpy int64 array
+    """
+    as_float = np.fromiter((float(p) for p in prices), dtype=np.float64)
+    return np.rint(as_float * 100).astype(np.int64)
+
+
+def from_cents(price_cents):
+    return cu(int(price_cents) / 100)
+
+
+def aggregate_levels(prices, quants, types):
+    """
+    Aggregate an order book into price levels.
+    @param prices: int array of prices in cents
+    @param quants: int array of quantities
+    @param types: int array of order types (-1 BID, 1 OFFER)
+    @return: sorted unique price levels, bid quantity per level, offer quantity per level
+    """
+    _, levels, bid_qty, offer_qty = aggregate_group_levels(np.zeros(prices.size, dtype=np.int64),
+                                                           prices, quants, types)
+    return levels, bid_qty, offer_qty
+
+
+def aggregate_group_levels(group_idx, prices, quants, types):
+    """
+    Aggregate the order books of many groups into price levels.
+    @param group_idx: int array with the index of the group of each order
+    @param prices: int array of prices in cents
+    @param quants: int array of quantities
+    @param types: int array of order types (-1 BID, 1 OFFER)
+    @return: group of each level, price of each level, bid quantity per level, offer quantity per level.
+            Levels are sorted by group and then price.
+    """
+    span = int(prices.max()) + 1 if prices.size else 1
+    keys, inverse = np.unique(group_idx * span + prices, return_inverse=True)
+    is_bid = types == BID
+    bid_qty = np.bincount(inverse, weights=np.where(is_bid, quants, 0), minlength=keys.size)
+    offer_qty = np.bincount(inverse, weights=np.where(is_bid, 0, quants), minlength=keys.size)
+    return keys // span, keys % span, bid_qty.astype(np.int64), offer_qty.astype(np.int64)
+
+
+def segment_starts(keys):
+    """
+    Index of the first element of each run of equal values in a sorted key array.
+    """
+    if keys.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+def segment_ids(starts, n):
+    """
+    Map each of the n elements to the segment that contains it.
+    """
+    return np.repeat(np.arange(starts.size), np.diff(np.append(starts, n)))
+
+
+def clear_levels(levels, bid_qty, offer_qty):
+    """
+    Determine the clearing price from an aggregated book.
+    @param levels: sorted unique price levels in cents
+    @param bid_qty: bid quantity at each level
+    @param offer_qty: offer quantity at each level
+    @return: The market price in cents (None if nothing trades), the market volume
+    """
+    level_group = np.zeros(levels.size, dtype=np.int64)
+    prices, volumes = clear_group_levels(level_group, levels, bid_qty, offer_qty, 1)
+    if prices[0] == NO_TRADE:
+        return None, 0
+    return int(prices[0]), int(volumes[0])
+
+
+def clear_group_levels(level_group, levels, bid_qty, offer_qty, n_groups):
+    """
+    Determine the clearing price of every group from aggregated books.
+
+    The price is chosen from the candidate price levels by applying, in order, the
+    maximum volume, least residual, market pressure and reference price principles.
+    @param level_group: group index of each level, sorted
+    @param levels: price of each level in cents, sorted within each group
+    @param bid_qty: bid quantity at each level
+    @param offer_qty: offer quantity at each level
+    @param n_groups: number of groups
+    @return: int array of market prices in cents (NO_TRADE if nothing trades), int array of volumes
+    """
+    prices = np.full(n_groups, NO_TRADE, dtype=np.int64)
+    volumes = np.zeros(n_groups, dtype=np.int64)
+    n = levels.size
+    if n == 0:
+        return prices, volumes
+
+    starts = segment_starts(level_group)
+    seg = segment_ids(starts, n)
+
+    # Cumulative supply at or below each price and cumulative demand at or above each price
+    cs_offer = np.cumsum(offer_qty)
+    csq = cs_offer - (cs_offer - offer_qty)[starts][seg]
+    cs_bid = np.cumsum(bid_qty)
+    bids_below = cs_bid - bid_qty - (cs_bid - bid_qty)[starts][seg]
+    cbq = np.add.reduceat(bid_qty, starts)[seg] - bids_below
+    mev = np.minimum(cbq, csq)
+
+    # Maximum volume principle
+    max_volume = np.maximum.reduceat(mev, starts)[seg]
+    cand = (mev == max_volume) & (max_volume > 0)
+
+    # Least residual principle
+    residual = np.where(cand, np.abs(cbq - csq), np.iinfo(np.int64).max)
+    cand &= residual == np.minimum.reduceat(residual, starts)[seg]
+
+    # Market pressure principle - the highest price under buy pressure and the lowest price
+    # under sell pressure.  Reference price principle - the higher of those two.
+    idx = np.arange(n)
+    buy_pressure = cbq >= csq
+    hi_buy = np.maximum.reduceat(np.where(cand & buy_pressure, idx, -1), starts)
+    lo_sell = np.minimum.reduceat(np.where(cand & ~buy_pressure, idx, n), starts)
+    pick = np.maximum(hi_buy, np.where(lo_sell == n, -1, lo_sell))
+
+    traded = pick >= 0
+    groups = level_group[starts][traded]
+    prices[groups] = levels[pick[traded]]
+    volumes[groups] = mev[pick[traded]]
+    return prices, volumes
+
+
+def clear_book(prices, quants, types):
+    """
+    Determine the clearing price of a raw (unaggregated) order book.
+    @param prices: int array of prices in cents
+    @param quants: int array of quantities
+    @param types: int array of order types
+    @return: The market price in cents (None if nothing trades), the market volume
+    """
+    return clear_levels(*aggregate_levels(prices, quants, types))
+
+
+def clear_groups(group_idx, prices, quants, types, n_groups):
+    """
+    Determine the clearing price of every group from a raw order book holding the orders of all groups.
+    @return: int array of market prices in cents (NO_TRADE if nothing trades), int array of volumes
+    """
+    return clear_group_levels(*aggregate_group_levels(group_idx, prices, quants, types), n_groups)
+
+
+def fill_priority(prices, quants, types, group_idx=None):
+    """
+    The order in which orders are filled.  Bids are filled highest price first, offers
+    lowest price first.  Ties on price go to the larger bid and the smaller offer.
+    @return: index array into the book
+    """
+    side = np.where(types == BID, -1, 1)
+    if group_idx is None:
+        group_idx = np.zeros(prices.size, dtype=np.int64)
+    # np.lexsort sorts on the last key first and is stable for ties.
+    return np.lexsort((side * quants, side * prices, types, group_idx))
+
+
+def fill_book(prices, quants, types, market_price):
+    """
+    Compute the filled quantity of each order at the given market price.
+    @param prices: int array of prices in cents
+    @param quants: int array of quantities
+    @param types: int array of order types
+    @param market_price: the market price in cents
+    @return: int array of filled quantities, boolean array of orders reached by the fill
+    """
+    group_idx = np.zeros(prices.size, dtype=np.int64)
+    return fill_groups(group_idx, prices, quants, types, np.array([market_price], dtype=np.int64))
+
+
+def fill_groups(group_idx, prices, quants, types, market_prices):
+    """
+    Compute the filled quantity of each order for a book holding the orders of many groups.
+    @param group_idx: int array with the index of the group of each order
+    @param prices: int array of prices in cents
+    @param quants: int array of quantities
+    @param types: int array of order types
+    @param market_prices: int array with the market price in cents of each group (NO_TRADE to skip)
+    @return: int array of filled quantities, boolean array of orders reached by the fill
+    """
+    fills = np.zeros(prices.size, dtype=np.int64)
+    reached = np.zeros(prices.size, dtype=bool)
+
+    mp = market_prices[group_idx]
+    is_bid = types == BID
+    eligible = (mp != NO_TRADE) & np.where(is_bid, prices >= mp, prices <= mp)
+
+    n_groups = market_prices.size
+    bid_volume = np.bincount(group_idx, weights=np.where(eligible & is_bid, quants, 0), minlength=n_groups)
+    offer_volume = np.bincount(group_idx, weights=np.where(eligible & ~is_bid, quants, 0), minlength=n_groups)
+    volume = np.minimum(bid_volume, offer_volume).astype(np.int64)
+
+    # Walk each (group, side) in priority order
+    order = fill_priority(prices, quants, types, group_idx)
+    idx = order[eligible[order]]
+    if idx.size == 0:
+        return fills, reached
+
+    q = quants[idx]
+    starts = segment_starts(group_idx[idx] * 2 + is_bid[idx])
+    seg = segment_ids(starts, idx.size)
+    cs = np.cumsum(q)
+    before = cs - q - (cs - q)[starts][seg]
+    vol = volume[group_idx[idx]]
+    fills[idx] = np.clip(vol - before, 0, q)
+    reached[idx] = before < vol
+
+    return fills, reached
+
+
+def orders_to_arrays(orders):
+    """
+    Pull the price, quantity and type columns out of a list of orders.
+    """
+    n = len(orders)
+    prices = to_cents(o.price for o in orders)
+    quants = np.fromiter((o.quantity for o in orders), dtype=np.int64, count=n)
+    types = np.fromiter((o.order_type for o in orders), dtype=np.int64, count=n)
+    return prices, quants, types
+
+
+class VectorMarketPrice:
+    """
+    Drop-in replacement for MarketPrice2 built on numpy arrays.
+    """
+
+    def __init__(self, bids, offers):
+        self.bids = bids or []
+        self.offers = offers or []
+
+    def get_market_price(self):
+        orders = self.bids + self.offers
+        if not self.bids or not self.offers:
+            return None, 0
+
+        price, volume = clear_book(*orders_to_arrays(orders))
+        if price is None:
+            return None, 0
+        return from_cents(price), volume
+
+
+class VectorOrderFill:
+    """
+    Drop-in replacement for OrderFill2 built on numpy arrays.
+    """
+
+    def __init__(self, orders, writer=None):
+        self.orders = orders or []
+        self.writer = writer
+
+    def fill_orders(self, market_price):
+        if not self.orders:
+            return
+
+        prices, quants, types = orders_to_arrays(self.orders)
+        fills, reached = fill_book(prices, quants, types, to_cents([market_price])[0])
+        for i in np.flatnonzero(reached):
+            if self.writer is None:
+                self.orders[i].quantity_final = int(fills[i])
+            else:
+                self.writer.update_order(self.orders[i], quantity_final=int(fills[i]))
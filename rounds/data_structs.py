@@ -4,6 +4,7 @@ import numpy as np
 
 from common import SessionConfigFunctions as scf
 from rounds.models import Order, Player, OrderType
+from rounds.clearing import fill_groups, to_cents
 
 
 class DataForOrder:
@@ -44,8 +45,20 @@ class DataForOrder:
         self.original_quantity = self.quantity
         self.quantity = 0
 
-    def update_order(self):
-        if self.order is None:
+    def update_order(self, writer=None):
+        """
+        Write this data back to the order, creating the order if needed.
+        @param writer: optional BulkWriter that collects the change for a batched write
+        """
+        if self.order is None and writer is not None:
+            writer.insert_order(self.player, self.group,
+                                order_type=self.order_type,
+                                price=self.price,
+                                quantity=self.quantity,
+                                is_buy_in=self.is_buy_in,
+                                quantity_final=self.quantity_final,
+                                original_quantity=self.original_quantity)
+        elif self.order is None:
             self.order = Order.create(player=self.player,
                                       group=self.group,
                                       order_type=self.order_type,
@@ -54,6 +67,12 @@ class DataForOrder:
                                       is_buy_in=self.is_buy_in,
                                       quantity_final=self.quantity_final,
                                       original_quantity=self.original_quantity)
+        elif writer is not None:
+            writer.update_order(self.order,
+                                quantity=self.quantity,
+                                quantity_final=self.quantity_final,
+                                original_quantity=self.original_quantity,
+                                is_buy_in=self.is_buy_in)
         else:
             o = self.order
             o.quantity = self.quantity
@@ -87,6 +106,131 @@ class DataForOrder:
         return self.__str__()
 
 
+class OrderBatch:
+    """
+    Columnar (structure-of-arrays) form of a book of orders.  Clearing, filling and the
+    position computation run on the arrays; the orders themselves are only touched again
+    when the fills are written back.
+    """
+
+    def __init__(self, orders, price, quantity, order_type, player_idx, group_idx=None,
+                 quantity_final=None, is_buy_in=None):
+        """
+        @param orders: the order behind each row
+        @param price: int array of prices in cents
+        @param quantity: int array of quantities
+        @param order_type: int array of order types
+        @param player_idx: int array with the index of the player of each order
+        @param group_idx: int array with the index of the group of each order; all zero if None
+        @param quantity_final: int array of filled quantities; all zero if None
+        @param is_buy_in: bool array of automatic orders; all False if None
+        """
+        n = len(orders)
+        self.orders = orders
+        self.price = price
+        self.quantity = quantity
+        self.order_type = order_type
+        self.player_idx = player_idx
+        self.group_idx = group_idx if group_idx is not None else np.zeros(n, dtype=np.int64)
+        self.quantity_final = quantity_final if quantity_final is not None else np.zeros(n, dtype=np.int64)
+        self.is_buy_in = is_buy_in if is_buy_in is not None else np.zeros(n, dtype=bool)
+        self.reached = np.zeros(n, dtype=bool)
+
+    @classmethod
+    def from_orders(cls, orders, player_index, group_index=None):
+        """
+        @param orders: list of Order
+        @param player_index: dict of player id -> player index
+        @param group_index: dict of group id -> group index.  None if the orders are all from one group.
+        @return: OrderBatch
+        """
+        orders = list(orders)
+        n = len(orders)
+        group_idx = None
+        if group_index is not None:
+            group_idx = np.fromiter((group_index[o.group_id] for o in orders), dtype=np.int64, count=n)
+
+        return cls(orders,
+                   price=to_cents(o.price for o in orders),
+                   quantity=np.fromiter((o.quantity for o in orders), dtype=np.int64, count=n),
+                   order_type=np.fromiter((o.order_type for o in orders), dtype=np.int64, count=n),
+                   player_idx=np.fromiter((player_index[o.player_id] for o in orders), dtype=np.int64, count=n),
+                   group_idx=group_idx,
+                   quantity_final=np.fromiter((o.quantity_final or 0 for o in orders), dtype=np.int64, count=n),
+                   is_buy_in=np.fromiter((bool(o.is_buy_in) for o in orders), dtype=bool, count=n))
+
+    @classmethod
+    def concat(cls, batches):
+        """
+        Stack batches into one, e.g. the book and the forced margin orders.
+        @param batches: list of OrderBatch
+        @return: OrderBatch
+        """
+        batches = list(batches)
+        joined = cls([o for b in batches for o in b.orders],
+                     price=np.concatenate([b.price for b in batches]),
+                     quantity=np.concatenate([b.quantity for b in batches]),
+                     order_type=np.concatenate([b.order_type for b in batches]),
+                     player_idx=np.concatenate([b.player_idx for b in batches]),
+                     group_idx=np.concatenate([b.group_idx for b in batches]),
+                     quantity_final=np.concatenate([b.quantity_final for b in batches]),
+                     is_buy_in=np.concatenate([b.is_buy_in for b in batches]))
+        joined.reached = np.concatenate([b.reached for b in batches])
+        return joined
+
+    def __len__(self):
+        return len(self.orders)
+
+    def fill(self, market_prices):
+        """
+        Fill the orders at the market price of their group.
+        @param market_prices: int array with the market price in cents of each group
+        """
+        fills, reached = fill_groups(self.group_idx, self.price, self.quantity, self.order_type, market_prices)
+        self.quantity_final[reached] = fills[reached]
+        self.reached |= reached
+
+    def refill(self, market_prices):
+        """
+        Fill again, e.g. after orders were added to the batch.  The fills of the earlier
+        fill are taken back first.
+        @param market_prices: int array with the market price in cents of each group
+        """
+        self.quantity_final[self.reached] = 0
+        self.reached[:] = False
+        self.fill(market_prices)
+
+    def net_shares(self, num_players):
+        """
+        @return: int array with the net number of shares each player bought (negative if sold)
+        """
+        if not len(self):
+            return np.zeros(num_players, dtype=np.int64)
+        net = np.bincount(self.player_idx, weights=-self.order_type * self.quantity_final, minlength=num_players)
+        return net.astype(np.int64)
+
+    def write_back(self, writer=None):
+        """
+        Copy the fills of the reached orders back to the orders.  Rows holding a new
+        DataForOrder (e.g. a forced margin order) are created whether reached or not.
+        @param writer: optional BulkWriter that collects the change for a batched write
+        """
+        for i, o in enumerate(self.orders):
+            if isinstance(o, DataForOrder) and o.order is None:
+                o.quantity_final = int(self.quantity_final[i])
+                o.update_order(writer)
+
+        for i in np.flatnonzero(self.reached):
+            o = self.orders[i]
+            if isinstance(o, DataForOrder):
+                continue
+            quantity_final = int(self.quantity_final[i])
+            if writer is None:
+                o.quantity_final = quantity_final
+            else:
+                writer.update_order(o, quantity_final=quantity_final)
+
+
 class DataForPlayer:
     def __init__(self, player: Player):
         self.player = player
@@ -105,7 +249,10 @@ class DataForPlayer:
     def get_new_player_position(self, orders, dividend, interest_rate, market_price):
         # calculate players positions
         net_shares_per_order = (-1 * o.order_type * o.quantity_final for o in orders)
-        self.shares_transacted = sum(net_shares_per_order)
+        self.set_new_position(sum(net_shares_per_order), dividend, interest_rate, market_price)
+
+    def set_new_position(self, shares_transacted, dividend, interest_rate, market_price):
+        self.shares_transacted = shares_transacted
         self.shares_result = self.player.shares + self.shares_transacted
         self.new_position = self.player.shares + self.shares_transacted
         self.trans_cost = -1 * self.shares_transacted * market_price
@@ -188,7 +335,22 @@ class DataForPlayer:
                             quantity=number_of_shares,
                             is_buy_in=True)
 
-    def update_player(self):
+    def update_player(self, writer=None):
+        """
+        Write the new position back to the player.
+        @param writer: optional BulkWriter that collects the change for a batched write
+        """
+        if writer is not None:
+            writer.update_player(self.player,
+                                 shares_result=self.shares_result,
+                                 shares_transacted=self.shares_transacted,
+                                 trans_cost=self.trans_cost,
+                                 cash_after_trade=self.cash_after_trade,
+                                 dividend_earned=self.dividend_earned,
+                                 interest_earned=self.interest_earned,
+                                 cash_result=self.cash_result)
+            return
+
         p = self.player
         p.shares_result = self.shares_result
         p.shares_transacted = self.shares_transacted
@@ -0,0 +1,84 @@
+import time
+
+from rounds.models import OrderType
+
+
+class DepthFeed:
+    """
+    The depth of a group's order book - the total quantity bid and offered at each price -
+    as last published to the group's players.  A new publication is made at most every
+    interval_ms, with only the price levels that changed since the last one, so a burst of
+    orders costs one broadcast per interval instead of one per order.
+
+    oTree live methods can only send when a message comes in, so the feed is polled on
+    every live message of the group; a change made during the interval goes out with the
+    first message after it.
+    """
+
+    def __init__(self, group_id, interval_ms, clock=time.monotonic):
+        self.group_id = group_id
+        self.interval_ms = interval_ms
+        self.clock = clock
+        self.version = 0
+        self.published = {o_type: {} for o_type in OrderType}  # OrderType -> price in cents -> quantity
+        self.last_publish = None
+        self.player_ids = None  # id_in_group of the group's players; set on first broadcast
+
+    def wait_ms(self):
+        """
+        @return: ms until the next publication may be made
+        """
+        if self.last_publish is None:
+            return 0
+        return max(0, self.interval_ms - (self.clock() - self.last_publish) * 1000)
+
+    def poll(self, book):
+        """
+        Publish the changes in the book if the interval has passed.
+        @param book: the group's OrderBook
+        @return: a depth_update message, or None if nothing is published
+        """
+        if self.wait_ms() > 0:
+            return None
+
+        changes = {}
+        current = {}
+        for o_type in OrderType:
+            levels = dict(book.side(o_type.value))
+            published = self.published[o_type]
+            changed = [[p, q] for p, q in levels.items() if published.get(p) != q]
+            changed += [[p, 0] for p in published.keys() - levels.keys()]
+            changes[o_type.name] = sorted(changed)
+            current[o_type] = levels
+
+        if not any(changes.values()):
+            return None
+
+        prev = self.version
+        self.version += 1
+        self.published = current
+        self.last_publish = self.clock()
+        return dict(func='depth_update', prev=prev, version=self.version, levels=changes)
+
+    def full(self):
+        """
+        @return: the published depth, all levels
+        """
+        levels = {o_type.name: sorted([p, q] for p, q in self.published[o_type].items()) for o_type in OrderType}
+        return dict(func='depth_full', version=self.version, levels=levels)
+
+
+# Feeds of the groups of this process, keyed by group id
+_FEEDS = {}
+
+
+def get_feed(group_id, interval_ms):
+    feed = _FEEDS.get(group_id)
+    if feed is None:
+        feed = DepthFeed(group_id, interval_ms)
+        _FEEDS[group_id] = feed
+    return feed
+
+
+def discard_feed(group_id):
+    _FEEDS.pop(group_id, None)
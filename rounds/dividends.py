@@ -0,0 +1,59 @@
+import numpy as np
+
+import common.SessionConfigFunctions as scf
+
+# session.vars key of the dividend schedule
+DIVIDEND_SCHEDULE = 'dividend_schedule'
+
+
+def generate_dividend_schedule(config, num_rounds, num_groups, seed=None):
+    """
+    Draw the dividend of every group in every round from a dedicated generator.
+    @param config: session config (dict or model)
+    @param num_rounds: number of rounds to draw for
+    @param num_groups: number of groups in a round
+    @param seed: seed of the generator; a fresh seed is chosen if None
+    @return: dict holding the seed, the dividend amounts and one byte per draw (the index of
+            the amount) in round-major order.
+    """
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy)
+
+    amounts = scf.get_dividend_amounts(config)
+    probabilities = scf.get_dividend_probabilities(config)
+    rng = np.random.default_rng(seed)
+    draws = rng.choice(len(amounts), size=num_rounds * num_groups, p=probabilities / probabilities.sum())
+
+    return dict(seed=seed,
+                amounts=[float(a) for a in amounts],
+                num_groups=num_groups,
+                draws=draws.astype(np.uint8).tobytes())
+
+
+def init_dividend_schedule(subsession, num_rounds):
+    seed = scf.get_dividend_seed(subsession)
+    subsession.session.vars[DIVIDEND_SCHEDULE] = generate_dividend_schedule(subsession, num_rounds,
+                                                                            len(subsession.get_groups()),
+                                                                            seed=seed)
+
+
+def get_scheduled_dividend(session, round_number, id_in_subsession=1):
+    """
+    Look up a group's dividend for a round.  Reads the underlying dict of session.vars, so
+    the lookup does not mark the session as changed (see market_history.read_history).
+    @return: The dividend, or None if the session has no schedule covering the group and round.
+    """
+    schedule = session._vars.get(DIVIDEND_SCHEDULE)
+    if schedule is None or not round_number or not id_in_subsession:
+        return None
+
+    num_groups = schedule['num_groups']
+    if id_in_subsession > num_groups:
+        return None
+
+    idx = (round_number - 1) * num_groups + id_in_subsession - 1
+    draws = schedule['draws']
+    if idx >= len(draws):
+        return None
+
+    return schedule['amounts'][draws[idx]]
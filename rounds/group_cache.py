@@ -0,0 +1,25 @@
+# Values shared by all the players of a group, keyed by group id, then name
+_GROUP_VALUES = {}
+# Size at which the cache is emptied; a group only needs its values for one round
+MAX_GROUPS = 256
+
+
+def get_group_value(group, name, compute):
+    """
+    Get a value that is the same for every player of the group, computing it on first use.
+    @param compute: function of no arguments that computes the value
+    """
+    values = _GROUP_VALUES.get(group.id)
+    if values is None:
+        if len(_GROUP_VALUES) >= MAX_GROUPS:
+            _GROUP_VALUES.clear()
+        values = _GROUP_VALUES[group.id] = {}
+
+    if name not in values:
+        values[name] = compute()
+    return values[name]
+
+
+def discard_group_values(group):
+    # The group's state changed (pre-round tasks, clearing)
+    _GROUP_VALUES.pop(group.id, None)
@@ -0,0 +1,148 @@
+import bisect
+import time
+from collections import defaultdict
+
+# Upper edges of the histogram buckets, in milliseconds; the last bucket has no upper edge
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# arrival:  How much later than the player's fastest message an order arrived, from the
+#           client timestamp (batching delay, network and queueing on the server)
+# validate: Time to validate one order
+# ack:      Time from receiving a submit, delete or batch message to its reply
+# read:     Time from receiving an order list request to its reply
+STAGES = ('arrival', 'validate', 'ack', 'read')
+# Number of cleared groups a recorder remembers, to ignore their later messages
+MAX_CLOSED = 1024
+
+
+class Histogram:
+    def __init__(self, counts=None, total_ms=0.0):
+        self.counts = list(counts) if counts else [0] * (len(BUCKETS_MS) + 1)
+        self.total_ms = total_ms
+
+    @property
+    def n(self):
+        return sum(self.counts)
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total_ms += ms
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total_ms += other.total_ms
+
+    def percentile(self, q):
+        """
+        @return: the upper edge of the bucket holding the q-th percentile; None if empty or
+            the percentile is in the open-ended bucket
+        """
+        n = self.n
+        if n == 0:
+            return None
+        rank = q / 100 * n
+        seen = 0
+        for edge, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return edge
+        return None
+
+    def to_dict(self):
+        return dict(counts=self.counts, total_ms=round(self.total_ms, 3))
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['counts'], d['total_ms'])
+
+    def summary(self):
+        n = self.n
+        return dict(n=n,
+                    mean=self.total_ms / n if n else None,
+                    p50=self.percentile(50),
+                    p95=self.percentile(95),
+                    p99=self.percentile(99))
+
+
+class LatencyRecorder:
+    """
+    Latency histograms of the live order messages, per group.  The histograms are kept in
+    memory while the market is open and saved on the group when it clears; messages of a
+    group after that, from the results page, are not recorded.
+
+    The client timestamp of an order is the time since the page loaded, so it can't be
+    compared to the server clock directly.  The difference between the server's receive
+    time and the timestamp is the page's clock offset plus the delay of the message; the
+    smallest difference seen from a player stands for the offset, and what an order adds to
+    it is recorded as its arrival delay.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.groups = defaultdict(lambda: {stage: Histogram() for stage in STAGES})
+        # group id -> player id -> smallest (receive time - client timestamp) in ms
+        self.offsets = defaultdict(dict)
+        # ids of the groups that were popped, oldest first
+        self.closed = {}
+
+    def now(self):
+        return self.clock()
+
+    def record(self, group_id, stage, start, end=None):
+        """
+        Record the time since start, in seconds from the clock, for the stage.
+        """
+        if group_id in self.closed:
+            return
+        end = self.clock() if end is None else end
+        self.groups[group_id][stage].add((end - start) * 1000)
+
+    def record_arrival(self, group_id, player_id, received, ts):
+        if type(ts) not in (int, float) or ts <= 0 or group_id in self.closed:
+            return
+
+        offset = received * 1000 - ts
+        offsets = self.offsets[group_id]
+        best = offsets.get(player_id)
+        if best is None or offset < best:
+            offsets[player_id] = best = offset
+        self.groups[group_id]['arrival'].add(offset - best)
+
+    def pop_group(self, group_id):
+        """
+        @return: the group's histograms as dicts; forgets the group and stops recording it
+        """
+        if len(self.closed) >= MAX_CLOSED:
+            del self.closed[next(iter(self.closed))]
+        self.closed[group_id] = True
+        self.offsets.pop(group_id, None)
+        hists = self.groups.pop(group_id, None)
+        if hists is None:
+            return {}
+        return {stage: h.to_dict() for stage, h in hists.items() if h.n}
+
+
+def merge_saved(saved, hists):
+    """
+    Merge histograms into ones saved earlier, both as dicts.
+    """
+    merged = dict(saved)
+    for stage, d in hists.items():
+        if stage in merged:
+            h = Histogram.from_dict(merged[stage])
+            h.merge(Histogram.from_dict(d))
+            merged[stage] = h.to_dict()
+        else:
+            merged[stage] = d
+    return merged
+
+
+def summarize(saved):
+    """
+    @return: {stage: {n, mean, p50, p95, p99}} of saved histograms, in STAGES order
+    """
+    return {stage: Histogram.from_dict(saved[stage]).summary() for stage in STAGES if stage in saved}
+
+
+# The recorder of this process
+recorder = LatencyRecorder()
@@ -0,0 +1,91 @@
+import time
+
+# Repeats of the same read from a player within this many seconds get the earlier response
+READ_WINDOW = .5
+# Each player may make WRITE_BURST writes at once, refilled at WRITE_RATE per second.
+# A batch of operations from the order grid is one write.
+WRITE_BURST = 10
+WRITE_RATE = 5.0
+# Size at which expired entries are pruned
+MAX_ENTRIES = 10000
+
+
+class TokenBucket:
+    def __init__(self, capacity, rate, now):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        self.refill(now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class LiveThrottle:
+    """
+    Protects the live methods from bursts of messages from one player.  Identical reads
+    within READ_WINDOW are answered with the earlier response; the key of a read includes
+    the version of the player's orders, so a response is only reused while it is still
+    current.  Writes (submits and deletes, or one batch of them) are limited per player by
+    a token bucket.
+    """
+
+    def __init__(self, read_window=READ_WINDOW, write_burst=WRITE_BURST, write_rate=WRITE_RATE,
+                 clock=time.monotonic):
+        self.read_window = read_window
+        self.write_burst = write_burst
+        self.write_rate = write_rate
+        self.clock = clock
+        self.reads = {}  # player id -> (time, key, response)
+        self.buckets = {}  # player id -> TokenBucket
+
+    def recent_read(self, player_id, key):
+        """
+        @return: the response to the same read if it was made within the window, else None
+        """
+        entry = self.reads.get(player_id)
+        if entry is None:
+            return None
+
+        when, last_key, response = entry
+        if last_key != key or self.clock() - when > self.read_window:
+            return None
+        return response
+
+    def store_read(self, player_id, key, response):
+        now = self.clock()
+        if len(self.reads) >= MAX_ENTRIES:
+            self.reads = {pid: e for pid, e in self.reads.items() if now - e[0] <= self.read_window}
+        self.reads[player_id] = (now, key, response)
+
+    def allow_write(self, player_id):
+        now = self.clock()
+        bucket = self.buckets.get(player_id)
+        if bucket is None:
+            if len(self.buckets) >= MAX_ENTRIES:
+                self.prune_buckets(now)
+            bucket = TokenBucket(self.write_burst, self.write_rate, now)
+            self.buckets[player_id] = bucket
+
+        # A write invalidates whatever the player read before
+        self.reads.pop(player_id, None)
+        return bucket.take(now)
+
+    def prune_buckets(self, now):
+        # A full bucket is the same as no bucket
+        for pid, bucket in list(self.buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self.buckets[pid]
+
+
+# The throttle of this process
+throttle = LiveThrottle()
@@ -0,0 +1,151 @@
+import numpy as np
+
+from rounds.clearing import to_cents
+from rounds.data_structs import DataForOrder, OrderBatch
+from rounds.models import OrderType
+
+
+class MarginEngine:
+    """
+    Margin checks for all players of a market at once.  The same tests as
+    DataForPlayer.set_mv_short_future / set_mv_debt_future and the same order sizes as
+    generate_buy_in_order / generate_sell_off_order, computed on arrays of the players'
+    positions.  The margin parameters are read once from the compiled MarketParams.
+    """
+
+    def __init__(self, params, player_data, group_idx=None):
+        """
+        @param params: MarketParams of the session
+        @param player_data: list of DataForPlayer with the new positions already computed
+        @param group_idx: int array with the index of the group of each player; all zero if None
+        """
+        n = len(player_data)
+        self.player_data = player_data
+        self.margin_ratio = params.margin_ratio
+        self.target_ratio = params.margin_target_ratio
+        self.group_idx = group_idx if group_idx is not None else np.zeros(n, dtype=np.int64)
+
+        players = [p_data.player for p_data in player_data]
+        self.shares = np.fromiter((p.shares for p in players), dtype=np.float64, count=n)
+        self.cash = np.fromiter((p.cash for p in players), dtype=np.float64, count=n)
+        self.auto_buy = np.fromiter((p.is_auto_buy() for p in players), dtype=bool, count=n)
+        self.auto_sell = np.fromiter((p.is_auto_sell() for p in players), dtype=bool, count=n)
+        self.shares_result = np.fromiter((d.shares_result for d in player_data), dtype=np.float64, count=n)
+        self.cash_result = np.fromiter((d.cash_result for d in player_data), dtype=np.float64, count=n)
+
+    def __len__(self):
+        return len(self.player_data)
+
+    def player_prices(self, market_price):
+        """
+        @param market_price: the market price, or an array with the market price of each group
+        @return: float array with the market price each player is evaluated at
+        """
+        prices = np.asarray(market_price, dtype=np.float64)
+        if prices.ndim:
+            return prices[self.group_idx]
+        return np.full(len(self), float(prices))
+
+    def mv_short_future(self, market_price):
+        """
+        @return: bool array; True for players whose short position violates the margin after trading
+        """
+        p = self.player_prices(market_price)
+        share_value = np.abs(p * self.shares_result)
+        candidates = (self.shares_result < 0) & (p != 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = (self.cash_result - share_value) / share_value
+        return candidates & (ratio <= self.margin_ratio)
+
+    def mv_debt_future(self, market_price):
+        """
+        @return: bool array; True for players whose debt violates the margin after trading
+        """
+        p = self.player_prices(market_price)
+        cash = np.abs(self.cash_result)
+        candidates = self.cash_result < 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.abs(self.shares_result * p - cash) / cash
+        return candidates & (ratio <= self.margin_ratio)
+
+    def buy_ins_required(self, market_price):
+        return self.auto_buy & self.mv_short_future(market_price)
+
+    def sell_offs_required(self, market_price):
+        return self.auto_sell & self.mv_debt_future(market_price)
+
+    def buy_in_quantities(self, price):
+        """
+        @return: int array with the size of the buy-in order of each player
+        """
+        p = self.player_prices(price)
+        tr = self.target_ratio
+        s = np.abs(self.shares)
+        c = np.abs(self.cash)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            quantities = np.ceil(((1 + tr) * s * p - c) / (tr * p))
+        return np.nan_to_num(quantities, posinf=0, neginf=0).astype(np.int64)
+
+    def sell_off_quantities(self, price):
+        """
+        @return: int array with the size of the sell-off order of each player, capped at the shares held
+        """
+        p = self.player_prices(price)
+        tr = self.target_ratio
+        s = np.abs(self.shares)
+        c = np.abs(self.cash)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            quantities = np.ceil(np.abs(((1 - tr) * c - s * p) / (tr * p)))
+        quantities = np.minimum(np.nan_to_num(quantities, posinf=0, neginf=0), s)  # prevent shorts
+        return quantities.astype(np.int64)
+
+    def forced_orders(self, market_price):
+        """
+        Generate the buy-in and sell-off orders of every player that needs one.
+        @param market_price: the market price, or an array with the market price of each group
+        @return: OrderBatch of the new orders; its rows hold DataForOrder objects that are
+                inserted when the batch is written back.
+        """
+        buy_in = self.buy_ins_required(market_price)
+        sell_off = self.sell_offs_required(market_price)
+        buy_qty = self.buy_in_quantities(market_price)
+        sell_qty = self.sell_off_quantities(market_price)
+        prices = self.player_prices(market_price)
+
+        player_idx = np.concatenate((np.flatnonzero(buy_in), np.flatnonzero(sell_off)))
+        order_type = np.concatenate((np.full(buy_in.sum(), OrderType.BID.value, dtype=np.int64),
+                                     np.full(sell_off.sum(), OrderType.OFFER.value, dtype=np.int64)))
+        quantity = np.concatenate((buy_qty[buy_in], sell_qty[sell_off]))
+
+        orders = []
+        for i, o_type, qty in zip(player_idx, order_type, quantity):
+            player = self.player_data[i].player
+            orders.append(DataForOrder(player=player,
+                                       group=player.group,
+                                       order_type=int(o_type),
+                                       price=float(prices[i]),
+                                       quantity=int(qty),
+                                       is_buy_in=True))
+
+        return OrderBatch(orders,
+                          price=to_cents(prices[player_idx]),
+                          quantity=quantity,
+                          order_type=order_type,
+                          player_idx=player_idx,
+                          group_idx=self.group_idx[player_idx],
+                          is_buy_in=np.ones(len(orders), dtype=bool))
+
+
+def add_forced_orders(batch, params, player_data, market_price, group_idx=None):
+    """
+    Add the buy-in and sell-off orders of the players who are due one at the market price.
+    @param batch: OrderBatch of the book
+    @param player_data: list of DataForPlayer with the new positions already computed
+    @param market_price: the market price, or a list with the market price of each group
+    @param group_idx: int array with the index of the group of each player; all zero if None
+    @return: the book and the forced orders in one OrderBatch; None if no player is due one
+    """
+    forced = MarginEngine(params, player_data, group_idx).forced_orders(market_price)
+    if not len(forced):
+        return None
+    return OrderBatch.concat([batch, forced])
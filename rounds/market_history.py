@@ -0,0 +1,88 @@
+# session.vars key of the market history
+MARKET_HISTORY = 'market_history'
+
+
+def read_history(session):
+    """
+    The market history of the session, for reading.  session.vars marks the session as
+    changed on every access, which would re-save it on every page; reads go to the
+    underlying dict instead.
+    @return: id_in_subsession -> {'price': [...], 'volume': [...]}, indexed by round number - 1
+    """
+    return session._vars.get(MARKET_HISTORY, {})
+
+
+def record_round(group):
+    """
+    Add the cleared price and volume of a group's round to the history.
+    """
+    history = group.session.vars.setdefault(MARKET_HISTORY, {})
+    h = history.setdefault(group.id_in_subsession, dict(price=[], volume=[]))
+
+    idx = group.round_number - 1
+    while len(h['price']) <= idx:
+        h['price'].append(None)
+        h['volume'].append(None)
+    h['price'][idx] = float(group.price)
+    h['volume'][idx] = group.volume
+
+
+def get_round_price(group, round_number):
+    """
+    The cleared price of one of the group's rounds, from the history.
+    @return: float, or None if the round is not in the history
+    """
+    h = read_history(group.session).get(group.id_in_subsession)
+    idx = round_number - 1
+    if h is None or idx < 0 or idx >= len(h['price']):
+        return None
+    return h['price'][idx]
+
+
+def get_history(group, include_current=False):
+    """
+    The prices and volumes of the group's earlier rounds, and of this round if
+    include_current and the market has cleared.  Rounds missing from the history, for
+    example in a session that started before it was kept, are read from the database once
+    and added.
+    @return: list of prices, list of volumes
+    """
+    h = read_history(group.session).get(group.id_in_subsession)
+    n_prev = group.round_number - 1
+    if h is None or len(h['price']) < n_prev or None in h['price'][:n_prev]:
+        for g in group.in_previous_rounds():
+            if g.field_maybe_none('price') is not None:
+                record_round(g)
+        h = read_history(group.session).get(group.id_in_subsession, dict(price=[], volume=[]))
+
+    prices = [p for p in h['price'][:n_prev] if p is not None]
+    volumes = [v for p, v in zip(h['price'][:n_prev], h['volume'][:n_prev]) if p is not None]
+
+    if include_current:
+        price = group.field_maybe_none('price')
+        if price is not None:
+            prices.append(float(price))
+            volumes.append(group.field_maybe_none('volume'))
+
+    return prices, volumes
+
+
+def get_chart_data(prices, volumes, init_price, is_practice, num_practice, num_rounds):
+    """
+    Split the history into the practice rounds or the real rounds, each starting from the
+    initial price.
+    @param prices: the prices of rounds 1 ... n
+    @param volumes: the volumes of rounds 1 ... n
+    @return: labels, prices and volumes for the price history chart
+    """
+    prices = [init_price] + list(prices)
+    volumes = [0] + list(volumes)
+    if is_practice:
+        labels = list(range(0, num_practice + 1))
+        prices = prices[:num_practice + 1]
+        volumes = volumes[:num_practice + 1]
+    else:
+        labels = list(range(0, num_rounds - num_practice + 1))
+        prices = [init_price] + prices[num_practice + 1:]
+        volumes = [0] + volumes[num_practice + 1:]
+    return labels, prices, volumes
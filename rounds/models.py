@@ -5,6 +5,7 @@ from otree.common import InvalidRoundError
 
 
 import common.SessionConfigFunctions as scf
+from rounds import market_history
 
 
 class OrderType(Enum):
@@ -52,6 +53,7 @@ class OrderErrorCode(Enum):
     QUANT_LEN_RAW = (2048, OrderField.QUANTITY, 'This input is too long.  Please provide a shorter input.')
     SHORTING =  (4096, OrderField.QUANTITY, 'You are attempting to sell more shares that you have.  Please reduce the quantity.')
     MARGIN =  (8192, OrderField.PRICE, 'The total cost of your combined BUYs exceeds your current amount of CASH. Please reduce either the price or quantity of this order.')
+    RATE_LIMITED = (16384, OrderField.PRICE, 'Too many orders at once.  Please wait a moment and try again.')
 
     def combine(self, code):
         if type(code) is OrderErrorCode:
@@ -81,6 +83,19 @@ class Group(BaseGroup):
     
     is_practice = models.BooleanField(initial=False)
 
+    # Totals over the players, written by pre_round_tasks (before trading) and by
+    # calculate_market (after the market clears)
+    num_traders = models.IntegerField(initial=0)
+    num_auto_trans = models.IntegerField(initial=0)
+    short_result = models.IntegerField()
+    buy_volume = models.IntegerField()
+    sell_volume = models.IntegerField()
+    num_bankrupt = models.IntegerField()
+    num_margin_violations = models.IntegerField()
+
+    # JSON latency histograms of the live order messages; see live_latency
+    live_latency = models.LongStringField(blank=True)
+
     def in_round_or_none(self, round_number):
         try:
             return self.in_round(round_number)
@@ -88,24 +103,36 @@ class Group(BaseGroup):
             return None
 
     def get_last_period_price(self):
-        # Get the market Price of the last period
+        """
+        The market price of the last period, read from the session's market history which
+        is filled in as each round clears.  The first round, and the first non-practice
+        round, start from the initial price, or the fundamental value if there is none.
+        """
         round_number = self.round_number
-        last_group = self.in_round_or_none(round_number - 1)
-        
+
         # if is first non-practice round, treat this as the first round
         # Importing Constants here to avoid circular references.
         from . import Constants
-        if round_number == Constants.num_practice + 1:
-            last_group = None
+        if round_number == 1 or round_number == Constants.num_practice + 1:
+            return self.get_initial_price()
+
+        price = market_history.get_round_price(self, round_number - 1)
+        if price is not None:
+            return cu(price)
 
-        if last_group:
+        # A round cleared before the history was kept
+        last_group = self.in_round_or_none(round_number - 1)
+        if last_group and last_group.field_maybe_none('price') is not None:
+            market_history.record_round(last_group)
             return last_group.price
+        return self.get_initial_price()
+
+    def get_initial_price(self):
+        init_price = scf.get_init_price(self)
+        if init_price is not None:
+            return init_price
         else:
-            init_price = scf.get_init_price(self)
-            if init_price is not None:
-                return init_price
-            else:
-                return scf.get_fundamental_value(self)
+            return scf.get_fundamental_value(self)
 
     def get_short_limit(self):
         """
@@ -126,6 +153,31 @@ class Group(BaseGroup):
         total_shares = sum(p.shares for p in self.get_players() if p.is_active())
         self.float = total_shares
 
+    def determine_result_aggregates(self, players):
+        """
+        Sum up the players' results after the market has cleared.
+        """
+        short = buy_volume = sell_volume = num_bankrupt = num_violations = 0
+        for p in players:
+            if p.shares_result < 0:
+                short -= p.shares_result
+            if p.shares_transacted > 0:
+                buy_volume += p.shares_transacted
+            else:
+                sell_volume -= p.shares_transacted
+
+            _, equity, debt, limit, _ = p.get_holding_details(self.price, results=True)
+            if equity <= 0:
+                num_bankrupt += 1
+            elif limit is not None and abs(debt) >= abs(limit):
+                num_violations += 1
+
+        self.short_result = short
+        self.buy_volume = buy_volume
+        self.sell_volume = sell_volume
+        self.num_bankrupt = num_bankrupt
+        self.num_margin_violations = num_violations
+
 
 NO_AUTO_TRANS = -99
 
@@ -301,6 +353,9 @@ class Player(BasePlayer):
     def copy_results_from_previous_round(self):
         r_num = self.round_number
         past_player = self.in_round_or_null(r_num - 1)
+        self.copy_results_from(past_player)
+
+    def copy_results_from(self, past_player):
         if past_player:
             self.cash = past_player.cash_result
             self.shares = past_player.shares_result
@@ -324,6 +379,9 @@ class Player(BasePlayer):
 
     def determine_auto_trans_status(self):
         prev_player = self.in_round_or_null(self.round_number - 1)
+        self.determine_auto_trans_status_from(prev_player)
+
+    def determine_auto_trans_status_from(self, prev_player):
         auto_trans_delay = scf.get_auto_trans_delay(self)
 
         if not prev_player:
@@ -0,0 +1,381 @@
+import uuid
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from rounds import depth_feed, order_journal
+from rounds.models import Order, OrderType
+from rounds.order_form import parse_price_cents
+from rounds.clearing import clear_levels, from_cents, to_cents
+
+BID = OrderType.BID.value
+OFFER = OrderType.OFFER.value
+
+# Number of changes a PlayerOrders remembers for delta order lists
+MAX_CHANGE_LOG = 256
+# Number of groups whose books and player orders this process keeps; the groups of
+# sessions that ended are dropped oldest first
+MAX_GROUPS = 256
+
+
+class OrderBook:
+    """
+    In-memory book of a group's orders, aggregated by price level.  Kept up to date by
+    the live order messages so that clearing does not need to rebuild it from the database.
+    """
+
+    def __init__(self, group_id):
+        self.group_id = group_id
+        self.orders = {}  # order id -> (order type, price in cents, quantity)
+        self.bid_levels = defaultdict(int)  # price in cents -> total quantity
+        self.offer_levels = defaultdict(int)
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __contains__(self, oid):
+        return oid in self.orders
+
+    def add(self, oid, order_type, price, quantity):
+        if oid in self.orders:
+            return
+
+        price_cents = int(to_cents([price])[0])
+        self.orders[oid] = (order_type, price_cents, quantity)
+        self.side(order_type)[price_cents] += quantity
+
+    def remove(self, oid):
+        entry = self.orders.pop(oid, None)
+        if entry is None:
+            return
+
+        order_type, price_cents, quantity = entry
+        levels = self.side(order_type)
+        levels[price_cents] -= quantity
+        if levels[price_cents] <= 0:
+            del levels[price_cents]
+
+    def holds(self, orders):
+        """
+        @return: True if the book holds exactly these orders.  An order's price and
+                quantity do not change once it is submitted, so the ids and quantities are
+                compared.
+        """
+        if len(orders) != len(self.orders):
+            return False
+        for o in orders:
+            entry = self.orders.get(o.id)
+            if entry is None or entry[0] != o.order_type or entry[2] != o.quantity:
+                return False
+        return True
+
+    def side(self, order_type):
+        return self.bid_levels if order_type == BID else self.offer_levels
+
+    def get_levels(self):
+        """
+        @return: sorted price levels in cents, bid quantity per level, offer quantity per level
+        """
+        levels = np.array(sorted(self.bid_levels.keys() | self.offer_levels.keys()), dtype=np.int64)
+        bid_qty = np.fromiter((self.bid_levels.get(p, 0) for p in levels), dtype=np.int64, count=levels.size)
+        offer_qty = np.fromiter((self.offer_levels.get(p, 0) for p in levels), dtype=np.int64, count=levels.size)
+        return levels, bid_qty, offer_qty
+
+    def get_market_price(self):
+        """
+        @return: The market price (None if nothing trades), the market volume
+        """
+        price, volume = clear_levels(*self.get_levels())
+        if price is None:
+            return None, 0
+        return from_cents(price), volume
+
+    @classmethod
+    def from_orders(cls, group_id, orders):
+        book = cls(group_id)
+        for o in orders:
+            book.add(o.id, o.order_type, o.price, o.quantity)
+        return book
+
+
+class OpenOrder:
+    """
+    Snapshot of an order kept in a PlayerOrders cache.  Has the attributes the order
+    validation reads and the to_dict of the order, so it stands in for the Order between
+    requests without holding on to a database session.
+    """
+    __slots__ = ('id', 'order_type', 'price', 'price_cents', 'quantity', 'values', 'live_dicts')
+
+    def __init__(self, o):
+        self.id = o.id
+        self.order_type = o.order_type
+        self.price = o.price
+        self.price_cents = parse_price_cents(o.price)
+        self.quantity = o.quantity
+        self.values = o.to_dict()
+        self.live_dicts = {}  # show_notes -> formatted dict for the live order list
+
+    def to_dict(self):
+        return dict(self.values)
+
+
+class PlayerOrders:
+    """
+    A player's open orders with running totals of the outstanding supply, the outstanding
+    cost of the bids and the best bid and ask (in cents), so the live order checks do not
+    need to re-sum the orders on every message.  Indexing by OrderType gives the orders of that
+    type, like the dict returned by get_orders_by_type.
+
+    Every add and remove bumps the version and is logged, so a page holding the orders of
+    an earlier version can be sent just the changes.  The epoch identifies this instance;
+    versions of a cache that was dropped and rebuilt are not comparable.  A cache is kept
+    for the whole round, the pages after clearing included (see market_cleared).
+    """
+
+    def __init__(self, player_id):
+        self.player_id = player_id
+        self.epoch = uuid.uuid4().hex
+        self.version = 0
+        self.change_log = []  # (version, order id)
+        self.orders = {}  # order id -> order, in the order they were added
+        self.supply = 0
+        self.buy_cost_cents = 0
+        self.min_ask_cents = None
+        self.max_bid_cents = None
+        self.bid_prices = Counter()  # price in cents -> number of bids at that price
+        self.offer_prices = Counter()
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __contains__(self, oid):
+        return oid in self.orders
+
+    def __iter__(self):
+        return iter(self.orders.values())
+
+    def __getitem__(self, o_type):
+        return [o for o in self.orders.values() if o.order_type == o_type.value]
+
+    def add(self, o, key=None):
+        key = o.id if key is None else key
+        if key in self.orders:
+            return
+
+        self.orders[key] = o
+        self.log_change(key)
+        price = order_price_cents(o)
+        if o.order_type == BID:
+            self.buy_cost_cents += price * o.quantity
+            self.bid_prices[price] += 1
+            if self.max_bid_cents is None or price > self.max_bid_cents:
+                self.max_bid_cents = price
+        else:
+            self.supply += o.quantity
+            self.offer_prices[price] += 1
+            if self.min_ask_cents is None or price < self.min_ask_cents:
+                self.min_ask_cents = price
+
+    def remove(self, oid):
+        o = self.orders.pop(oid, None)
+        if o is None:
+            return
+
+        self.log_change(oid)
+        price = order_price_cents(o)
+        if o.order_type == BID:
+            self.buy_cost_cents -= price * o.quantity
+            if remove_price(self.bid_prices, price) and price == self.max_bid_cents:
+                self.max_bid_cents = max(self.bid_prices, default=None)
+        else:
+            self.supply -= o.quantity
+            if remove_price(self.offer_prices, price) and price == self.min_ask_cents:
+                self.min_ask_cents = min(self.offer_prices, default=None)
+
+    def log_change(self, oid):
+        self.version += 1
+        self.change_log.append((self.version, oid))
+        if len(self.change_log) > MAX_CHANGE_LOG:
+            del self.change_log[:len(self.change_log) - MAX_CHANGE_LOG]
+
+    def changes_since(self, version):
+        """
+        @param version: a version of this cache the caller holds the orders of
+        @return: ids of the orders added since, ids of the orders removed since; None if the
+                changes are no longer (or were never) known
+        """
+        if version is None or not 0 <= version <= self.version:
+            return None
+        oldest_logged = self.change_log[0][0] if self.change_log else self.version + 1
+        if version + 1 < oldest_logged:
+            return None
+
+        touched = dict.fromkeys(oid for v, oid in self.change_log if v > version)
+        added = [oid for oid in touched if oid in self.orders]
+        removed = [oid for oid in touched if oid not in self.orders]
+        return added, removed
+
+    def sync(self, orders):
+        """
+        Bring the cache up to date with the player's orders as written, for example after
+        the market filled them.  An order that changed is logged like an add, so a page
+        holding an earlier version gets it in its next delta.
+        """
+        snapshots = {o.id: OpenOrder(o) for o in orders}
+        for oid in [oid for oid in self.orders if oid not in snapshots]:
+            self.remove(oid)
+
+        for oid, snapshot in snapshots.items():
+            cached = self.orders.get(oid)
+            if cached is not None and getattr(cached, 'values', None) == snapshot.values:
+                continue
+            self.remove(oid)
+            self.add(snapshot)
+
+    @classmethod
+    def from_orders(cls, player_id, orders, snapshot=False):
+        """
+        @param snapshot: keep OpenOrder snapshots instead of the orders themselves
+        """
+        player_orders = cls(player_id)
+        for o in orders:
+            player_orders.add(OpenOrder(o) if snapshot else o)
+        return player_orders
+
+
+def order_price_cents(o):
+    # Snapshots carry the price in cents already
+    price = getattr(o, 'price_cents', None)
+    return price if price is not None else parse_price_cents(o.price)
+
+
+def remove_price(counts, price):
+    """
+    Decrement the count of a price.
+    @return: True if it was the last order at that price
+    """
+    counts[price] -= 1
+    if counts[price] <= 0:
+        del counts[price]
+        return True
+    return False
+
+
+def as_player_orders(orders_by_type):
+    """
+    @param orders_by_type: PlayerOrders, or a dict of OrderType -> list of orders
+    @return: PlayerOrders
+    """
+    if isinstance(orders_by_type, PlayerOrders):
+        return orders_by_type
+
+    player_orders = PlayerOrders(None)
+    for o_type in (OrderType.BID, OrderType.OFFER):
+        for o in orders_by_type.get(o_type, []):
+            # Key by position; orders that were never saved have no id yet.
+            player_orders.add(o, key=len(player_orders))
+    return player_orders
+
+
+# Books for the groups of this process, keyed by group id
+_BOOKS = {}
+# Open orders of the players of this process, keyed by group id, then player id
+_PLAYER_ORDERS = {}
+
+
+def remember(cache, group_id, value):
+    """
+    Keep a group's value in one of the caches, dropping the oldest group when it is full.
+    """
+    if group_id not in cache and len(cache) >= MAX_GROUPS:
+        del cache[next(iter(cache))]
+    cache[group_id] = value
+    return value
+
+
+def get_book(group, orders=None):
+    """
+    Get the order book of a group.  If this process does not have it, for example after a
+    restart, it is rebuilt from the given orders or from the database.  When the caller
+    already has the group's orders, a book that does not hold exactly those orders is
+    rebuilt from them.
+    """
+    book = _BOOKS.get(group.id)
+    if book is not None and (orders is None or book.holds(orders)):
+        return book
+
+    if orders is None:
+        order_journal.flush()
+        orders = Order.filter(group=group)
+    return remember(_BOOKS, group.id, OrderBook.from_orders(group.id, orders))
+
+
+def get_player_orders(player, o_cls=Order):
+    """
+    Get the open orders of a player, loading them from the database if this process does
+    not have them yet.
+    """
+    group_orders = _PLAYER_ORDERS.get(player.group.id)
+    if group_orders is None:
+        group_orders = remember(_PLAYER_ORDERS, player.group.id, {})
+    player_orders = group_orders.get(player.id)
+    if player_orders is None:
+        order_journal.flush()
+        player_orders = PlayerOrders.from_orders(player.id, o_cls.filter(player=player), snapshot=True)
+        group_orders[player.id] = player_orders
+    return player_orders
+
+
+def order_added(o):
+    # A book built here from the database already holds the (committed) order; adding it again is a no-op.
+    get_book(o.group).add(o.id, o.order_type, o.price, o.quantity)
+
+    player_orders = _PLAYER_ORDERS.get(o.group.id, {}).get(o.player_id)
+    if player_orders is not None:
+        player_orders.add(OpenOrder(o))
+
+
+def order_deleted(o):
+    book = _BOOKS.get(o.group_id)
+    if book is not None:
+        book.remove(o.id)
+
+    player_orders = _PLAYER_ORDERS.get(o.group_id, {}).get(o.player_id)
+    if player_orders is not None:
+        player_orders.remove(o.id)
+
+
+def discard_book(group):
+    # The book and the cached snapshots of the players' orders
+    discard_group(group.id)
+
+
+def market_cleared(groups):
+    """
+    The markets of the groups cleared.  The books go; the players' cached orders stay
+    for the rest of the round, updated to the filled orders with one query, so the pages
+    after clearing keep getting deltas of the same epoch.
+    """
+    for group in groups:
+        _BOOKS.pop(group.id, None)
+        depth_feed.discard_feed(group.id)
+
+    group_ids = [g.id for g in groups if _PLAYER_ORDERS.get(g.id)]
+    if not group_ids:
+        return
+
+    by_player = defaultdict(list)
+    for o in Order.objects_filter(Order.group_id.in_(group_ids)).order_by(Order.id):
+        by_player[o.player_id].append(o)
+    for group_id in group_ids:
+        for player_id, player_orders in _PLAYER_ORDERS[group_id].items():
+            player_orders.sync(by_player[player_id])
+
+
+def discard_group(group_id):
+    """
+    Forget everything this process keeps for a group.  Called when the next round starts.
+    """
+    _BOOKS.pop(group_id, None)
+    _PLAYER_ORDERS.pop(group_id, None)
+    depth_feed.discard_feed(group_id)
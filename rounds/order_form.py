@@ -0,0 +1,91 @@
+import decimal
+import re
+
+from rounds.models import OrderErrorCode, OrderType
+
+# A plain decimal number: sign, whole part, fraction.  Anything else goes through Decimal.
+NUMBER = re.compile(r'\s*([+-]?)(\d*)(?:\.(\d*))?\s*')
+INTEGER = re.compile(r'\s*[+-]?\d+\s*')
+
+CENT = decimal.Decimal('0.01')
+
+# Ceilings of the order form, in the units the form is parsed to
+PRICE_CEIL_CENTS = 10000 * 100
+QUANT_CEIL = 100
+
+ORDER_TYPES = {'BUY': OrderType.BID, 'SELL': OrderType.OFFER}
+
+
+def parse_price_cents(raw):
+    """
+    Parse a price into integer cents, rounding half up like Currency does.
+    @param raw: str, int, float, Decimal (or Currency)
+    @return: the price in cents; None if it is not a number
+    """
+    if type(raw) is int:
+        return raw * 100
+
+    if type(raw) is str:
+        m = NUMBER.fullmatch(raw)
+        if m is not None:
+            sign, whole, frac = m.groups()
+            if whole or frac:
+                frac = frac or ''
+                cents = int(whole or 0) * 100 + int(frac[:2].ljust(2, '0'))
+                if len(frac) > 2 and frac[2] >= '5':
+                    cents += 1
+                return -cents if sign == '-' else cents
+
+    # Floats, Decimals and unusual strings ('1e3', ...); same rounding as Currency
+    try:
+        value = decimal.Decimal(raw) if not isinstance(raw, float) else decimal.Decimal.from_float(raw)
+        return int(value.quantize(CENT, rounding=decimal.ROUND_HALF_UP).scaleb(2))
+    except (ValueError, TypeError, ArithmeticError):
+        return None
+
+
+def parse_quantity(raw):
+    """
+    @return: the quantity as an int; None if it is not an integer
+    """
+    if type(raw) is int:
+        return raw
+    if type(raw) is str:
+        return int(raw) if INTEGER.fullmatch(raw) else None
+    try:
+        return int(raw)
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def parse_order_form(data):
+    """
+    Syntactic checks of the order form, in integer cents.
+    @param data: Data from the otree live page's packet
+    @return: Error Code - 0 if valid
+    @return: An OrderType object if valid, None otherwise
+    @return: The price in cents if valid, None otherwise
+    @return: The quantity as an integer if valid, None otherwise
+    """
+    error_code = 0
+
+    price = parse_price_cents(data['price'])
+    if price is None:
+        error_code |= OrderErrorCode.PRICE_NOT_NUM.value
+
+    quant = parse_quantity(data['quantity'])
+    if quant is None:
+        error_code |= OrderErrorCode.QUANT_NOT_NUM.value
+
+    if price and price >= PRICE_CEIL_CENTS:
+        error_code |= OrderErrorCode.PRICE_CEIL.value
+
+    if quant and quant >= QUANT_CEIL:
+        error_code |= OrderErrorCode.QUANT_CEIL.value
+
+    raw_type = data['type']
+    o_type = ORDER_TYPES.get(raw_type) if type(raw_type) is str else None
+    if o_type is None:
+        error_code |= OrderErrorCode.BAD_TYPE.value
+
+    return error_code, o_type, price, quant
@@ -0,0 +1,165 @@
+from collections import deque
+
+from otree import database
+from sqlalchemy import event, func, select, text
+
+from rounds.models import Order
+
+# Number of journaled orders that triggers a write during the market
+FLUSH_SIZE = 50
+# Number of order ids reserved from the database at a time
+RESERVE_SIZE = 50
+
+
+class JournalOrder:
+    """
+    An order that has been acknowledged but not yet written.  Has the attributes the order
+    book, the player order cache and the live order list read from an Order.
+    """
+
+    def __init__(self, oid, player, group, **values):
+        self.id = oid
+        self.player_id = player.id
+        self.group_id = group.id
+        self.group = group
+        self.p_id = player.id_in_group
+        self.order_type = values['order_type']
+        self.price = values['price']
+        self.quantity = values['quantity']
+        self.timestamp = values.get('timestamp')
+
+    def to_mapping(self):
+        return dict(id=self.id,
+                    player_id=self.player_id,
+                    group_id=self.group_id,
+                    order_type=self.order_type,
+                    price=self.price,
+                    quantity=self.quantity,
+                    quantity_final=0,
+                    is_buy_in=False,
+                    timestamp=self.timestamp)
+
+    def to_dict(self):
+        return dict(oid=self.id,
+                    p_id=self.p_id,
+                    group_id=self.group_id,
+                    type=self.order_type,
+                    price=self.price,
+                    quantity=self.quantity,
+                    original_quantity=None,
+                    quantity_final=0,
+                    requested_quant=self.quantity,
+                    is_buy_in=False)
+
+
+class OrderJournal:
+    """
+    Write-behind journal of submitted orders.  Order ids are handed out from a block
+    reserved in the database (see reserve_ids), so a submission can be confirmed without
+    a commit.  The orders are written in one bulk insert when enough have collected and,
+    at the latest, before the market is cleared.
+    """
+
+    def __init__(self, flush_size=FLUSH_SIZE, reserve_size=RESERVE_SIZE):
+        self.flush_size = flush_size
+        self.reserve_size = reserve_size
+        self.reserved = deque()  # ids reserved and not handed out yet
+        self.last_id = 0  # highest id reserved by this journal
+        self.pending = {}  # order id -> JournalOrder
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __contains__(self, oid):
+        return oid in self.pending
+
+    def allocate_id(self, connection):
+        if not self.reserved:
+            ids = reserve_ids(connection, self.reserve_size, after=self.last_id)
+            self.reserved.extend(ids)
+            self.last_id = max(self.last_id, *ids)
+        return self.reserved.popleft()
+
+    def outside_id(self, connection):
+        """
+        An id for an order inserted outside the journal.  While the journal has ids out,
+        the highest id in the table is not the highest id in use, so the order is given a
+        reserved id.
+        @return: the id, or None to let the database assign one
+        """
+        if not self.reserved and not self.pending:
+            return None
+        return self.allocate_id(connection)
+
+    def submit(self, player, group, session=None, **values):
+        """
+        Journal a new order.
+        @return: JournalOrder with its id assigned
+        """
+        if session is None:
+            session = database.db._db
+
+        o = JournalOrder(self.allocate_id(session.connection()), player, group, **values)
+        self.pending[o.id] = o
+        if len(self.pending) >= self.flush_size:
+            self.flush(session)
+        return o
+
+    def discard(self, oid, player_id=None):
+        """
+        Take back an order that has not been written yet.
+        @return: the JournalOrder, or None if the journal does not hold the order (for the player)
+        """
+        o = self.pending.get(oid)
+        if o is None or (player_id is not None and o.player_id != player_id):
+            return None
+        return self.pending.pop(oid)
+
+    def flush(self, session=None):
+        """
+        Write all journaled orders.  The insert runs in the current transaction.
+        """
+        if not self.pending:
+            return
+        if session is None:
+            session = database.db._db
+
+        session.bulk_insert_mappings(Order, [o.to_mapping() for o in self.pending.values()])
+        self.pending.clear()
+
+
+def reserve_ids(connection, n, after=0):
+    """
+    Reserve n order ids in the database.  PostgreSQL takes them from the id sequence, so
+    no other insert, in this process or another, is given them.  SQLite has no sequence;
+    it gives a new row the highest id + 1, so the ids are taken from above the highest id
+    and inserts made in this process while ids are out are given reserved ids too (see
+    OrderJournal.outside_id, which assign_reserved_id and BulkWriter.flush use).
+    @param after: the highest id this journal reserved before
+    @return: list of ids
+    """
+    table = Order.__table__.name
+    if connection.dialect.name == 'postgresql':
+        rows = connection.execute(text(f"SELECT nextval(pg_get_serial_sequence('{table}', 'id')) "
+                                       f"FROM generate_series(1, {int(n)})"))
+        return [r[0] for r in rows]
+
+    max_id = connection.execute(select([func.max(Order.id)])).scalar() or 0
+    start = max(max_id, after) + 1
+    return list(range(start, start + n))
+
+
+@event.listens_for(Order, 'before_insert')
+def assign_reserved_id(mapper, connection, target):
+    # Orders created outside the journal take a reserved id rather than one the journal
+    # has already handed out or will hand out.
+    if target.id is None:
+        target.id = journal.outside_id(connection)
+
+
+# The journal of this process
+journal = OrderJournal()
+
+
+def flush():
+    journal.flush()
@@ -0,0 +1,91 @@
+from collections import defaultdict
+
+from otree import database
+from otree.models import Participant
+from sqlalchemy import event
+
+import common.SessionConfigFunctions as scf
+from rounds.models import Order, Player
+
+
+class MarketPrefetch:
+    """
+    Loads what clearing a market needs - the compiled session parameters, the players and
+    their orders - up front in a fixed number of queries.  Players are kept in an explicit
+    identity map keyed by id so orders are matched to players by player_id instead of
+    lazily loading order.player one order at a time.
+    """
+
+    def __init__(self, params, players, orders):
+        self.params = params
+        self.players = {p.id: p for p in players}
+        self.orders = orders
+
+    @classmethod
+    def for_group(cls, group):
+        return cls(scf.get_params(group), group.get_players(), Order.filter(group=group))
+
+    @classmethod
+    def for_subsession(cls, subsession, orders):
+        return cls(scf.get_params(subsession), subsession.get_players(), orders)
+
+    def get_player(self, player_id):
+        return self.players.get(player_id)
+
+    def orders_by_player_id(self):
+        d = defaultdict(list)
+        for o in self.orders:
+            d[o.player_id].append(o)
+        return d
+
+
+def get_previous_round_players(players):
+    """
+    Load the previous round's player of each of the given players with one query.
+    @return: participant_id -> Player; empty in the first round
+    """
+    if not players or players[0].round_number <= 1:
+        return {}
+    participant_ids = [p.participant_id for p in players]
+    prev = Player.objects_filter(Player.participant_id.in_(participant_ids),
+                                 Player.round_number == players[0].round_number - 1)
+    return {p.participant_id: p for p in prev}
+
+
+def load_participants(players):
+    """
+    Load the participants of the given players with one query, so player.participant is
+    found in the session's identity map instead of loaded one player at a time.
+    """
+    participant_ids = [p.participant_id for p in players]
+    if not participant_ids:
+        return []
+    return list(Participant.objects_filter(Participant.id.in_(participant_ids)))
+
+
+class QueryCounter:
+    """
+    Counts the SQL statements executed on an engine while it is active.
+
+        with QueryCounter() as qc:
+            calculate_market(group)
+        assert qc.count <= 5
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine if engine is not None else database.engine
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self.on_execute)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        event.remove(self.engine, 'before_cursor_execute', self.on_execute)
@@ -0,0 +1,81 @@
+// The group's order book depth: price in cents -> total quantity, for each side
+let DEPTH = {'BID': new Map(), 'OFFER': new Map()};
+let DEPTH_VERSION = null;
+let depth_timer = null;
+const DEPTH_ROWS = 5;
+
+$(window).on('load', function () {
+    request_depth();
+});
+
+function request_depth() {
+    depth_timer = null;
+    liveSend({'func': 'get_depth'});
+}
+
+function process_depth(data) {
+    if (data.func === 'depth_full') {
+        DEPTH = {'BID': new Map(), 'OFFER': new Map()};
+        apply_depth_levels(data.levels);
+        DEPTH_VERSION = data.version;
+        draw_depth();
+    } else if (data.func === 'depth_update') {
+        apply_depth_update(data);
+    }
+
+    // Our own reply carries the update that went out with it
+    if (data.depth) {
+        apply_depth_update(data.depth);
+    }
+
+    // An order that is not in the depth yet; ask once the next update is due
+    if (data.depth_wait_ms !== undefined && depth_timer === null) {
+        depth_timer = setTimeout(request_depth, data.depth_wait_ms + 10);
+    }
+}
+
+function apply_depth_update(update) {
+    if (update.prev !== DEPTH_VERSION) {
+        // Missed an update; start over from the full depth
+        request_depth();
+        return;
+    }
+    apply_depth_levels(update.levels);
+    DEPTH_VERSION = update.version;
+    draw_depth();
+}
+
+function apply_depth_levels(levels) {
+    for (const side of ['BID', 'OFFER']) {
+        for (const [price, quant] of levels[side]) {
+            if (quant > 0) {
+                DEPTH[side].set(price, quant);
+            } else {
+                DEPTH[side].delete(price);
+            }
+        }
+    }
+}
+
+function draw_depth() {
+    // Best prices first: highest bids, lowest offers
+    const bids = [...DEPTH['BID'].entries()].sort((a, b) => b[0] - a[0]).slice(0, DEPTH_ROWS);
+    const offers = [...DEPTH['OFFER'].entries()].sort((a, b) => a[0] - b[0]).slice(0, DEPTH_ROWS);
+
+    const body = $('#depth_rows');
+    body.empty();
+    for (let i = 0; i < DEPTH_ROWS; i++) {
+        const row = $('<tr>');
+        row.append(depth_cells(bids[i]));
+        row.append(depth_cells(offers[i]));
+        body.append(row);
+    }
+}
+
+function depth_cells(level) {
+    if (!level) {
+        return '<td></td><td></td>';
+    }
+    const [price, quant] = level;
+    return `<td>${quant}</td><td>${(price / 100).toFixed(2)}</td>`;
+}
@@ -1,11 +1,103 @@
 let ALL_ORDERS = new Map();
+// Which version of the server's order list ALL_ORDERS holds; lets the server send only the changes
+let ORDER_EPOCH = null;
+let ORDER_VERSION = null;
+// The last list from the server is kept for the next page of the round, which then only needs the changes
+const ORDER_LIST_KEY = 'order_list';
+
+// Submits and deletes made in quick succession go to the server as one batch message.
+const BATCH_DELAY_MS = 50;
+let pending_ops = [];
+let sent_batches = new Map();
+let batch_seq = 0;
+let batch_timer = null;
+
+function queue_op(op) {
+    pending_ops.push(op);
+    if (batch_timer === null) {
+        batch_timer = setTimeout(send_batch, BATCH_DELAY_MS);
+    }
+}
+
+function send_batch() {
+    batch_timer = null;
+    if (pending_ops.length === 0) {
+        return;
+    }
+    batch_seq += 1;
+    sent_batches.set(batch_seq, pending_ops);
+    liveSend({'func': 'batch', 'seq': batch_seq, 'ops': pending_ops});
+    pending_ops = [];
+}
+
+function process_batch_result(data) {
+    const ops = sent_batches.get(data.seq) || [];
+    sent_batches.delete(data.seq);
+    let resync = false;
+
+    data.results.forEach((result, i) => {
+        const op = ops[i];
+        if (result.func === 'order_confirmed' && op) {
+            add_form_order_to_list(result, op.data);
+        } else if (result.func === 'order_rejected') {
+            process_order_rejection(result);
+        } else if (result.func === 'op_rejected') {
+            // Rate limited, or not an open order; a cancel that did not go through needs the
+            // list from the server
+            if (result.error_code) {
+                process_order_rejection(result);
+            }
+            resync = resync || (op && op.op === 'delete_order');
+        }
+    });
+
+    if (resync) {
+        request_orders(true);
+    }
+}
 
 $(window).on('load', function () {
     // This requests all the orders
     // If the page is reloaded then we need to see any existing orders
-    liveSend({'func': 'get_orders_for_player'});
+    restore_order_list();
+    request_orders();
 });
 
+function save_order_list() {
+    try {
+        sessionStorage.setItem(ORDER_LIST_KEY, JSON.stringify(
+            {'epoch': ORDER_EPOCH, 'version': ORDER_VERSION, 'orders': Array.from(ALL_ORDERS.values())}));
+    } catch (e) {
+        // Storage full or turned off; the next page asks for the whole list
+    }
+}
+
+function restore_order_list() {
+    // Not shown until the server answers; a list of another epoch is replaced by the full list
+    let saved = null;
+    try {
+        saved = JSON.parse(sessionStorage.getItem(ORDER_LIST_KEY));
+    } catch (e) {
+        return;
+    }
+    if (!saved) {
+        return;
+    }
+    saved.orders.forEach((o) => {
+        ALL_ORDERS.set(""+o.oid, o);
+    });
+    ORDER_EPOCH = saved.epoch;
+    ORDER_VERSION = saved.version;
+}
+
+function request_orders(full=false) {
+    if (full) {
+        liveSend({'func': 'get_orders_for_player'});
+    } else {
+        liveSend({'func': 'get_orders_for_player', 'epoch': ORDER_EPOCH, 'version': ORDER_VERSION});
+    }
+}
+
 function clear_orders_grid(){
     //Remove all orders so we can re-add them
     $('.orders-box-grid li').detach();
@@ -14,10 +106,10 @@ function clear_orders_grid(){
 }
 
 
-function add_form_order_to_list(live_data){
+function add_form_order_to_list(live_data, odata){
     var oid = live_data.order_id;
-    submitted_odata.oid = oid;
-    ALL_ORDERS.set(""+oid, submitted_odata)
+    odata.oid = oid;
+    ALL_ORDERS.set(""+oid, odata)
     fill_order_section();
 }
 
@@ -30,6 +122,23 @@ function add_orders_to_list(live_data) {
         ALL_ORDERS.set(""+oid, o);
     });
 
+    ORDER_EPOCH = live_data.epoch;
+    ORDER_VERSION = live_data.version;
+    save_order_list();
+    fill_order_section();
+}
+
+function apply_order_delta(live_data) {
+    live_data.removed.forEach((oid) => {
+        ALL_ORDERS.delete(""+oid);
+    });
+    live_data.added.forEach((o) => {
+        ALL_ORDERS.set(""+o.oid, o);
+    });
+
+    ORDER_EPOCH = live_data.epoch;
+    ORDER_VERSION = live_data.version;
+    save_order_list();
     fill_order_section();
 }
 
@@ -138,7 +247,7 @@ function cancel_order(elem){
     let parent_id = $('#order_' + oid).parents('.order_col')[0].id
 
     //remove_all_error_messages();
-    liveSend({'func': 'delete_order', 'oid': oid});
+    queue_op({'op': 'delete_order', 'oid': oid});
 
     $("#order_" + oid).detach();
     //Remove the order from the ALL_ORDERS collection
@@ -159,8 +268,8 @@ function cancel_order(elem){
 function process_order_rejection(data) {
     code_from_server = data.error_code
 
-    Object.keys(js_vars.error_codes).forEach( (code) => {
-        code_data = js_vars.error_codes[code];
+    Object.keys(BOOTSTRAP.error_codes).forEach( (code) => {
+        code_data = BOOTSTRAP.error_codes[code];
         is_on = code_data.value & code_from_server;
         if (is_on) {
             $('#curr_ord_msg').text(code_data.desc);
@@ -171,14 +280,29 @@ function process_order_rejection(data) {
 function liveRecv(data) {
     const func = data.func;
 
-    if (func === 'order_confirmed') {
-       add_form_order_to_list(data);
+    // The group's order book depth, on pages that show it
+    if (typeof process_depth === 'function') {
+        process_depth(data);
+    }
+
+    if (func === 'batch_result') {
+        process_batch_result(data);
+
+    } else if (func === 'order_confirmed') {
+       add_form_order_to_list(data, submitted_odata);
 
     } else if (func === 'order_rejected') {
         process_order_rejection(data)
+        // A rate limited cancel comes with the list the page should show
+        if (data.order_list) {
+            add_orders_to_list(data.order_list);
+        }
 
     } else if (func === 'order_list') {
         add_orders_to_list(data);
+
+    } else if (func === 'order_delta') {
+        apply_order_delta(data);
     }
 
     // process_warnings(data)
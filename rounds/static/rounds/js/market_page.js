@@ -99,7 +99,8 @@ function get_order_details() {
     return {  'type': o_type
             , 'price': o_price
             , 'quantity': o_quant
-            , 'requested_quant': o_quant};
+            , 'requested_quant': o_quant
+            , 'ts': Math.round(performance.now())};
 }
 
 // function process_warnings(data) {
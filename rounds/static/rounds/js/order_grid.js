@@ -99,7 +99,7 @@ $(window).on('load', function () {
             submitted_odata = o_data;
             ts = Date.now() - load_time;
             submitted_odata.ts = ts
-            liveSend({'func': 'submit-order', 'data': submitted_odata});
+            queue_op({'op': 'submit-order', 'data': submitted_odata});
             reset_grid();
         }
     });
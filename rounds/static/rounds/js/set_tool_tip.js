@@ -1,7 +1,7 @@
 function set_tool_tips(){
     let elem;
     let text_span;
-    for (const [elem_id, data] of Object.entries(js_vars.tt)) {
+    for (const [elem_id, data] of Object.entries(BOOTSTRAP.tt)) {
         elem = document.getElementById(elem_id)
         if (!elem){
             continue;
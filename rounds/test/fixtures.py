@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import patch
+
+from otree import database
+from otree.database import VarsDict
+from otree.models import Session
+from sqlalchemy import create_engine
+from sqlalchemy.orm import configure_mappers, sessionmaker
+
+from rounds import depth_feed, group_cache, live_latency, live_limits, order_book, order_journal
+from rounds.live_latency import LatencyRecorder
+from rounds.live_limits import LiveThrottle
+from rounds.models import *
+from rounds.order_journal import OrderJournal
+
+
+def get_db_session():
+    configure_mappers()
+    engine = create_engine('sqlite://')
+    database.AnyModel.metadata.create_all(engine)
+    return engine, sessionmaker(bind=engine)()
+
+
+def submit_op(o_type, price, quantity):
+    return {'op': 'submit-order', 'data': {'type': o_type, 'price': str(price), 'quantity': str(quantity), 'ts': 0}}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class DBTestCase(unittest.TestCase):
+    """
+    Runs against an in-memory database in place of oTree's.  Each test gets a session with
+    the class's config; build() adds the models the test needs, by default one group with
+    one player in round 1.  The in-process caches of the market are reset afterwards.
+    """
+    session_code = 'test'
+    config = {}
+
+    def setUp(self):
+        self.engine, self.db = get_db_session()
+        db_patch = patch.object(database.db, '_db', self.db)
+        db_patch.start()
+        self.addCleanup(db_patch.stop)
+
+        self.session = Session(code=self.session_code, config=dict(self.config))
+        self.session._vars = VarsDict()
+        self.db.add(self.session)
+        self.build()
+        self.db.commit()
+
+    def build(self):
+        self.group = Group(session=self.session, round_number=1, id_in_subsession=1)
+        self.player = Player(session=self.session, group=self.group, id_in_group=1, round_number=1,
+                             shares=5, cash=cu(100))
+        self.db.add_all([self.group, self.player])
+
+    def tearDown(self):
+        self.db.close()
+        order_book._BOOKS.clear()
+        order_book._PLAYER_ORDERS.clear()
+        group_cache._GROUP_VALUES.clear()
+        depth_feed._FEEDS.clear()
+        order_journal.journal = OrderJournal()
+
+
+class LivePageTestCase(DBTestCase):
+    """
+    A DBTestCase for the live methods of the market pages; the throttle and the latency
+    recorder start empty.
+    """
+    session_code = 'batch'
+
+    def setUp(self):
+        live_limits.throttle = LiveThrottle()
+        live_latency.recorder = LatencyRecorder()
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        live_limits.throttle = LiveThrottle()
+        live_latency.recorder = LatencyRecorder()
@@ -0,0 +1,191 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+from otree import database
+
+import rounds
+from rounds.batch_market import BatchCallMarket
+from rounds.clearing import NO_TRADE, clear_book, clear_groups, fill_book, fill_groups
+from rounds.models import *
+from rounds.test.test_call_market import get_order
+
+BID = OrderType.BID.value
+OFFER = OrderType.OFFER.value
+R = .1
+
+
+def get_session():
+    session = MagicMock()
+    session.config = {scf.SK_INTEREST_RATE: R,
+                      scf.SK_DIV_AMOUNT: '0.40 1.00',
+                      scf.SK_DIV_DIST: '0.5 0.5'}
+    session.vars = {}
+    return session
+
+
+def get_group(gid, last_price=10):
+    group = Group()
+    group.id = gid
+    group.get_last_period_price = MagicMock(return_value=last_price)
+    return group
+
+
+def get_player(pid, group, shares=10, cash=100):
+    player = Player()
+    player.id = pid
+    player.group_id = group.id
+    player.shares = shares
+    player.cash = cash
+    return player
+
+
+def get_subsession(groups, players):
+    subsession = MagicMock()
+    subsession.session = get_session()
+    subsession.get_groups = MagicMock(return_value=groups)
+    subsession.get_players = MagicMock(return_value=players)
+    return subsession
+
+
+def batch_order(player, order_type, price, quantity):
+    o = get_order(player=player, order_type=order_type, price=cu(price), quantity=quantity, quantity_final=0)
+    o.player_id = player.id
+    o.group_id = player.group_id
+    return o
+
+
+# noinspection DuplicatedCode
+class TestClearGroups(unittest.TestCase):
+
+    def test_matches_single_group(self):
+        rng = np.random.default_rng(42)
+        n_groups = 25
+        n = 5000
+        group_idx = rng.integers(0, n_groups, n)
+        prices = rng.integers(900, 1100, n)
+        quants = rng.integers(1, 10, n)
+        types = rng.choice([BID, OFFER], n)
+
+        # Execute
+        g_prices, g_volumes = clear_groups(group_idx, prices, quants, types, n_groups)
+        fills, reached = fill_groups(group_idx, prices, quants, types, g_prices)
+
+        # Assert
+        for g in range(n_groups):
+            m = group_idx == g
+            p, v = clear_book(prices[m], quants[m], types[m])
+            self.assertEqual(g_prices[g], p)
+            self.assertEqual(g_volumes[g], v)
+
+            f, r = fill_book(prices[m], quants[m], types[m], p)
+            self.assertEqual(list(fills[m]), list(f))
+            self.assertEqual(list(reached[m]), list(r))
+
+    def test_group_without_orders(self):
+        group_idx = np.array([0, 0, 2, 2])
+        prices = np.array([10, 10, 5, 20])
+        quants = np.array([1, 1, 1, 1])
+        types = np.array([BID, OFFER, BID, OFFER])
+
+        prices, volumes = clear_groups(group_idx, prices, quants, types, 3)
+
+        self.assertEqual(list(prices), [10, NO_TRADE, NO_TRADE])
+        self.assertEqual(list(volumes), [1, 0, 0])
+
+
+# noinspection DuplicatedCode
+class TestBatchCallMarket(unittest.TestCase):
+
+    def test_calculate_market(self):
+        # Set-up
+        g1 = get_group(1)
+        g2 = get_group(2, last_price=12)
+        p1 = get_player(11, g1)
+        p2 = get_player(12, g1)
+        p3 = get_player(21, g2)
+        orders = [batch_order(p1, BID, 10, 3),
+                  batch_order(p2, OFFER, 9, 5),
+                  batch_order(p3, BID, 10, 3)]
+        subsession = get_subsession([g1, g2], [p1, p2, p3])
+
+        # Execute
+        with patch('rounds.batch_market.get_orders_for_groups', return_value=orders):
+            cm = BatchCallMarket(subsession)
+            cm.dividends = [1, 0]
+            cm.calculate_market()
+
+        # Assert
+        self.assertEqual(g1.price, cu(9))
+        self.assertEqual(g1.volume, 3)
+        self.assertEqual(g1.dividend, 1)
+        self.assertEqual(g2.price, cu(12))
+        self.assertEqual(g2.volume, 0)
+
+        self.assertEqual(orders[0].quantity_final, 3)
+        self.assertEqual(orders[1].quantity_final, 3)
+        self.assertEqual(orders[2].quantity_final, 0)
+
+        self.assertEqual(p1.shares_result, 13)
+        self.assertEqual(p1.trans_cost, cu(-27))
+        self.assertEqual(p1.cash_result, cu(100 + 7.3 - 27 + 13))
+        self.assertEqual(p2.shares_result, 7)
+        self.assertEqual(p3.shares_result, 10)
+        self.assertEqual(p3.shares_transacted, 0)
+
+    def test_margin_calls(self):
+        # Set-up - p3 is short and due an automatic buy-in
+        g1 = get_group(1)
+        g2 = get_group(2, last_price=12)
+        p1 = get_player(11, g1)
+        p3 = get_player(21, g2, shares=-10)
+        p4 = get_player(22, g2, shares=30)
+        for p in (p1, p3, p4):
+            p.periods_until_auto_buy = NO_AUTO_TRANS
+            p.periods_until_auto_sell = NO_AUTO_TRANS
+        p3.periods_until_auto_buy = 0
+        p3.group = g2
+        orders = [batch_order(p1, BID, 10, 3),
+                  batch_order(p4, OFFER, 12, 20)]
+        subsession = get_subsession([g1, g2], [p1, p3, p4])
+        subsession.session.config.update({scf.SK_CLEARING_ENGINE: scf.CLEARING_ENGINE_VECTOR,
+                                          scf.SK_MARGIN_CALLS: True,
+                                          scf.SK_MARGIN_RATIO: .5,
+                                          scf.SK_MARGIN_TARGET_RATIO: .6,
+                                          scf.SK_MARGIN_PREMIUM: .1})
+        db = MagicMock()
+
+        # Execute
+        with patch('rounds.batch_market.get_orders_for_groups', return_value=orders), \
+                patch.object(database.db, '_db', db):
+            cm = BatchCallMarket(subsession)
+            cm.dividends = [1, 0]
+            cm.calculate_market()
+
+        # Assert - the buy-in trades with the offer in its own group only
+        self.assertEqual((g1.price, g1.volume), (cu(10), 0))
+        self.assertEqual((g2.price, g2.volume), (cu(12), 13))
+        self.assertEqual(orders[1].quantity_final, 13)
+        self.assertEqual(p3.shares_result, 3)
+        (_, inserts), _ = db.bulk_insert_mappings.call_args
+        self.assertEqual([(o['player_id'], o['quantity'], o['quantity_final'], o['is_buy_in']) for o in inserts],
+                         [(21, 13, 13, True)])
+
+
+# noinspection DuplicatedCode
+class TestCalculateMarketForSubsession(unittest.TestCase):
+
+    def test_legacy_engine_clears_each_group(self):
+        # Set-up
+        groups = [get_group(1), get_group(2)]
+        subsession = get_subsession(groups, [])
+        subsession.session.config[scf.SK_CLEARING_ENGINE] = scf.CLEARING_ENGINE_LEGACY
+
+        # Execute
+        with patch.object(rounds, 'calculate_market') as calculate_market, \
+                patch.object(rounds, 'BatchCallMarket') as batch:
+            rounds.calculate_market_for_subsession(subsession)
+
+        # Assert
+        self.assertEqual([c.args[0] for c in calculate_market.call_args_list], groups)
+        batch.assert_not_called()
@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+from rounds import bootstrap, tool_tip
+from rounds.models import *
+from rounds.test.fixtures import LivePageTestCase
+
+
+# noinspection DuplicatedCode
+class TestBootstrap(LivePageTestCase):
+
+    config = dict(div_amount='0.40 1.00', div_dist='.5 .5', interest_rate=0.05, margin_ratio=.5,
+                  float_ratio_cap=.5)
+
+    def build(self):
+        super().build()
+        self.group.float = 40
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static_dir = bootstrap.STATIC_DIR
+        bootstrap.STATIC_DIR = self.tmp.name
+        bootstrap._PATHS.clear()
+
+    def tearDown(self):
+        super().tearDown()
+        bootstrap.STATIC_DIR = self.static_dir
+        bootstrap._PATHS.clear()
+        self.tmp.cleanup()
+
+    def read_script(self, path):
+        with open(os.path.join(self.tmp.name, path)) as f:
+            content = f.read()
+        prefix = 'window.BOOTSTRAP = '
+        self.assertTrue(content.startswith(prefix))
+        return json.loads(content[len(prefix):].rstrip().rstrip(';'))
+
+    def test_script_written_once_per_session(self):
+        # Execute
+        path = bootstrap.get_bootstrap_path(self.player)
+        again = bootstrap.get_bootstrap_path(self.player)
+
+        # Assert
+        self.assertIs(path, again)
+        self.assertTrue(path.startswith('rounds/bootstrap/'))
+        payload = self.read_script(path)
+        self.assertEqual(payload['error_codes'][str(OrderErrorCode.MARGIN.value)]['desc'],
+                         OrderErrorCode.MARGIN.to_dict()['desc'])
+        self.assertEqual(set(payload['tt']), set(tool_tip.TOOL_TIPS))
+
+    def test_named_by_content(self):
+        # Set-up
+        path = bootstrap.get_bootstrap_path(self.player)
+        bootstrap._PATHS.clear()
+
+        # Execute
+        same = bootstrap.get_bootstrap_path(self.player)
+        self.group.float = 41
+        other = bootstrap.get_bootstrap_path(self.player)
+
+        # Assert
+        self.assertEqual(path, same)
+        self.assertNotEqual(path, other)
+        self.assertEqual(len(os.listdir(os.path.join(self.tmp.name, bootstrap.BOOTSTRAP_DIR))), 2)
+
+    def test_static_dir_not_relative_to_cwd(self):
+        # Execute / Assert
+        self.assertTrue(os.path.isabs(self.static_dir))
+        self.assertEqual(self.static_dir, os.path.join(os.path.dirname(os.path.abspath(bootstrap.__file__)), 'static'))
+
+    def test_read_only_static_dir(self):
+        # Set-up
+        payload = bootstrap.get_payload(self.player)
+
+        # Execute
+        with patch('os.makedirs', side_effect=PermissionError):
+            path = bootstrap.get_bootstrap_path(self.player)
+
+        # Assert - the page falls back to the script inline
+        self.assertIsNone(path)
+        self.assertEqual(bootstrap._PATHS, {(self.session.code, 40): None})
+        script = bootstrap.get_script(payload)
+        self.assertTrue(script.startswith('window.BOOTSTRAP = '))
+        self.assertNotIn('</', script)
+
+    def test_tool_tips_not_changed(self):
+        # Set-up
+        text = tool_tip.TOOL_TIPS['stat_dividends']['text']
+
+        # Execute
+        tt = tool_tip.get_tool_tip_data(self.player)
+
+        # Assert
+        self.assertIn('{dividends}', tool_tip.TOOL_TIPS['stat_dividends']['text'])
+        self.assertEqual(tool_tip.TOOL_TIPS['stat_dividends']['text'], text)
+        self.assertNotIn('{dividends}', tt['stat_dividends']['text'])
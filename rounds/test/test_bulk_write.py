@@ -0,0 +1,84 @@
+import unittest
+
+from sqlalchemy import event
+
+from rounds.bulk_write import BulkWriter
+from rounds.data_structs import DataForOrder, DataForPlayer
+from rounds.models import *
+from rounds.test.fixtures import get_db_session
+
+
+# noinspection DuplicatedCode
+class TestBulkWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.engine, self.db = get_db_session()
+        self.group = Group(id=1)
+        self.players = [Player(id=i, shares=5, cash=cu(100)) for i in range(1, 4)]
+        self.db.add_all([self.group, *self.players])
+        self.orders = [Order(player=p, group=self.group, order_type=OrderType.BID.value, price=cu(10),
+                             quantity=5, quantity_final=0) for p in self.players]
+        self.db.add_all(self.orders)
+        self.db.commit()
+
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: self.statements.append(statement))
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_flush(self):
+        # Set-up
+        writer = BulkWriter()
+        for o in self.orders:
+            DataForOrder(o).update_order(writer)
+            writer.update_order(o, quantity_final=3)
+
+        for p in self.players:
+            p_data = DataForPlayer(p)
+            p_data.get_new_player_position([], 1, .1, cu(10))
+            p_data.update_player(writer)
+
+        buy_in = DataForOrder(player=self.players[0], group=self.group, order_type=OrderType.BID.value,
+                              price=cu(10), quantity=4, is_buy_in=True)
+        buy_in.update_order(writer)
+
+        # Values are visible before the write without marking the objects dirty
+        self.assertEqual(self.orders[0].quantity_final, 3)
+        self.assertFalse(self.db.dirty)
+
+        # Execute
+        writer.flush(self.db)
+        self.db.commit()
+
+        # Assert - one UPDATE per table and one INSERT
+        updates = [s for s in self.statements if s.startswith('UPDATE')]
+        inserts = [s for s in self.statements if s.startswith('INSERT')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(len(inserts), 1)
+
+        self.db.expire_all()
+        for o in self.orders:
+            self.assertEqual(o.quantity_final, 3)
+        for p in self.players:
+            self.assertEqual(p.shares_result, 5)
+            self.assertEqual(p.cash_result, cu(100 + 10 + 5))
+
+        created = self.db.query(Order).filter(Order.is_buy_in == True).all()
+        self.assertEqual(len(created), 1)
+        self.assertEqual(created[0].player_id, self.players[0].id)
+        self.assertEqual(created[0].group_id, self.group.id)
+
+    def test_transient_objects_are_assigned(self):
+        # Set-up
+        writer = BulkWriter()
+        player = Player()
+
+        # Execute
+        writer.update_player(player, cash_result=cu(7))
+        writer.flush(self.db)
+
+        # Assert
+        self.assertEqual(player.cash_result, cu(7))
+        self.assertEqual(self.statements, [])
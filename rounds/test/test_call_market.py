@@ -2,7 +2,9 @@ import unittest
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
-from rounds.call_market import CallMarket
+from rounds import order_book
+from rounds.call_market import CallMarket, get_clearing_engines
+from rounds.clearing import VectorMarketPrice, VectorOrderFill
 from rounds.models import *
 
 NUM_ROUNDS = 5
@@ -19,6 +21,7 @@ def get_order(**kwargs):
     if kwargs.get('oid'):
         o.id = kwargs.get('oid')
     o.player = kwargs.get('player')
+    o.player_id = o.player.id if o.player is not None else None
     o.group = kwargs.get('group')
     o.order_type = kwargs.get('order_type')
     o.price = kwargs.get('price')
@@ -36,6 +39,7 @@ def basic_group():
                        'margin_target_ratio': MARGIN_TARGET}
     session = MagicMock()
     session.config = config_settings
+    session.vars = {}
     group.session = session
 
     return group
@@ -140,6 +144,37 @@ class TestCallMarket(unittest.TestCase):
         self.assertAlmostEqual(avg, 70, delta=.3,
                                msg=f"Expecting the average dividend to be around 70, instead it was: {avg}")
 
+    def test_get_clearing_engines_vector(self):
+        # Set-up
+        group = basic_group()
+        group.session.config['clearing_engine'] = 'vector'
+
+        # Execute
+        price_engine, fill_engine = get_clearing_engines(group)
+
+        # Assert
+        self.assertIs(price_engine, VectorMarketPrice)
+        self.assertIs(fill_engine, VectorOrderFill)
+
+    def test_get_market_price_from_book(self):
+        # Set-up
+        with patch.object(Order, 'filter', return_value=all_orders):
+            group = basic_group()
+            group.id = 77
+            group.session.config.update(clearing_engine='vector', div_amount='0.40 1.00', div_dist='0.5 0.5')
+            group.get_last_period_price = MagicMock(return_value=47)
+            group.get_players = MagicMock(return_value=[])
+            cm = CallMarket(group)
+
+        # Execute
+        market_price, market_volume = cm.get_market_price()
+
+        # Assert
+        self.assertEqual(market_price, cu(6))
+        self.assertEqual(market_volume, 22)
+        self.assertEqual(len(order_book.get_book(group)), len(all_orders))
+        order_book.discard_book(group)
+
 # def test_market_case(self):
 #     # Set up
 #     session = Session()
@@ -0,0 +1,86 @@
+from otree.database import VarsDict
+from otree.models import Participant
+
+import rounds
+from rounds import market_history, order_book
+from rounds.models import *
+from rounds.prefetch import QueryCounter, get_previous_round_players
+from rounds.test.fixtures import DBTestCase
+
+
+class TestCarryForward(DBTestCase):
+    session_code = 'carry'
+    config = dict(interest_rate=0.05, margin_ratio=.5, margin_premium=0.1, margin_target_ratio=.6,
+                  auto_trans_delay=1, initial_price=14)
+
+    def build(self):
+        self.participants = []
+        for i in range(3):
+            part = Participant(session=self.session, code=f'p{i}', id_in_session=i + 1)
+            part._vars = VarsDict()
+            self.participants.append(part)
+        self.participants[2]._vars['is_dropout'] = True
+
+        self.groups = [Group(session=self.session, round_number=rn, id_in_subsession=1) for rn in (1, 2)]
+        g1, g2 = self.groups
+        g1.price = cu(10)
+        g1.float = 12
+        results = [(cu(100), 5), (cu(100), -8), (cu(50), 3)]
+        self.prev = [Player(session=self.session, group=g1, participant=part, id_in_group=i + 1, round_number=1,
+                            cash_result=cash, shares_result=shares,
+                            periods_until_auto_buy=NO_AUTO_TRANS, periods_until_auto_sell=NO_AUTO_TRANS)
+                     for i, (part, (cash, shares)) in enumerate(zip(self.participants, results))]
+        self.players = [Player(session=self.session, group=g2, participant=part, id_in_group=i + 1, round_number=2)
+                        for i, part in enumerate(self.participants)]
+        self.db.add_all([*self.participants, *self.groups, *self.prev, *self.players])
+
+    def setUp(self):
+        super().setUp()
+        market_history.record_round(self.groups[0])
+
+    def test_get_previous_round_players(self):
+        # Set-up
+        players = self.groups[1].get_players()
+
+        # Execute
+        with QueryCounter(self.engine) as qc:
+            prev = get_previous_round_players(players)
+
+        # Assert
+        self.assertEqual(qc.count, 1)
+        self.assertEqual({pid: p.id for pid, p in prev.items()},
+                         {p.participant_id: p.id for p in self.prev})
+        self.assertEqual(get_previous_round_players(self.prev), {})
+
+    def test_pre_round_tasks(self):
+        # Set-up
+        group = self.groups[1]
+        players = group.get_players()
+
+        # Execute
+        with QueryCounter(self.engine) as qc:
+            rounds.pre_round_tasks(group)
+
+        # Assert - the reads do not grow with the number of players
+        selects = [s for s in qc.statements if s.startswith('SELECT')]
+        self.assertEqual(len(selects), 4)
+        self.assertEqual([(p.cash, p.shares) for p in players], [(cu(100), 5), (cu(100), -8), (cu(50), 3)])
+        self.assertEqual(players[1].periods_until_auto_buy, 1)  # -8 shares at 10 with 100 cash
+        self.assertEqual(players[0].periods_until_auto_buy, NO_AUTO_TRANS)
+        self.assertEqual(group.float, 12)
+        self.assertEqual(group.short, 8)
+        self.assertEqual(group.num_traders, 2)
+        self.assertEqual(group.num_auto_trans, 0)
+        self.assertEqual(self.participants[0].current_round, 2)
+
+    def test_pre_round_tasks_drops_last_round_orders(self):
+        # Set-up - the last round's results page loaded the players' orders
+        for p in self.prev:
+            order_book.get_player_orders(p)
+        self.assertIn(self.groups[0].id, order_book._PLAYER_ORDERS)
+
+        # Execute
+        rounds.pre_round_tasks(self.groups[1])
+
+        # Assert
+        self.assertNotIn(self.groups[0].id, order_book._PLAYER_ORDERS)
@@ -0,0 +1,153 @@
+import unittest
+
+import numpy as np
+
+from rounds.clearing import VectorMarketPrice, VectorOrderFill, clear_book, fill_book, to_cents
+from rounds.models import *
+from rounds.test.test_call_market import get_order
+
+BID = OrderType.BID.value
+OFFER = OrderType.OFFER.value
+
+
+def book(bids, offers):
+    """ Build book arrays from lists of (price, quantity) tuples. """
+    prices = np.array([p for p, _ in bids + offers], dtype=np.int64)
+    quants = np.array([q for _, q in bids + offers], dtype=np.int64)
+    types = np.array([BID] * len(bids) + [OFFER] * len(offers), dtype=np.int64)
+    return prices, quants, types
+
+
+def brute_force_price(prices, quants, types):
+    """ Straightforward per-price evaluation of the clearing principles. """
+    best = None
+    for p in sorted(set(prices)):
+        cbq = sum(q for pr, q, t in zip(prices, quants, types) if t == BID and pr >= p)
+        csq = sum(q for pr, q, t in zip(prices, quants, types) if t == OFFER and pr <= p)
+        row = (p, min(cbq, csq), abs(cbq - csq), cbq >= csq)
+        best = row if best is None else best
+        if (row[1], -row[2]) > (best[1], -best[2]):
+            best = row
+    return best
+
+
+# noinspection DuplicatedCode
+class TestClearBook(unittest.TestCase):
+
+    def test_max_volume(self):
+        p, v = clear_book(*book([(1, 1), (2, 2)], [(1, 1), (2, 2)]))
+        self.assertEqual(p, 2)
+        self.assertEqual(v, 2)
+
+    def test_least_residual(self):
+        p, v = clear_book(*book([(4, 2), (6, 1)], [(4, 1), (6, 1)]))
+        self.assertEqual(p, 6)
+        self.assertEqual(v, 1)
+
+    def test_pressure(self):
+        p, v = clear_book(*book([(55, 4)], [(50, 10)]))
+        self.assertEqual(p, 50)
+        self.assertEqual(v, 4)
+
+    def test_reference(self):
+        p, v = clear_book(*book([(5, 10), (6, 10)], [(5, 10), (6, 10)]))
+        self.assertEqual(p, 6)
+        self.assertEqual(v, 10)
+
+    def test_no_trade(self):
+        p, v = clear_book(*book([(1, 1)], [(10, 1)]))
+        self.assertIsNone(p)
+        self.assertEqual(v, 0)
+
+    def test_one_sided(self):
+        p, v = clear_book(*book([(1, 1)], []))
+        self.assertIsNone(p)
+        self.assertEqual(v, 0)
+
+        p, v = clear_book(*book([], []))
+        self.assertIsNone(p)
+        self.assertEqual(v, 0)
+
+    def test_volume_matches_brute_force(self):
+        rng = np.random.default_rng(1234)
+        for _ in range(200):
+            n = rng.integers(1, 40)
+            prices = rng.integers(900, 1100, n)
+            quants = rng.integers(1, 10, n)
+            types = rng.choice([BID, OFFER], n)
+
+            # Execute
+            p, v = clear_book(prices, quants, types)
+
+            # Assert
+            _, expected_vol, _, _ = brute_force_price(list(prices), list(quants), list(types))
+            self.assertEqual(v, expected_vol)
+            if v:
+                cbq = quants[(types == BID) & (prices >= p)].sum()
+                csq = quants[(types == OFFER) & (prices <= p)].sum()
+                self.assertEqual(min(cbq, csq), v)
+
+
+# noinspection DuplicatedCode
+class TestFillBook(unittest.TestCase):
+
+    def test_fill_matched(self):
+        # Set-up
+        prices, quants, types = book([(10, 6), (11, 6), (11, 5), (10, 5)],
+                                     [(5, 6), (5, 5), (6, 5), (6, 7)])
+
+        # Execute
+        fills, reached = fill_book(prices, quants, types, 5)
+
+        # Assert
+        self.assertEqual(list(fills), [0, 6, 5, 0, 6, 5, 0, 0])
+        self.assertEqual(list(reached), [False, True, True, False, True, True, False, False])
+
+    def test_fill_partial(self):
+        # Set-up
+        prices, quants, types = book([(10, 6), (11, 6), (11, 5), (10, 5)], [(5, 12)])
+
+        # Execute
+        fills, _ = fill_book(prices, quants, types, 10)
+
+        # Assert
+        self.assertEqual(list(fills), [1, 6, 5, 0, 12])
+
+    def test_fill_no_trade(self):
+        prices, quants, types = book([(10, 6)], [(12, 6)])
+        fills, reached = fill_book(prices, quants, types, 11)
+        self.assertEqual(list(fills), [0, 0])
+        self.assertFalse(reached.any())
+
+
+# noinspection DuplicatedCode
+class TestVectorEngine(unittest.TestCase):
+
+    def test_to_cents(self):
+        self.assertEqual(list(to_cents([cu(10.25), 3, 0.1])), [1025, 300, 10])
+
+    def test_market_price(self):
+        bids = [get_order(order_type=BID, price=cu(10), quantity=5),
+                get_order(order_type=BID, price=cu(10.5), quantity=6)]
+        offers = [get_order(order_type=OFFER, price=cu(10), quantity=11)]
+
+        p, v = VectorMarketPrice(bids, offers).get_market_price()
+
+        self.assertEqual(p, cu(10))
+        self.assertEqual(v, 11)
+
+    def test_market_price_no_orders(self):
+        offers = [get_order(order_type=OFFER, price=cu(10), quantity=11)]
+        self.assertEqual(VectorMarketPrice(None, offers).get_market_price(), (None, 0))
+        self.assertEqual(VectorMarketPrice([], None).get_market_price(), (None, 0))
+
+    def test_fill_orders(self):
+        b1 = get_order(order_type=BID, price=cu(10), quantity=5, quantity_final=0)
+        b2 = get_order(order_type=BID, price=cu(10.5), quantity=6, quantity_final=0)
+        o1 = get_order(order_type=OFFER, price=cu(10), quantity=8, quantity_final=0)
+
+        VectorOrderFill([b1, b2, o1]).fill_orders(cu(10))
+
+        self.assertEqual(b2.quantity_final, 6)
+        self.assertEqual(b1.quantity_final, 2)
+        self.assertEqual(o1.quantity_final, 8)
@@ -1,8 +1,10 @@
 import unittest
 from unittest.mock import MagicMock, patch
 
+import numpy as np
+
 from rounds.call_market import CallMarket
-from rounds.data_structs import DataForPlayer, DataForOrder
+from rounds.data_structs import DataForPlayer, DataForOrder, OrderBatch
 from rounds.models import *
 from test_call_market import get_order
 
@@ -356,3 +358,73 @@ class TestDataForOrder(unittest.TestCase):
         # Assert
         self.assertEqual(o.quantity, 0)
         self.assertEqual(o.original_quantity, 10)
+
+
+# noinspection DuplicatedCode
+class TestOrderBatch(unittest.TestCase):
+
+    def batch_orders(self):
+        p1 = basic_player()
+        p1.id = 1
+        p2 = basic_player()
+        p2.id = 2
+        orders = [get_order(player=p1, order_type=BID, price=cu(10), quantity=5, quantity_final=0),
+                  get_order(player=p2, order_type=BID, price=cu(10.5), quantity=6, quantity_final=0),
+                  get_order(player=p2, order_type=OFFER, price=cu(10), quantity=8, quantity_final=0),
+                  get_order(player=p1, order_type=OFFER, price=cu(12), quantity=8, quantity_final=0)]
+        return orders, {1: 0, 2: 1}
+
+    def test_from_orders(self):
+        # Set-up
+        orders, player_index = self.batch_orders()
+
+        # Execute
+        batch = OrderBatch.from_orders(orders, player_index)
+
+        # Assert
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(list(batch.price), [1000, 1050, 1000, 1200])
+        self.assertEqual(list(batch.quantity), [5, 6, 8, 8])
+        self.assertEqual(list(batch.order_type), [BID, BID, OFFER, OFFER])
+        self.assertEqual(list(batch.player_idx), [0, 1, 1, 0])
+        self.assertEqual(list(batch.group_idx), [0, 0, 0, 0])
+        self.assertFalse(batch.is_buy_in.any())
+
+    def test_fill_and_net_shares(self):
+        # Set-up
+        orders, player_index = self.batch_orders()
+        batch = OrderBatch.from_orders(orders, player_index)
+
+        # Execute
+        batch.fill(np.array([1000]))
+        net = batch.net_shares(2)
+
+        # Assert
+        self.assertEqual(list(batch.quantity_final), [2, 6, 8, 0])
+        self.assertEqual(list(batch.reached), [True, True, True, False])
+        self.assertEqual(list(net), [2, -2])
+
+        # Nothing is written to the orders until write_back
+        self.assertEqual(orders[0].quantity_final, 0)
+        batch.write_back()
+        self.assertEqual([o.quantity_final for o in orders], [2, 6, 8, 0])
+
+    def test_net_shares_empty(self):
+        batch = OrderBatch.from_orders([], {})
+        self.assertEqual(list(batch.net_shares(3)), [0, 0, 0])
+
+    def test_set_new_position_matches_orders(self):
+        # Set-up
+        orders, player_index = self.batch_orders()
+        for o, q in zip(orders, [2, 6, 8, 0]):
+            o.quantity_final = q
+        player = basic_player()
+        from_orders = DataForPlayer(player)
+        from_net = DataForPlayer(player)
+
+        # Execute
+        from_orders.get_new_player_position(orders[:2], 1.0, R, cu(10))
+        from_net.set_new_position(8, 1.0, R, cu(10))
+
+        # Assert
+        self.assertEqual(from_orders, from_net)
@@ -0,0 +1,108 @@
+import unittest
+
+import rounds
+from rounds.depth_feed import DepthFeed
+from rounds.models import *
+from rounds.order_book import OrderBook
+from rounds.test.fixtures import FakeClock, LivePageTestCase, submit_op
+
+BID = OrderType.BID.value
+OFFER = OrderType.OFFER.value
+
+
+# noinspection DuplicatedCode
+class TestDepthFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.feed = DepthFeed(1, 100, clock=self.clock)
+        self.book = OrderBook(1)
+
+    def test_publish_changes_once_per_interval(self):
+        # Set-up
+        self.book.add(1, BID, cu(10), 2)
+        self.book.add(2, BID, cu(10), 3)
+        self.book.add(3, OFFER, cu(12), 1)
+
+        # Execute
+        first = self.feed.poll(self.book)
+        self.book.add(4, BID, cu(9.5), 1)
+        self.book.remove(3)
+        throttled = self.feed.poll(self.book)
+        self.clock.now += .1
+        second = self.feed.poll(self.book)
+        self.clock.now += .1
+        unchanged = self.feed.poll(self.book)
+
+        # Assert
+        self.assertEqual(first, dict(func='depth_update', prev=0, version=1,
+                                     levels={'BID': [[1000, 5]], 'OFFER': [[1200, 1]]}))
+        self.assertIsNone(throttled)
+        self.assertEqual(second['prev'], 1)
+        self.assertEqual(second['levels'], {'BID': [[950, 1]], 'OFFER': [[1200, 0]]})
+        self.assertIsNone(unchanged)
+
+    def test_full(self):
+        # Set-up
+        self.book.add(1, BID, cu(10), 2)
+        self.book.add(2, BID, cu(9), 3)
+        self.feed.poll(self.book)
+
+        # Execute
+        full = self.feed.full()
+
+        # Assert
+        self.assertEqual(full, dict(func='depth_full', version=1, levels={'BID': [[900, 3], [1000, 2]], 'OFFER': []}))
+
+    def test_wait_ms(self):
+        # Set-up
+        self.book.add(1, BID, cu(10), 2)
+
+        # Execute / Assert
+        self.assertEqual(self.feed.wait_ms(), 0)
+        self.feed.poll(self.book)
+        self.clock.now += .03
+        self.assertAlmostEqual(self.feed.wait_ms(), 70)
+
+
+# noinspection DuplicatedCode
+class TestMarketGridLiveMethod(LivePageTestCase):
+    config = dict(depth_feed_ms=60000)
+
+    def build(self):
+        super().build()
+        self.other = Player(session=self.session, group=self.group, id_in_group=2, round_number=1,
+                            shares=5, cash=cu(100))
+        self.db.add(self.other)
+
+    def test_broadcast_then_throttled(self):
+        # Execute
+        first = rounds.market_grid_live_method(self.player, {'func': 'submit-order',
+                                                             'data': submit_op('BUY', 10, 2)['data']})
+        second = rounds.market_grid_live_method(self.other, {'func': 'submit-order',
+                                                             'data': submit_op('SELL', 12, 1)['data']})
+        full = rounds.market_grid_live_method(self.other, {'func': 'get_depth'})
+
+        # Assert - the first order goes to both players
+        self.assertEqual(set(first), {1, 2})
+        self.assertEqual(first[2]['func'], 'depth_update')
+        self.assertEqual(first[1]['func'], 'order_confirmed')
+        self.assertEqual(first[1]['depth'], first[2])
+
+        # The second is held back until the interval is over
+        self.assertEqual(set(second), {2})
+        self.assertEqual(second[2]['func'], 'order_confirmed')
+        self.assertGreater(second[2]['depth_wait_ms'], 0)
+        self.assertEqual(full[2]['levels'], {'BID': [[1000, 2]], 'OFFER': []})
+
+    def test_off(self):
+        # Set-up
+        self.session.config = {}
+
+        # Execute
+        ret = rounds.market_grid_live_method(self.player, {'func': 'submit-order',
+                                                           'data': submit_op('BUY', 10, 2)['data']})
+
+        # Assert
+        self.assertEqual(set(ret), {1})
+        self.assertNotIn('depth', ret[1])
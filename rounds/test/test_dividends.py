@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import MagicMock
+
+from rounds.dividends import DIVIDEND_SCHEDULE, generate_dividend_schedule, get_scheduled_dividend, \
+    init_dividend_schedule
+
+CONFIG = {'div_amount': '0.40 1.00', 'div_dist': '0.25 0.75', 'dividend_seed': 1234}
+
+
+def get_session(config=CONFIG):
+    session = MagicMock()
+    session.config = dict(config)
+    session._vars = {}
+    session.vars = session._vars
+    return session
+
+
+# noinspection DuplicatedCode
+class TestDividendSchedule(unittest.TestCase):
+
+    def test_same_seed_same_draws(self):
+        s1 = generate_dividend_schedule(CONFIG, 30, 4, seed=99)
+        s2 = generate_dividend_schedule(CONFIG, 30, 4, seed=99)
+        s3 = generate_dividend_schedule(CONFIG, 30, 4, seed=100)
+
+        self.assertEqual(s1, s2)
+        self.assertNotEqual(s1['draws'], s3['draws'])
+        self.assertEqual(len(s1['draws']), 120)
+        self.assertEqual(s1['amounts'], [.4, 1.0])
+
+    def test_distribution(self):
+        schedule = generate_dividend_schedule(CONFIG, 10000, 1, seed=5)
+        high = sum(schedule['draws']) / len(schedule['draws'])
+        self.assertAlmostEqual(high, .75, delta=.02)
+
+    def test_random_seed_is_recorded(self):
+        schedule = generate_dividend_schedule(CONFIG, 5, 1)
+        replay = generate_dividend_schedule(CONFIG, 5, 1, seed=schedule['seed'])
+        self.assertEqual(schedule, replay)
+
+    def test_init_and_lookup(self):
+        # Set-up
+        session = get_session()
+        subsession = MagicMock()
+        subsession.session = session
+        subsession.get_groups = MagicMock(return_value=[MagicMock(), MagicMock()])
+
+        # Execute
+        init_dividend_schedule(subsession, 3)
+
+        # Assert
+        schedule = session.vars[DIVIDEND_SCHEDULE]
+        self.assertEqual(schedule['seed'], 1234)
+        self.assertEqual(schedule['num_groups'], 2)
+        for rnd in range(1, 4):
+            for gid in (1, 2):
+                expected = schedule['amounts'][schedule['draws'][(rnd - 1) * 2 + gid - 1]]
+                self.assertEqual(get_scheduled_dividend(session, rnd, gid), expected)
+
+        # Outside the schedule
+        self.assertIsNone(get_scheduled_dividend(session, 4, 1))
+        self.assertIsNone(get_scheduled_dividend(session, 1, 3))
+        self.assertIsNone(get_scheduled_dividend(get_session(), 1, 1))
+
+    def test_lookup_does_not_touch_vars(self):
+        # Set-up
+        session = get_session()
+        subsession = MagicMock()
+        subsession.session = session
+        subsession.get_groups = MagicMock(return_value=[MagicMock()])
+        init_dividend_schedule(subsession, 1)
+        del session.vars
+
+        # Execute
+        dividend = get_scheduled_dividend(session, 1, 1)
+
+        # Assert
+        self.assertIn(dividend, (.4, 1.0))
@@ -0,0 +1,86 @@
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import rounds
+from rounds import bootstrap, group_cache
+from rounds.models import *
+from rounds.test.fixtures import LivePageTestCase
+
+
+# noinspection DuplicatedCode
+class TestGroupCache(unittest.TestCase):
+
+    def tearDown(self):
+        group_cache._GROUP_VALUES.clear()
+
+    def test_computed_once_per_group(self):
+        # Set-up
+        g1 = MagicMock(id=1)
+        g2 = MagicMock(id=2)
+        compute = MagicMock(side_effect=[10, 20, 30])
+
+        # Execute
+        a = group_cache.get_group_value(g1, 'x', compute)
+        b = group_cache.get_group_value(g1, 'x', compute)
+        c = group_cache.get_group_value(g2, 'x', compute)
+        group_cache.discard_group_values(g1)
+        d = group_cache.get_group_value(g1, 'x', compute)
+
+        # Assert
+        self.assertEqual((a, b, c, d), (10, 10, 20, 30))
+        self.assertEqual(compute.call_count, 3)
+
+    def test_bounded(self):
+        # Execute
+        for gid in range(group_cache.MAX_GROUPS + 1):
+            group_cache.get_group_value(MagicMock(id=gid), 'x', lambda: gid)
+
+        # Assert
+        self.assertEqual(len(group_cache._GROUP_VALUES), 1)
+
+
+# noinspection DuplicatedCode
+class TestStandardVars(LivePageTestCase):
+
+    config = dict(div_amount='0.40 1.00', div_dist='.5 .5', interest_rate=0.05, margin_ratio=.5,
+                  margin_premium=0.1, margin_target_ratio=.6, initial_price=14, fundamental_value=14)
+
+    def build(self):
+        super().build()
+        self.group.short = 3
+        self.group.float = 40
+        self.other = Player(session=self.session, group=self.group, id_in_group=2, round_number=1,
+                            shares=-3, cash=cu(200))
+        self.db.add(self.other)
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static_dir = bootstrap.STATIC_DIR
+        bootstrap.STATIC_DIR = self.tmp.name
+
+    def tearDown(self):
+        super().tearDown()
+        bootstrap.STATIC_DIR = self.static_dir
+        bootstrap._PATHS.clear()
+        self.tmp.cleanup()
+
+    def test_shared_values_with_player_overlay(self):
+        # Execute
+        first = rounds.standard_vars_for_template(self.player)
+        self.group.short = 99  # Not seen until the group's values are discarded
+        second = rounds.standard_vars_for_template(self.other)
+        group_cache.discard_group_values(self.group)
+        third = rounds.standard_vars_for_template(self.other)
+
+        # Assert
+        self.assertEqual(first['short'], 3)
+        self.assertEqual(second['short'], 3)
+        self.assertEqual(third['short'], 99)
+        self.assertEqual((first['cash'], first['shares']), (cu(100), 5))
+        self.assertEqual((second['cash'], second['shares']), (cu(200), -3))
+        self.assertTrue(second['is_short'])
+        self.assertEqual(first['market_price'], second['market_price'])
+        self.assertEqual(first['marg_req_pct'], '50%')
+        self.assertIsNot(first, second)
@@ -0,0 +1,154 @@
+import rounds
+from rounds import order_book
+from rounds.models import *
+from rounds.test.fixtures import LivePageTestCase, submit_op
+
+BID = OrderType.BID.value
+OFFER = OrderType.OFFER.value
+
+
+# noinspection DuplicatedCode
+class TestBatchLiveMethod(LivePageTestCase):
+
+    def test_ops_are_applied_in_order(self):
+        # Set-up
+        d = {'func': 'batch', 'seq': 7, 'ops': [submit_op('BUY', 10, 5),
+                                               submit_op('BUY', 10, 6),  # Too much cash with the first bid
+                                               submit_op('SELL', 9, 1),  # Below the first bid
+                                               submit_op('SELL', 12, 3),
+                                               {'op': 'delete_order', 'oid': '1'},
+                                               submit_op('BUY', 10, 6),  # Fine once the first bid is gone
+                                               {'op': 'bogus'}]}
+
+        # Execute
+        ret = rounds.market_page_live_method(self.player, d)
+
+        # Assert
+        result = ret[1]
+        self.assertEqual(result['func'], 'batch_result')
+        self.assertEqual(result['seq'], 7)
+        self.assertEqual([r['func'] for r in result['results']],
+                         ['order_confirmed', 'order_rejected', 'order_rejected', 'order_confirmed',
+                          'order_deleted', 'order_confirmed', 'op_rejected'])
+        self.assertEqual(result['results'][1]['error_code'], OrderErrorCode.MARGIN.value)
+        self.assertEqual(result['results'][2]['error_code'], OrderErrorCode.ASK_LESS_THAN_BID.value)
+        self.assertEqual(result['warnings'], [])
+
+        orders = self.db.query(Order).order_by(Order.id).all()
+        self.assertEqual([(o.order_type, o.quantity) for o in orders], [(OFFER, 3), (BID, 6)])
+
+    def test_rejected_op_not_counted(self):
+        # Set-up
+        d = {'func': 'batch', 'seq': 1, 'ops': [submit_op('SELL', 12, 3), submit_op('SELL', 13, 3)]}
+
+        # Execute
+        result = rounds.market_page_live_method(self.player, d)[1]
+
+        # Assert - the second offer is rejected, so the supply stays within the shares held
+        self.assertEqual(result['results'][1]['error_code'], OrderErrorCode.SHORTING.value)
+        self.assertEqual(result['warnings'], [])
+
+    def test_delete_not_done(self):
+        # Set-up - an order of another player
+        other = Player(session=self.session, group=self.group, id_in_group=2, round_number=1,
+                       shares=5, cash=cu(100))
+        self.db.add(other)
+        self.db.add(Order(player=other, group=self.group, order_type=OFFER, price=cu(12), quantity=1,
+                          quantity_final=0))
+        self.db.commit()
+        d = {'func': 'batch', 'seq': 1, 'ops': [{'op': 'delete_order', 'oid': '1'},
+                                                {'op': 'delete_order', 'oid': '99'},
+                                                {'op': 'delete_order', 'oid': 'x'}]}
+
+        # Execute
+        result = rounds.market_page_live_method(self.player, d)[1]
+
+        # Assert
+        self.assertEqual([r['func'] for r in result['results']], ['op_rejected'] * 3)
+        self.assertEqual(self.db.query(Order).count(), 1)
+
+    def test_no_warnings(self):
+        # Execute
+        result = rounds.result_page_live_method(self.player, {'func': 'batch', 'ops': []})[1]
+
+        # Assert
+        self.assertEqual(result['results'], [])
+        self.assertNotIn('warnings', result)
+
+
+# noinspection DuplicatedCode
+class TestOrderListDelta(LivePageTestCase):
+
+    def get_list(self, **kwargs):
+        return rounds.result_page_live_method(self.player, dict(func='get_orders_for_player', **kwargs))[1]
+
+    def test_full_then_delta(self):
+        # Set-up
+        rounds.market_page_live_method(self.player, {'func': 'batch', 'ops': [submit_op('BUY', 10, 5),
+                                                                            submit_op('SELL', 12, 3)]})
+        full = self.get_list()
+
+        # Execute
+        rounds.market_page_live_method(self.player, {'func': 'batch', 'ops': [{'op': 'delete_order', 'oid': 1},
+                                                                            submit_op('SELL', 13, 1)]})
+        delta = self.get_list(epoch=full['epoch'], version=full['version'])
+        unchanged = self.get_list(epoch=delta['epoch'], version=delta['version'])
+        other_epoch = self.get_list(epoch='stale', version=delta['version'])
+
+        # Assert
+        self.assertEqual(full['func'], 'order_list')
+        self.assertEqual([o['price'] for o in full['orders']], ['10.00', '12.00'])
+        self.assertEqual(delta['func'], 'order_delta')
+        self.assertEqual(delta['removed'], [1])
+        self.assertEqual([(o['oid'], o['price']) for o in delta['added']], [(3, '13.00')])
+        self.assertEqual(delta['version'], full['version'] + 2)
+        self.assertEqual((unchanged['added'], unchanged['removed']), ([], []))
+        self.assertEqual(other_epoch['func'], 'order_list')
+        self.assertEqual(len(other_epoch['orders']), 2)
+
+    def test_kept_for_the_round(self):
+        # Set-up
+        rounds.market_page_live_method(self.player, {'func': 'batch', 'ops': [submit_op('BUY', 10, 5),
+                                                                            submit_op('SELL', 12, 3)]})
+        full = self.get_list()
+        filled = self.db.query(Order).get(1)
+        filled.quantity_final = 5
+        self.db.commit()
+
+        # Execute - the market clears, then the next round starts
+        order_book.market_cleared([self.group])
+        delta = self.get_list(epoch=full['epoch'], version=full['version'])
+        order_book.discard_group(self.group.id)
+        rebuilt = self.get_list(epoch=delta['epoch'], version=delta['version'])
+
+        # Assert
+        self.assertEqual(delta['func'], 'order_delta')
+        self.assertEqual(delta['epoch'], full['epoch'])
+        self.assertEqual([(o['oid'], o['quantity_final']) for o in delta['added']], [(1, 5)])
+        self.assertEqual(delta['removed'], [])
+        self.assertNotIn(self.group.id, order_book._BOOKS)
+        self.assertEqual(rebuilt['func'], 'order_list')
+        self.assertNotEqual(rebuilt['epoch'], full['epoch'])
+
+    def test_list_with_notes_not_reused(self):
+        # Set-up
+        rounds.market_page_live_method(self.player, {'func': 'batch', 'ops': [submit_op('BUY', 10, 5)]})
+        without_notes = rounds.market_page_live_method(self.player, {'func': 'get_orders_for_player'})[1]
+
+        # Execute
+        with_notes = self.get_list(epoch=without_notes['epoch'], version=without_notes['version'])
+
+        # Assert
+        self.assertEqual(with_notes['func'], 'order_list')
+
+    def test_formatting_is_cached(self):
+        # Set-up
+        rounds.market_page_live_method(self.player, {'func': 'batch', 'ops': [submit_op('BUY', 10, 5)]})
+
+        # Execute
+        first = self.get_list()['orders'][0]
+        second = self.get_list()['orders'][0]
+
+        # Assert
+        self.assertIs(first, second)
+        self.assertEqual(first['note'], '&nbsp;')
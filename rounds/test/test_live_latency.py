@@ -0,0 +1,127 @@
+import json
+import unittest
+
+import rounds
+from rounds import live_latency
+from rounds.live_latency import Histogram, LatencyRecorder, merge_saved, summarize
+from rounds.models import *
+from rounds.test.fixtures import FakeClock, LivePageTestCase
+
+
+# noinspection DuplicatedCode
+class TestHistogram(unittest.TestCase):
+
+    def test_add_and_percentile(self):
+        # Set-up
+        h = Histogram()
+
+        # Execute
+        for ms in [.5, 1, 1.5, 3, 3, 40, 9000]:
+            h.add(ms)
+
+        # Assert
+        self.assertEqual(h.n, 7)
+        self.assertEqual(h.counts[:7], [2, 1, 2, 0, 0, 1, 0])
+        self.assertEqual(h.counts[-1], 1)
+        self.assertEqual(h.percentile(50), 5)
+        self.assertEqual(h.percentile(80), 50)
+        self.assertIsNone(h.percentile(99))
+        self.assertIsNone(Histogram().percentile(50))
+
+    def test_merge_saved(self):
+        # Set-up
+        a = Histogram()
+        a.add(1)
+        b = Histogram()
+        b.add(7)
+        b.add(7)
+
+        # Execute
+        merged = merge_saved({'ack': a.to_dict()}, {'ack': b.to_dict(), 'read': a.to_dict()})
+
+        # Assert
+        self.assertEqual(Histogram.from_dict(merged['ack']).n, 3)
+        self.assertEqual(merged['ack']['total_ms'], 15)
+        self.assertEqual(summarize(merged)['read']['n'], 1)
+        self.assertEqual(list(summarize(merged)), ['ack', 'read'])
+
+
+# noinspection DuplicatedCode
+class TestLatencyRecorder(unittest.TestCase):
+
+    def test_arrival_relative_to_fastest(self):
+        # Set-up
+        clock = FakeClock()
+        recorder = LatencyRecorder(clock=clock)
+
+        # Execute - the page's clock starts 100s behind; the 2nd order arrives 30ms late,
+        # the 3rd sets a new best
+        recorder.record_arrival(1, 7, 101.000, 1000)
+        recorder.record_arrival(1, 7, 102.030, 2000)
+        recorder.record_arrival(1, 7, 102.995, 3000)
+        recorder.record_arrival(1, 7, 104, 0)  # No timestamp
+        recorder.record_arrival(1, 7, 104, None)
+
+        # Assert
+        arrival = recorder.groups[1]['arrival']
+        self.assertEqual(arrival.n, 3)
+        self.assertAlmostEqual(arrival.total_ms, 30)
+
+    def test_record_and_pop(self):
+        # Set-up
+        clock = FakeClock()
+        recorder = LatencyRecorder(clock=clock)
+        start = recorder.now()
+        clock.now += .004
+
+        # Execute
+        recorder.record(1, 'ack', start)
+        recorder.record_arrival(1, 7, 1, 10)
+        hists = recorder.pop_group(1)
+
+        # Assert
+        self.assertEqual(set(hists), {'ack', 'arrival'})
+        self.assertAlmostEqual(hists['ack']['total_ms'], 4)
+        self.assertEqual(recorder.pop_group(1), {})
+        self.assertNotIn(1, recorder.offsets)
+
+    def test_not_recorded_after_pop(self):
+        # Set-up
+        recorder = LatencyRecorder(clock=FakeClock())
+        recorder.pop_group(1)
+
+        # Execute
+        recorder.record(1, 'read', recorder.now())
+        recorder.record_arrival(1, 7, 1, 10)
+        recorder.record(2, 'read', recorder.now())
+
+        # Assert
+        self.assertEqual(set(recorder.groups), {2})
+        self.assertEqual(dict(recorder.offsets), {})
+
+
+# noinspection DuplicatedCode
+class TestLiveLatency(LivePageTestCase):
+
+    def test_recorded_and_saved(self):
+        # Set-up
+        submit = {'func': 'submit-order', 'data': {'type': 'BUY', 'price': '10', 'quantity': '1', 'ts': 500}}
+        batch = {'func': 'batch', 'ops': [{'op': 'submit-order', 'data': {'type': 'SELL', 'price': '12',
+                                                                          'quantity': '1', 'ts': 900}}]}
+
+        # Execute
+        rounds.market_page_live_method(self.player, submit)
+        rounds.market_page_live_method(self.player, batch)
+        rounds.market_page_live_method(self.player, {'func': 'get_orders_for_player'})
+        rounds.save_live_latency(self.group)
+        # After clearing; not recorded
+        rounds.market_page_live_method(self.player, {'func': 'delete_order', 'oid': 1})
+        rounds.save_live_latency(self.group)
+
+        # Assert
+        saved = summarize(json.loads(self.group.live_latency))
+        self.assertEqual(saved['arrival']['n'], 2)
+        self.assertEqual(saved['validate']['n'], 2)
+        self.assertEqual(saved['ack']['n'], 2)
+        self.assertEqual(saved['read']['n'], 1)
+        self.assertEqual(live_latency.recorder.groups, {})
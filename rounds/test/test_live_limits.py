@@ -0,0 +1,138 @@
+import unittest
+
+import rounds
+from rounds import live_limits
+from rounds.live_limits import LiveThrottle, TokenBucket
+from rounds.models import *
+from rounds.test.fixtures import FakeClock, LivePageTestCase, submit_op
+
+
+# noinspection DuplicatedCode
+class TestLiveThrottle(unittest.TestCase):
+
+    def test_token_bucket(self):
+        # Set-up
+        bucket = TokenBucket(2, 1.0, 0)
+
+        # Execute / Assert
+        self.assertTrue(bucket.take(0))
+        self.assertTrue(bucket.take(0))
+        self.assertFalse(bucket.take(.5))
+        self.assertTrue(bucket.take(1.0))
+        self.assertFalse(bucket.take(1.0))
+
+    def test_recent_read(self):
+        # Set-up
+        clock = FakeClock()
+        throttle = LiveThrottle(read_window=.5, clock=clock)
+        throttle.store_read(1, 'key', 'response')
+
+        # Execute / Assert
+        clock.now = .4
+        self.assertEqual(throttle.recent_read(1, 'key'), 'response')
+        self.assertIsNone(throttle.recent_read(1, 'other key'))
+        self.assertIsNone(throttle.recent_read(2, 'key'))
+        clock.now = .6
+        self.assertIsNone(throttle.recent_read(1, 'key'))
+
+    def test_write_drops_read(self):
+        # Set-up
+        throttle = LiveThrottle(clock=FakeClock())
+        throttle.store_read(1, 'key', 'response')
+
+        # Execute
+        throttle.allow_write(1)
+
+        # Assert
+        self.assertIsNone(throttle.recent_read(1, 'key'))
+
+    def test_allow_write_per_player(self):
+        # Set-up
+        clock = FakeClock()
+        throttle = LiveThrottle(write_burst=3, write_rate=1.0, clock=clock)
+
+        # Execute
+        allowed = [throttle.allow_write(1) for _ in range(4)]
+
+        # Assert
+        self.assertEqual(allowed, [True, True, True, False])
+        self.assertTrue(throttle.allow_write(2))
+        clock.now = 1.0
+        self.assertTrue(throttle.allow_write(1))
+
+    def test_prune_buckets(self):
+        # Set-up
+        clock = FakeClock()
+        throttle = LiveThrottle(write_burst=3, write_rate=1.0, clock=clock)
+        throttle.allow_write(1)
+        throttle.allow_write(2)
+
+        # Execute
+        clock.now = 1.0
+        throttle.prune_buckets(clock.now)
+
+        # Assert
+        self.assertEqual(list(throttle.buckets), [])
+
+
+# noinspection DuplicatedCode
+class TestLiveMethodLimits(LivePageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        live_limits.throttle = LiveThrottle(write_burst=2, write_rate=1.0, clock=self.clock)
+
+    def test_submit_rate_limited(self):
+        # Execute
+        results = [rounds.market_page_live_method(self.player, {'func': 'submit-order', **submit_op('SELL', 12, 1)})[1]
+                   for _ in range(3)]
+
+        # Assert
+        self.assertEqual([r['func'] for r in results], ['order_confirmed', 'order_confirmed', 'order_rejected'])
+        self.assertEqual(results[2]['error_code'], OrderErrorCode.RATE_LIMITED.value)
+        self.assertEqual(self.db.query(Order).count(), 2)
+
+    def test_delete_rate_limited_sends_list(self):
+        # Set-up
+        rounds.market_page_live_method(self.player, {'func': 'batch', 'ops': [submit_op('SELL', 12, 1),
+                                                                            submit_op('SELL', 13, 1)]})
+        rounds.market_page_live_method(self.player, {'func': 'delete_order', 'oid': '1'})
+
+        # Execute
+        result = rounds.market_page_live_method(self.player, {'func': 'delete_order', 'oid': '2'})[1]
+
+        # Assert
+        self.assertEqual(result['func'], 'order_rejected')
+        self.assertEqual(result['error_code'], OrderErrorCode.RATE_LIMITED.value)
+        self.assertEqual(result['order_list']['func'], 'order_list')
+        self.assertEqual([o['oid'] for o in result['order_list']['orders']], [2])
+
+    def test_batch_is_one_write(self):
+        # Execute - a grid burst larger than the bucket
+        ops = [submit_op('SELL', 12 + i, 1) for i in range(3)]
+        first = rounds.market_page_live_method(self.player, {'func': 'batch', 'ops': ops})[1]
+        second = rounds.market_page_live_method(self.player, {'func': 'batch', 'ops': ops[:1]})[1]
+        third = rounds.market_page_live_method(self.player, {'func': 'batch', 'ops': ops})[1]
+
+        # Assert
+        self.assertEqual([r['func'] for r in first['results']], ['order_confirmed'] * 3)
+        self.assertEqual([r['func'] for r in second['results']], ['order_confirmed'])
+        self.assertEqual([r['func'] for r in third['results']], ['op_rejected'] * 3)
+        self.assertEqual(third['results'][0]['error_code'], OrderErrorCode.RATE_LIMITED.value)
+        self.assertEqual(self.db.query(Order).count(), 4)
+
+    def test_reads_coalesced_until_orders_change(self):
+        # Set-up
+        get = {'func': 'get_orders_for_player'}
+        first = rounds.market_page_live_method(self.player, get)
+
+        # Execute
+        second = rounds.market_page_live_method(self.player, get)
+        rounds.market_page_live_method(self.player, {'func': 'submit-order', **submit_op('SELL', 12, 1)})
+        third = rounds.market_page_live_method(self.player, get)
+
+        # Assert
+        self.assertIs(second, first)
+        self.assertIsNot(third, first)
+        self.assertEqual(len(third[1]['orders']), 1)
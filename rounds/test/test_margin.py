@@ -0,0 +1,206 @@
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+
+import rounds
+from rounds import order_journal
+from rounds.call_market import CallMarket
+from rounds.data_structs import DataForPlayer, DataForOrder, OrderBatch
+from rounds.margin import MarginEngine
+from rounds.models import *
+from rounds.test.fixtures import DBTestCase
+from rounds.test.test_data_structs import basic_player, MARGIN_RATIO
+
+BID = OrderType.BID.value
+OFFER = OrderType.OFFER.value
+
+
+def player_data(shares, cash, shares_result, cash_result, auto_buy=True, auto_sell=True):
+    p = basic_player()
+    p.shares = shares
+    p.cash = cash
+    p.group = Group()
+    p.periods_until_auto_buy = 0 if auto_buy else 1
+    p.periods_until_auto_sell = 0 if auto_sell else 1
+    d4p = DataForPlayer(p)
+    d4p.shares_result = shares_result
+    d4p.cash_result = cash_result
+    return d4p
+
+
+def mixed_players():
+    return [player_data(-10, 1000, -10, 1000),  # short, within margin at low prices
+            player_data(-10, 100, -10, 100),  # short, violating
+            player_data(10, -1000, 10, -1000),  # debt, violating
+            player_data(10, -100, 10, -100),  # debt, within margin
+            player_data(5, 200, 5, 200),  # neither
+            player_data(-10, 100, -10, 100, auto_buy=False),  # violating, but no auto buy yet
+            player_data(10, -1000, 10, -1000, auto_sell=False)]  # violating, but no auto sell yet
+
+
+# noinspection DuplicatedCode
+class TestMarginEngine(unittest.TestCase):
+
+    def test_violations_match_player_data(self):
+        # Set-up
+        players = mixed_players()
+        engine = MarginEngine(scf.get_params(players[0].player), players)
+
+        for price in [0, 8, 45, 75]:
+            # Execute
+            mv_short = engine.mv_short_future(price)
+            mv_debt = engine.mv_debt_future(price)
+
+            # Assert
+            for i, d4p in enumerate(players):
+                d4p.set_mv_short_future(MARGIN_RATIO, price)
+                d4p.set_mv_debt_future(MARGIN_RATIO, price)
+                self.assertEqual(mv_short[i], d4p.mv_short_future, f"short {i} @ {price}")
+                self.assertEqual(mv_debt[i], d4p.mv_debt_future, f"debt {i} @ {price}")
+                self.assertEqual(engine.buy_ins_required(price)[i], d4p.is_buy_in_required())
+                self.assertEqual(engine.sell_offs_required(price)[i], d4p.is_sell_off_required())
+
+    def test_quantities_match_player_data(self):
+        # Set-up
+        players = mixed_players()
+        engine = MarginEngine(scf.get_params(players[0].player), players)
+
+        for price in [8, 45, 75]:
+            # Execute
+            buy_qty = engine.buy_in_quantities(price)
+            sell_qty = engine.sell_off_quantities(price)
+
+            # Assert
+            for i in [0, 1]:
+                self.assertEqual(buy_qty[i], players[i].generate_buy_in_order(price).quantity)
+            for i in [2, 3]:
+                self.assertEqual(sell_qty[i], players[i].generate_sell_off_order(price).quantity)
+
+    def test_forced_orders(self):
+        # Set-up
+        players = mixed_players()
+        engine = MarginEngine(scf.get_params(players[0].player), players)
+
+        # Execute
+        batch = engine.forced_orders(45)
+
+        # Assert
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(list(batch.player_idx), [1, 2])
+        self.assertEqual(list(batch.order_type), [BID, OFFER])
+        self.assertEqual(list(batch.price), [4500, 4500])
+        self.assertEqual(list(batch.quantity), [players[1].generate_buy_in_order(45).quantity,
+                                                players[2].generate_sell_off_order(45).quantity])
+        self.assertTrue(batch.is_buy_in.all())
+        self.assertIsInstance(batch.orders[0], DataForOrder)
+        self.assertIs(batch.orders[0].player, players[1].player)
+        self.assertTrue(batch.orders[1].is_buy_in)
+
+    def test_forced_orders_per_group_price(self):
+        # Set-up
+        players = mixed_players()
+        group_idx = np.array([0, 1, 1, 0, 0, 0, 0])
+        engine = MarginEngine(scf.get_params(players[0].player), players, group_idx=group_idx)
+
+        # Execute
+        batch = engine.forced_orders(np.array([8., 45.]))
+
+        # Assert
+        # Player 3's debt only violates the margin at the lower price of group 0
+        self.assertEqual(list(batch.player_idx), [1, 2, 3])
+        self.assertEqual(list(batch.group_idx), [1, 1, 0])
+        self.assertEqual(list(batch.price), [4500, 4500, 800])
+
+    def test_no_forced_orders(self):
+        # Set-up
+        players = [player_data(5, 200, 5, 200)]
+        engine = MarginEngine(scf.get_params(players[0].player), players)
+
+        # Execute
+        batch = engine.forced_orders(10)
+
+        # Assert
+        self.assertEqual(len(batch), 0)
+
+    def test_concat_and_write_back(self):
+        # Set-up
+        players = mixed_players()
+        engine = MarginEngine(scf.get_params(players[0].player), players)
+        forced = engine.forced_orders(45)
+        book = OrderBatch([], price=np.zeros(0, dtype=np.int64), quantity=np.zeros(0, dtype=np.int64),
+                          order_type=np.zeros(0, dtype=np.int64), player_idx=np.zeros(0, dtype=np.int64))
+        writer = MagicMock()
+
+        # Execute
+        batch = OrderBatch.concat([book, forced])
+        batch.quantity_final[0] = 3
+        batch.write_back(writer)
+
+        # Assert
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(writer.insert_order.call_count, 2)
+        _, kwargs = writer.insert_order.call_args_list[0]
+        self.assertEqual(kwargs['quantity_final'], 3)
+        self.assertTrue(kwargs['is_buy_in'])
+        writer.update_order.assert_not_called()
+
+
+class TestMarginCallsAtClearing(DBTestCase):
+    session_code = 'margin'
+    config = dict(interest_rate=.1, div_amount='0.40 1.00', div_dist='0.5 0.5', clearing_engine='vector',
+                  margin_ratio=.5, margin_target_ratio=.6, margin_premium=.1, initial_price=10)
+
+    def build(self):
+        self.group = Group(session=self.session, round_number=1, id_in_subsession=1)
+        # Short and due an automatic buy-in
+        self.short = Player(session=self.session, group=self.group, round_number=1, id_in_group=1, shares=-10,
+                            cash=cu(100), periods_until_auto_buy=0, periods_until_auto_sell=NO_AUTO_TRANS)
+        self.seller = Player(session=self.session, group=self.group, round_number=1, id_in_group=2, shares=30,
+                             cash=cu(100), periods_until_auto_buy=NO_AUTO_TRANS, periods_until_auto_sell=NO_AUTO_TRANS)
+        self.db.add_all([self.group, self.short, self.seller])
+        self.db.flush()
+        self.db.add(Order(player=self.seller, group=self.group, order_type=OFFER, price=cu(10), quantity=20,
+                          quantity_final=0))
+
+    def test_buy_in_cleared(self):
+        # Set-up
+        self.session.config.update(margin_calls=True)
+
+        # Execute
+        CallMarket(self.group).calculate_market()
+
+        # Assert - the buy-in trades with the offer
+        buy_ins = self.db.query(Order).filter(Order.is_buy_in == True).all()
+        self.assertEqual([(o.player_id, o.order_type, o.quantity, o.quantity_final) for o in buy_ins],
+                         [(self.short.id, BID, 10, 10)])
+        self.assertEqual(self.group.price, cu(10))
+        self.assertEqual(self.group.volume, 10)
+        self.assertEqual(self.short.shares_result, 0)
+
+    def test_buy_in_with_order_journal(self):
+        # Set-up - an order journaled before clearing
+        self.session.config.update(margin_calls=True, order_journal=True)
+        journaled = rounds.create_order_from_live_submit(self.seller, OrderType.OFFER, cu(11), 5, 0)
+
+        # Execute - the buy-in is written in bulk, then the journal is used again
+        CallMarket(self.group).calculate_market()
+        later = rounds.create_order_from_live_submit(self.seller, OrderType.OFFER, cu(12), 5, 0)
+        order_journal.flush()
+
+        # Assert
+        ids = [o.id for o in self.db.query(Order)]
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(len(set(ids)), 4)
+        self.assertIn(journaled['order_id'], ids)
+        self.assertIn(later['order_id'], ids)
+        self.assertEqual(self.short.shares_result, 0)
+
+    def test_off(self):
+        # Execute
+        CallMarket(self.group).calculate_market()
+
+        # Assert
+        self.assertEqual(self.db.query(Order).filter(Order.is_buy_in == True).count(), 0)
+        self.assertEqual(self.group.volume, 0)
+        self.assertEqual(self.short.shares_result, -10)
@@ -0,0 +1,83 @@
+import unittest
+
+from rounds import market_history
+from rounds.market_history import MARKET_HISTORY, get_chart_data, get_history, record_round
+from rounds.models import *
+from rounds.test.fixtures import DBTestCase
+
+
+def legacy_chart_data(prices, volumes, init_price, is_practice, npract, num_rounds):
+    """
+    The practice / real round split as get_js_vars did it.
+    """
+    prices = [init_price] + prices
+    volumes = [0] + volumes
+    if is_practice:
+        labels = list(range(0, npract + 1))
+        prices = prices[:npract + 1]
+        volumes = volumes[:npract + 1]
+    else:
+        labels = list(range(0, num_rounds - npract + 1))
+        prices = [init_price] + prices[npract + 1:]
+        volumes = [0] + volumes[npract + 1:]
+    return labels, prices, volumes
+
+
+# noinspection DuplicatedCode
+class TestChartData(unittest.TestCase):
+
+    def test_matches_legacy_split(self):
+        for n in range(0, 8):
+            prices = [10.0 + r for r in range(n)]
+            volumes = list(range(n))
+            for is_practice in (True, False):
+                self.assertEqual(get_chart_data(prices, volumes, 14, is_practice, 3, 6),
+                                 legacy_chart_data(prices, volumes, 14, is_practice, 3, 6), (n, is_practice))
+
+
+class TestMarketHistory(DBTestCase):
+    session_code = 'history'
+
+    def build(self):
+        self.groups = [Group(session=self.session, round_number=rn, id_in_subsession=1) for rn in range(1, 5)]
+        self.db.add_all(self.groups)
+
+    def clear(self, group, price, volume):
+        group.price = cu(price)
+        group.volume = volume
+        record_round(group)
+
+    def test_record_and_get(self):
+        # Set-up
+        self.clear(self.groups[0], 10, 3)
+        self.clear(self.groups[1], 11.5, 0)
+        current = self.groups[2]
+
+        # Execute
+        before = get_history(current)
+        with_uncleared = get_history(current, include_current=True)
+        self.clear(current, 12, 4)
+        with_current = get_history(current, include_current=True)
+
+        # Assert
+        self.assertEqual(before, ([10.0, 11.5], [3, 0]))
+        self.assertEqual(with_uncleared, before)
+        self.assertEqual(with_current, ([10.0, 11.5, 12.0], [3, 0, 4]))
+        self.assertEqual(self.session.vars[MARKET_HISTORY][1]['price'], [10.0, 11.5, 12.0])
+
+    def test_missing_rounds_read_once(self):
+        # Set-up - the rounds cleared before the history was kept
+        for g, price in zip(self.groups[:3], [10, 11, 12]):
+            g.price = cu(price)
+            g.volume = 1
+        self.db.commit()
+
+        # Execute
+        first = get_history(self.groups[3])
+        self.groups[0].price = cu(99)  # Not read again
+        second = get_history(self.groups[3])
+
+        # Assert
+        self.assertEqual(first, ([10.0, 11.0, 12.0], [1, 1, 1]))
+        self.assertEqual(second, first)
+        self.assertEqual(len(market_history.read_history(self.session)[1]['price']), 3)
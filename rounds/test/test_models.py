@@ -1,6 +1,7 @@
 import unittest
 from unittest.mock import MagicMock
 
+from otree.database import VarsDict
 from otree.models import Session
 
 from rounds.models import *
@@ -545,6 +546,32 @@ class TestGroupMethods(unittest.TestCase):
         # Assert
         self.assertEqual(limit, 0)
 
+    def test_determine_result_aggregates(self):
+        # Set-up
+        group = basic_group()
+        group.price = cu(10)
+
+        def player(shares_result, shares_transacted, equity, debt, limit):
+            p = MagicMock(shares_result=shares_result, shares_transacted=shares_transacted)
+            p.get_holding_details = MagicMock(return_value=(None, equity, debt, limit, None))
+            return p
+
+        players = [player(-4, -6, cu(20), cu(-40), cu(-30)),  # Short, in violation
+                   player(-2, -2, cu(0), cu(-20), cu(-15)),  # Short, bankrupt
+                   player(8, 3, cu(80), cu(0), None),
+                   player(0, 5, cu(50), cu(-10), cu(-40))]
+
+        # Execute
+        group.determine_result_aggregates(players)
+
+        # Assert
+        self.assertEqual(group.short_result, 6)
+        self.assertEqual(group.buy_volume, 8)
+        self.assertEqual(group.sell_volume, 8)
+        self.assertEqual(group.num_bankrupt, 1)
+        self.assertEqual(group.num_margin_violations, 1)
+        players[0].get_holding_details.assert_called_with(cu(10), results=True)
+
     def test_in_round_or_none_bad_round(self):
         g = Group()
         g.round_number = 5
@@ -580,7 +607,7 @@ class TestGroupMethods(unittest.TestCase):
 
         # Assert
         self.assertEqual(last_price, 800)
-        group.in_round.assert_called_with(0)
+        group.in_round.assert_not_called()
 
     def test_get_last_period_price_bad_round_fund_val(self):
         # Set-up
@@ -599,24 +626,57 @@ class TestGroupMethods(unittest.TestCase):
 
         # Assert
         self.assertEqual(last_price, 1400)
-        group.in_round.assert_called_with(0)
+        group.in_round.assert_not_called()
 
     def test_get_last_period_price_has_prev(self):
-        # Set-up
+        # Set-up - the previous round is not in the market history
+        session = Session()
+        session.config = {}
+        session._vars = VarsDict()
         group = Group()
+        group.session = session
+        group.id_in_subsession = 1
         group.round_number = 2
 
         last_round_group = Group()
+        last_round_group.session = session
+        last_round_group.id_in_subsession = 1
         last_round_group.round_number = 1
         last_round_group.price = 801.1
         group.in_round = MagicMock(return_value=last_round_group)
 
         # Execute
         last_price = group.get_last_period_price()
+        again = group.get_last_period_price()
 
-        # Assert
+        # Assert - read once, then from the history
         self.assertEqual(last_price, 801.1)
-        group.in_round.assert_called_with(1)
+        self.assertEqual(again, 801.1)
+        group.in_round.assert_called_once_with(1)
+
+    def test_get_last_period_price_from_history(self):
+        # Set-up
+        session = Session()
+        session.config = {scf.SK_INITIAL_PRICE: 14}
+        session._vars = VarsDict()
+        groups = []
+        for rn in range(1, 4):
+            g = Group()
+            g.session = session
+            g.id_in_subsession = 1
+            g.round_number = rn
+            g.in_round = MagicMock(side_effect=AssertionError)
+            groups.append(g)
+        groups[0].price = cu(10.5)
+        market_history.record_round(groups[0])
+        groups[1].price = cu(11)
+        market_history.record_round(groups[1])
+
+        # Execute
+        prices = [g.get_last_period_price() for g in groups]
+
+        # Assert
+        self.assertEqual(prices, [14, cu(10.5), cu(11)])
 
     def test_copy_results_from_previous_round_first(self):
         # Set-up
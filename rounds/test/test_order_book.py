@@ -0,0 +1,295 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from rounds import order_book
+from rounds.clearing import clear_book, from_cents
+from rounds.models import *
+from rounds.order_book import OrderBook, PlayerOrders
+from rounds.test.test_call_market import get_order
+
+BID = OrderType.BID.value
+OFFER = OrderType.OFFER.value
+
+
+def book_order(oid, group_id, order_type, price, quantity):
+    o = get_order(oid=oid, order_type=order_type, price=cu(price), quantity=quantity)
+    o.group_id = group_id
+    o.group = MagicMock(id=group_id)
+    return o
+
+
+# noinspection DuplicatedCode
+class TestOrderBook(unittest.TestCase):
+
+    def test_add_remove(self):
+        # Set-up
+        book = OrderBook(1)
+
+        # Execute
+        book.add(1, BID, cu(10), 5)
+        book.add(2, BID, cu(10), 3)
+        book.add(3, OFFER, cu(9.5), 4)
+        book.add(3, OFFER, cu(9.5), 4)  # Duplicates are ignored
+        book.remove(2)
+        book.remove(99)
+
+        # Assert
+        self.assertEqual(len(book), 2)
+        self.assertEqual(dict(book.bid_levels), {1000: 5})
+        self.assertEqual(dict(book.offer_levels), {950: 4})
+
+        levels, bid_qty, offer_qty = book.get_levels()
+        self.assertEqual(list(levels), [950, 1000])
+        self.assertEqual(list(bid_qty), [0, 5])
+        self.assertEqual(list(offer_qty), [4, 0])
+
+    def test_remove_empties_level(self):
+        book = OrderBook(1)
+        book.add(1, OFFER, cu(9), 4)
+        book.remove(1)
+        self.assertEqual(dict(book.offer_levels), {})
+        self.assertEqual(book.get_market_price(), (None, 0))
+
+    def test_market_price_matches_clear_book(self):
+        rng = np.random.default_rng(7)
+        prices = rng.integers(900, 1100, 500)
+        quants = rng.integers(1, 10, 500)
+        types = rng.choice([BID, OFFER], 500)
+
+        # Set-up - add everything, then delete every third order
+        book = OrderBook(1)
+        for oid, (p, q, t) in enumerate(zip(prices, quants, types)):
+            book.add(oid, t, p / 100, q)
+        keep = np.ones(500, dtype=bool)
+        for oid in range(0, 500, 3):
+            book.remove(oid)
+            keep[oid] = False
+
+        # Execute
+        price, volume = book.get_market_price()
+
+        # Assert
+        expected_price, expected_volume = clear_book(prices[keep], quants[keep], types[keep])
+        self.assertEqual(price, from_cents(expected_price))
+        self.assertEqual(volume, expected_volume)
+
+
+# noinspection DuplicatedCode
+class TestPlayerOrders(unittest.TestCase):
+
+    def test_running_totals(self):
+        # Set-up
+        orders = PlayerOrders(1)
+
+        # Execute
+        orders.add(book_order(1, 5, BID, 10, 2))
+        orders.add(book_order(2, 5, BID, 11, 3))
+        orders.add(book_order(3, 5, OFFER, 12, 4))
+        orders.add(book_order(4, 5, OFFER, 13, 1))
+        orders.add(book_order(4, 5, OFFER, 13, 1))  # Duplicates are ignored
+
+        # Assert
+        self.assertEqual(len(orders), 4)
+        self.assertEqual(orders.supply, 5)
+        self.assertEqual(orders.buy_cost_cents, 5300)
+        self.assertEqual(orders.max_bid_cents, 1100)
+        self.assertEqual(orders.min_ask_cents, 1200)
+        self.assertEqual([o.id for o in orders[OrderType.BID]], [1, 2])
+        self.assertEqual([o.id for o in orders[OrderType.OFFER]], [3, 4])
+
+    def test_remove_updates_best_prices(self):
+        # Set-up
+        orders = PlayerOrders(1)
+        orders.add(book_order(1, 5, BID, 10, 2))
+        orders.add(book_order(2, 5, BID, 11, 3))
+        orders.add(book_order(3, 5, BID, 11, 1))
+        orders.add(book_order(4, 5, OFFER, 12, 4))
+
+        # Execute / Assert
+        orders.remove(2)
+        self.assertEqual(orders.max_bid_cents, 1100)
+        orders.remove(3)
+        self.assertEqual(orders.max_bid_cents, 1000)
+        self.assertEqual(orders.buy_cost_cents, 2000)
+        orders.remove(4)
+        self.assertIsNone(orders.min_ask_cents)
+        self.assertEqual(orders.supply, 0)
+        orders.remove(99)
+        self.assertEqual(len(orders), 1)
+
+    def test_changes_since(self):
+        # Set-up
+        orders = PlayerOrders(1)
+        orders.add(book_order(1, 5, BID, 10, 2))
+        orders.add(book_order(2, 5, BID, 11, 3))
+        version = orders.version
+
+        # Execute
+        orders.add(book_order(3, 5, OFFER, 12, 4))
+        orders.remove(1)
+        orders.add(book_order(4, 5, OFFER, 13, 1))
+        orders.remove(4)
+
+        # Assert
+        self.assertEqual(orders.version, version + 4)
+        self.assertEqual(orders.changes_since(version), ([3], [1, 4]))
+        self.assertEqual(orders.changes_since(orders.version), ([], []))
+        self.assertIsNone(orders.changes_since(None))
+        self.assertIsNone(orders.changes_since(orders.version + 1))
+
+    def test_sync(self):
+        # Set-up
+        orders = PlayerOrders.from_orders(7, [book_order(1, 5, BID, 10, 2), book_order(2, 5, OFFER, 9, 3)],
+                                          snapshot=True)
+        version = orders.version
+        filled = book_order(1, 5, BID, 10, 2)
+        filled.to_dict = lambda: {'price': cu(10), 'quantity_final': 2}
+
+        # Execute
+        orders.sync([filled, book_order(3, 5, OFFER, 12, 1)])
+
+        # Assert
+        self.assertEqual(sorted(o.id for o in orders), [1, 3])
+        self.assertEqual(orders.supply, 1)
+        self.assertEqual(orders.buy_cost_cents, 2000)
+        added, removed = orders.changes_since(version)
+        self.assertEqual((sorted(added), removed), ([1, 3], [2]))
+
+    def test_changes_since_forgotten(self):
+        # Set-up
+        orders = PlayerOrders(1)
+        for oid in range(order_book.MAX_CHANGE_LOG + 10):
+            orders.add(book_order(oid, 5, BID, 10, 1))
+
+        # Execute / Assert
+        self.assertIsNone(orders.changes_since(5))
+        self.assertEqual(orders.changes_since(orders.version - 1), ([orders.version - 1], []))
+
+    def test_as_player_orders(self):
+        # Set-up
+        obt = {OrderType.OFFER: [get_order(order_type=OFFER, price=cu(5), quantity=2),
+                                 get_order(order_type=OFFER, price=cu(6), quantity=3)]}
+
+        # Execute
+        orders = order_book.as_player_orders(obt)
+
+        # Assert
+        self.assertEqual(orders.supply, 5)
+        self.assertEqual(orders.buy_cost_cents, 0)
+        self.assertIsNone(orders.max_bid_cents)
+        self.assertIs(order_book.as_player_orders(orders), orders)
+
+
+# noinspection DuplicatedCode
+class TestBookRegistry(unittest.TestCase):
+
+    def setUp(self):
+        order_book._BOOKS.clear()
+        order_book._PLAYER_ORDERS.clear()
+
+    def tearDown(self):
+        order_book._BOOKS.clear()
+        order_book._PLAYER_ORDERS.clear()
+
+    def test_order_added_builds_from_db(self):
+        # Set-up
+        o1 = book_order(1, 5, BID, 10, 2)
+        o2 = book_order(2, 5, OFFER, 9, 3)
+
+        # Execute
+        with patch.object(Order, 'filter', return_value=[o1, o2]) as mock_filter:
+            order_book.order_added(o2)
+            order_book.order_added(book_order(3, 5, BID, 11, 1))
+
+        # Assert - the database is only read once and the committed order is not counted twice
+        mock_filter.assert_called_once()
+        book = order_book._BOOKS[5]
+        self.assertEqual(len(book), 3)
+        self.assertEqual(dict(book.offer_levels), {900: 3})
+
+    def test_order_deleted(self):
+        o1 = book_order(1, 5, BID, 10, 2)
+        with patch.object(Order, 'filter', return_value=[o1]):
+            order_book.order_added(o1)
+
+        order_book.order_deleted(o1)
+        order_book.order_deleted(book_order(4, 6, BID, 10, 2))
+
+        self.assertEqual(len(order_book._BOOKS[5]), 0)
+        self.assertNotIn(6, order_book._BOOKS)
+
+    def test_get_book_rebuilds_on_mismatch(self):
+        # Set-up
+        group = MagicMock(id=5)
+        o1 = book_order(1, 5, BID, 10, 2)
+        o2 = book_order(2, 5, OFFER, 9, 3)
+        order_book._BOOKS[5] = OrderBook.from_orders(5, [o1])
+
+        # Execute
+        book = order_book.get_book(group, orders=[o1, o2])
+
+        # Assert
+        self.assertEqual(len(book), 2)
+        self.assertIs(order_book._BOOKS[5], book)
+        self.assertIs(order_book.get_book(group, orders=[o1, o2]), book)
+
+        order_book.discard_book(group)
+        self.assertNotIn(5, order_book._BOOKS)
+
+    def test_get_book_rebuilds_on_same_count(self):
+        # Set-up - a delete and a submit the book did not see
+        group = MagicMock(id=5)
+        o1 = book_order(1, 5, BID, 10, 2)
+        o2 = book_order(2, 5, OFFER, 9, 3)
+        order_book._BOOKS[5] = OrderBook.from_orders(5, [o1])
+
+        # Execute
+        book = order_book.get_book(group, orders=[o2])
+
+        # Assert
+        self.assertEqual(list(book.orders), [2])
+        self.assertEqual(dict(book.offer_levels), {900: 3})
+        self.assertEqual(dict(book.bid_levels), {})
+
+    def test_player_orders_follow_submit_and_delete(self):
+        # Set-up
+        player = MagicMock(id=7, group=MagicMock(id=5))
+        o1 = book_order(1, 5, BID, 10, 2)
+        o1.player_id = 7
+        o2 = book_order(2, 5, OFFER, 9, 3)
+        o2.player_id = 7
+        o_cls = MagicMock()
+        o_cls.filter.return_value = [o1]
+
+        # Execute
+        orders = order_book.get_player_orders(player, o_cls=o_cls)
+        with patch.object(Order, 'filter', return_value=[o1]):
+            order_book.order_added(o2)
+        order_book.order_deleted(o1)
+
+        # Assert - the database is only read once
+        self.assertIs(order_book.get_player_orders(player, o_cls=o_cls), orders)
+        o_cls.filter.assert_called_once_with(player=player)
+        self.assertEqual([o.id for o in orders], [2])
+        self.assertEqual(orders.supply, 3)
+        self.assertEqual(orders.buy_cost_cents, 0)
+        self.assertEqual(orders[OrderType.OFFER][0].to_dict(), {'price': cu(9)})
+
+        order_book.discard_book(player.group)
+        self.assertNotIn(5, order_book._PLAYER_ORDERS)
+
+    def test_groups_bounded(self):
+        # Set-up
+        o_cls = MagicMock()
+        o_cls.filter.return_value = []
+
+        # Execute
+        for gid in range(order_book.MAX_GROUPS + 1):
+            order_book.get_player_orders(MagicMock(id=1, group=MagicMock(id=gid)), o_cls=o_cls)
+
+        # Assert - the oldest group is dropped
+        self.assertEqual(len(order_book._PLAYER_ORDERS), order_book.MAX_GROUPS)
+        self.assertNotIn(0, order_book._PLAYER_ORDERS)
+        self.assertIn(order_book.MAX_GROUPS, order_book._PLAYER_ORDERS)
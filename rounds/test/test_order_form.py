@@ -0,0 +1,97 @@
+import decimal
+import unittest
+
+import numpy as np
+
+from rounds.models import *
+from rounds.order_form import parse_order_form, parse_price_cents, parse_quantity
+
+
+def currency_cents(raw):
+    """
+    How the order form was parsed before: through Currency.
+    """
+    try:
+        return int(cu(raw) * 100)
+    except (ValueError, decimal.InvalidOperation):
+        return None
+
+
+# noinspection DuplicatedCode
+class TestParsePrice(unittest.TestCase):
+
+    def test_strings_match_currency(self):
+        for raw in ['14', '14.5', '14.50', '14.005', '14.004', '14.995', '-3.125', '+2', '.5', '5.', ' 7.25 ',
+                    '0', '0.001', '1e2', '1.5E-1', '9999.999', '00012.30']:
+            self.assertEqual(parse_price_cents(raw), currency_cents(raw), raw)
+
+    def test_numbers_match_currency(self):
+        rng = np.random.default_rng(7)
+        values = [14, 0, -3, 1.005, 0.125, 2.675, 14.35] + list(rng.uniform(0, 30, 500)) + list(np.round(rng.uniform(0, 30, 500), 2))
+        for raw in values:
+            raw = raw if type(raw) is int else float(raw)
+            self.assertEqual(parse_price_cents(raw), currency_cents(raw), raw)
+
+    def test_currency(self):
+        self.assertEqual(parse_price_cents(cu(12.34)), 1234)
+
+    def test_not_a_number(self):
+        for raw in ['', 'abc', '1.2.3', '--1', '.', 'NaN', 'Infinity', None, [1]]:
+            self.assertIsNone(parse_price_cents(raw), raw)
+
+
+# noinspection DuplicatedCode
+class TestParseQuantity(unittest.TestCase):
+
+    def test_quantity(self):
+        self.assertEqual(parse_quantity('5'), 5)
+        self.assertEqual(parse_quantity(' -2 '), -2)
+        self.assertEqual(parse_quantity(7), 7)
+        self.assertEqual(parse_quantity(7.9), 7)
+        self.assertIsNone(parse_quantity('5.5'))
+        self.assertIsNone(parse_quantity(''))
+        self.assertIsNone(parse_quantity(None))
+
+
+# noinspection DuplicatedCode
+class TestParseOrderForm(unittest.TestCase):
+
+    def test_valid(self):
+        # Execute
+        code, t, p, q = parse_order_form(dict(type='BUY', price='30.5', quantity='2'))
+
+        # Assert
+        self.assertEqual(code, 0)
+        self.assertEqual(t, OrderType.BID)
+        self.assertEqual(p, 3050)
+        self.assertEqual(q, 2)
+
+    def test_sell_from_grid(self):
+        code, t, p, q = parse_order_form(dict(type='SELL', price=13.999999999999998, quantity=3))
+
+        self.assertEqual(code, 0)
+        self.assertEqual(t, OrderType.OFFER)
+        self.assertEqual(p, 1400)
+        self.assertEqual(q, 3)
+
+    def test_ceilings(self):
+        code, _, _, _ = parse_order_form(dict(type='BUY', price='10000', quantity='100'))
+
+        self.assertEqual(code, OrderErrorCode.PRICE_CEIL.value | OrderErrorCode.QUANT_CEIL.value)
+
+    def test_all_bad(self):
+        code, t, p, q = parse_order_form(dict(type='a', price='b', quantity='c'))
+
+        self.assertEqual(code, OrderErrorCode.PRICE_NOT_NUM.value | OrderErrorCode.QUANT_NOT_NUM.value
+                         | OrderErrorCode.BAD_TYPE.value)
+        self.assertIsNone(t)
+        self.assertIsNone(p)
+        self.assertIsNone(q)
+
+    def test_negative_values_pass_form_checks(self):
+        # Sign checks belong to is_order_valid
+        code, _, p, q = parse_order_form(dict(type='SELL', price='-1', quantity='-2'))
+
+        self.assertEqual(code, 0)
+        self.assertEqual(p, -100)
+        self.assertEqual(q, -2)
@@ -0,0 +1,131 @@
+import rounds
+from rounds import order_book, order_journal
+from rounds.bulk_write import BulkWriter
+from rounds.models import *
+from rounds.order_journal import OrderJournal
+from rounds.test.fixtures import DBTestCase
+
+
+class TestOrderJournal(DBTestCase):
+    session_code = 'journal'
+    config = {scf.SK_ORDER_JOURNAL: True}
+
+    def build(self):
+        super().build()
+        self.db.add(Order(player=self.player, group=self.group, order_type=OrderType.BID.value,
+                          price=cu(10), quantity=5, quantity_final=0))
+
+    def submit(self, journal, price=10, quantity=1):
+        return journal.submit(self.player, self.group, session=self.db, order_type=OrderType.OFFER.value,
+                              price=cu(price), quantity=quantity, timestamp=0)
+
+    def test_ids_follow_the_database(self):
+        # Set-up
+        journal = OrderJournal()
+
+        # Execute
+        ids = [self.submit(journal).id for _ in range(3)]
+
+        # Assert - nothing is written until the journal is flushed
+        self.assertEqual(ids, [2, 3, 4])
+        self.assertEqual(len(journal), 3)
+        self.assertEqual(self.db.query(Order).count(), 1)
+
+    def test_flush(self):
+        # Set-up
+        journal = OrderJournal()
+        o = self.submit(journal, price=11.5, quantity=3)
+
+        # Execute
+        journal.flush(self.db)
+
+        # Assert
+        self.assertEqual(len(journal), 0)
+        written = self.db.query(Order).get(o.id)
+        self.assertEqual(written.player, self.player)
+        self.assertEqual(written.price, cu(11.5))
+        self.assertEqual(written.quantity, 3)
+        self.assertEqual(written.quantity_final, 0)
+        self.assertFalse(written.is_buy_in)
+
+    def test_other_inserts_do_not_collide(self):
+        # Set-up - the journal of the process holds an order that is not written yet
+        journal = order_journal.journal = OrderJournal(reserve_size=2)
+        first = self.submit(journal)
+
+        # Execute - orders created outside the journal, before and after the flush
+        before = Order(player=self.player, group=self.group, order_type=OrderType.BID.value,
+                       price=cu(9), quantity=1)
+        self.db.add(before)
+        self.db.flush()
+        second = self.submit(journal)
+        journal.flush(self.db)
+        after = Order(player=self.player, group=self.group, order_type=OrderType.BID.value,
+                      price=cu(8), quantity=1)
+        self.db.add(after)
+        self.db.flush()
+        third = self.submit(journal)
+        journal.flush(self.db)
+
+        # Assert
+        ids = [first.id, before.id, second.id, after.id, third.id]
+        self.assertEqual(len(set(ids)), 5)
+        self.assertEqual(self.db.query(Order).count(), 6)
+
+    def test_bulk_inserts_do_not_collide(self):
+        # Set-up - a flushed journal still holds reserved ids
+        journal = order_journal.journal = OrderJournal(reserve_size=3)
+        first = self.submit(journal)
+        journal.flush(self.db)
+
+        # Execute - an order written in bulk at clearing, then another journaled order
+        writer = BulkWriter()
+        writer.insert_order(self.player, self.group, order_type=OrderType.BID.value, price=cu(9), quantity=1,
+                            quantity_final=0)
+        writer.flush(self.db)
+        second = self.submit(journal)
+        journal.flush(self.db)
+
+        # Assert
+        ids = sorted(o.id for o in self.db.query(Order))
+        self.assertEqual(len(ids), 4)
+        self.assertIn(first.id, ids)
+        self.assertIn(second.id, ids)
+
+    def test_flush_size(self):
+        # Set-up
+        journal = OrderJournal(flush_size=2)
+
+        # Execute
+        self.submit(journal)
+        self.submit(journal)
+
+        # Assert
+        self.assertEqual(len(journal), 0)
+        self.assertEqual(self.db.query(Order).count(), 3)
+
+    def test_discard(self):
+        # Set-up
+        journal = OrderJournal()
+        o = self.submit(journal)
+
+        # Execute / Assert
+        self.assertIsNone(journal.discard(o.id, player_id=self.player.id + 1))
+        self.assertIs(journal.discard(o.id, player_id=self.player.id), o)
+        self.assertNotIn(o.id, journal)
+        journal.flush(self.db)
+        self.assertEqual(self.db.query(Order).count(), 1)
+
+    def test_live_submit_and_delete(self):
+        # Execute
+        confirmed = rounds.create_order_from_live_submit(self.player, OrderType.OFFER, cu(12), 2, 0)
+        kept = rounds.create_order_from_live_submit(self.player, OrderType.OFFER, cu(13), 1, 0)
+        rounds.delete_order(self.player, confirmed['order_id'])
+        player_orders = order_book.get_player_orders(self.player)
+        order_journal.flush()
+
+        # Assert
+        self.assertEqual(confirmed, {'func': 'order_confirmed', 'order_id': 2})
+        self.assertEqual([o.id for o in player_orders], [1, kept['order_id']])
+        self.assertEqual(player_orders.supply, 1)
+        self.assertEqual(sorted(o.id for o in self.db.query(Order)), [1, kept['order_id']])
@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import patch
+
+from otree import database
+from otree.models import Session
+
+from rounds.call_market import CallMarket
+from rounds.models import *
+from rounds.prefetch import MarketPrefetch, QueryCounter
+from rounds.test.fixtures import get_db_session
+
+CONFIG = dict(interest_rate=.1, div_amount='0.40 1.00', div_dist='0.5 0.5', clearing_engine='vector')
+
+
+# noinspection DuplicatedCode
+class TestMarketPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        self.engine, self.db = get_db_session()
+
+    def tearDown(self):
+        self.db.close()
+
+    def build_group(self, num_players):
+        """ Persist a group in which every player has one order, then start from a clean identity map. """
+        session = Session(code=f"s{num_players}", config=dict(CONFIG))
+        group = Group(session=session, round_number=1, id_in_subsession=1)
+        players = [Player(session=session, group=group, round_number=1, id_in_group=i + 1, shares=5, cash=cu(100))
+                   for i in range(num_players)]
+        self.db.add_all([session, group, *players])
+        self.db.flush()
+        for i, p in enumerate(players):
+            order_type = OrderType.BID.value if i % 2 else OrderType.OFFER.value
+            self.db.add(Order(player=p, group=group, order_type=order_type, price=cu(10), quantity=2))
+        self.db.commit()
+
+        gid = group.id
+        self.db.expunge_all()
+        return self.db.query(Group).get(gid)
+
+    def test_prefetch_for_group(self):
+        group = self.build_group(4)
+
+        with patch.object(database.db, '_db', self.db):
+            prefetch = MarketPrefetch.for_group(group)
+
+        self.assertEqual(prefetch.params.interest_rate, .1)
+        self.assertEqual(len(prefetch.players), 4)
+        by_player = prefetch.orders_by_player_id()
+        for pid, player in prefetch.players.items():
+            self.assertEqual([o.player_id for o in by_player[pid]], [pid])
+            self.assertIs(prefetch.get_player(pid), player)
+
+    def test_clearing_query_count(self):
+        counts = []
+        for num_players in (4, 40):
+            group = self.build_group(num_players)
+
+            # Execute
+            with patch.object(database.db, '_db', self.db), QueryCounter(self.engine) as qc:
+                CallMarket(group).calculate_market()
+
+            # Assert
+            self.assertEqual(group.volume, num_players)
+            counts.append(qc.count)
+
+        # session, players, orders, then one UPDATE each for orders and players
+        self.assertEqual(counts, [5, 5])
@@ -45,3 +45,64 @@ class Test_Session_Config_Functions(unittest.TestCase):
 
         # Assert
         self.assertEqual(f, 14.00)
+
+    def test_get_params_cached(self):
+        # Set-up
+        session = Session()
+        session.code = 'params_cached'
+        session.config = dict(div_dist='0.5 0.5', div_amount='0.40 1.00', interest_rate=0.05)
+
+        # Execute
+        p1 = scf.get_params(session)
+        p2 = scf.get_params(session)
+
+        # Assert
+        self.assertIs(p1, p2)
+        self.assertEqual(p1.fundamental_value, 14.00)
+        self.assertEqual(list(p1.div_amounts), [.4, 1.0])
+        self.assertIs(scf.get_params(p1), p1)
+
+    def test_get_params_invalidated(self):
+        # Set-up
+        session = Session()
+        session.code = 'params_invalidated'
+        session.config = dict(div_dist='0.5 0.5', div_amount='0.40 1.00', interest_rate=0.05)
+        p1 = scf.get_params(session)
+
+        # Execute
+        session.config['interest_rate'] = 0.1
+        p2 = scf.get_params(session)
+
+        # Assert
+        self.assertIsNot(p1, p2)
+        self.assertEqual(p1.interest_rate, 0.05)
+        self.assertEqual(scf.get_interest_rate(session), 0.1)
+        self.assertEqual(scf.get_fundamental_value(session), 7.00)
+
+    def test_params_immutable(self):
+        params = scf.get_params(dict(div_dist='0.5 0.5', div_amount='0.40 1.00', interest_rate=0.05))
+
+        with self.assertRaises(AttributeError):
+            params.interest_rate = 1
+
+        with self.assertRaises(ValueError):
+            params.div_amounts[0] = 5
+
+    def test_bad_value_only_fails_its_getter(self):
+        config = dict(endow_stock='4 x 4', interest_rate=0.05)
+
+        self.assertEqual(scf.get_interest_rate(config), 0.05)
+        with self.assertRaises(ValueError):
+            scf.get_endow_stocks(config)
+        self.assertEqual(scf.get_endow_stock(config), '4 x 4')
+        self.assertIsNone(scf.get_market_time(config))
+
+    def test_getters_from_dict(self):
+        config = dict(forecast_periods='0,2,5', endow_stock='4 4 4', margin_ratio=.5, market_time=20)
+
+        self.assertEqual(scf.get_forecast_periods(config), [0, 2, 5])
+        self.assertEqual(scf.get_endow_stocks(config), [4, 4, 4])
+        self.assertEqual(scf.get_margin_ratio(config, wnp=True), '50%')
+        self.assertEqual(scf.get_market_time(config), 20)
+        self.assertIsNone(scf.get_fixate_time(config))
+        self.assertEqual(scf.get_clearing_engine(config), scf.CLEARING_ENGINE_LEGACY)
@@ -89,15 +89,11 @@ TOOL_TIPS = {
 }
 
 
-class Globals:
-    ALREADY_CONFIGURED = False
-
-
 # noinspection PyDictCreation
 def get_tool_tip_data(obj):
-    if Globals.ALREADY_CONFIGURED:
-        return TOOL_TIPS
-
+    """
+    @return: TOOL_TIPS with the session's values filled in; TOOL_TIPS itself is not changed
+    """
     variables = {}
     variables['dividends'] = " or ".join(str(d) for d in scf.get_dividend_amounts(obj))
     variables['buy_back'] = scf.get_fundamental_value(obj)
@@ -110,11 +106,7 @@ def get_tool_tip_data(obj):
     variables['float_ratio_blurb'] = float_ratio_blurb
 
     # Loop messages in TOOL_TIPS and perform subs
-    for key, data in TOOL_TIPS.items():
-        TOOL_TIPS[key]['text'] = TOOL_TIPS[key]['text'].format(**variables)
-
-    Globals.ALREADY_CONFIGURED = True
-    return TOOL_TIPS
+    return {key: dict(data, text=data['text'].format(**variables)) for key, data in TOOL_TIPS.items()}
 
 
 # noinspection PyUnresolvedReferences
@@ -140,6 +140,12 @@ SESSION_CONFIG_DEFAULTS = dict(
     expected_time_pilot=1,
     expected_time_live=2,
     arrived_ids=0,
+    clearing_engine='legacy',
+    batch_clearing=False,
+    dividend_seed=None,
+    order_journal=False,
+    depth_feed_ms=0,
+    margin_calls=False,
 )
 if environ.get('MTURK_HIT_TYPE') == 'SCREEN_PILOT':
     SESSION_CONFIG_DEFAULTS['mturk_hit_settings'] = dict(